@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""
+Build (or refresh) the offline climatology grid used by get_weather.
+
+Fetches multi-year daily data from the Open-Meteo archive and reduces it to
+monthly normals on a regular lat/lon grid. This is the only step that needs
+network access; the planner memory-maps the resulting file at startup.
+
+    python scripts/build_climatology.py --bbox 47 2 58 16 --step 0.5
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.tools.climatology import DEFAULT_PATH, build_climatology
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+                        default=[47.0, 2.0, 58.0, 16.0])
+    parser.add_argument("--step", type=float, default=0.5, help="Grid spacing in degrees")
+    parser.add_argument("--start-year", type=int, default=2014)
+    parser.add_argument("--end-year", type=int, default=2023)
+    parser.add_argument("--output", default=str(DEFAULT_PATH))
+    args = parser.parse_args()
+
+    south, west, north, east = args.bbox
+    store = build_climatology(south, west, north, east, args.step, args.start_year, args.end_year)
+    store.save(args.output)
+    print(f"Wrote {store.n_lat}x{store.n_lon} grid ({args.start_year}-{args.end_year}) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""
+Import accommodation and POI features from a regional OSM extract into the
+memory-mapped index used by find_accommodation and get_points_of_interest.
+
+    osmium tags-filter region.osm.pbf nwr/tourism nwr/historic -o pois.osm
+    python scripts/build_osm_index.py pois.osm
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.tools.osm_index import DEFAULT_PATH, import_osm_xml
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("extract", help="OSM XML extract (.osm, .osm.gz or .osm.bz2)")
+    parser.add_argument("--output", default=str(DEFAULT_PATH))
+    args = parser.parse_args()
+
+    index = import_osm_xml(args.extract)
+    index.save(args.output)
+    print(f"Indexed {len(index)} features into {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
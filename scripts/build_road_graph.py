@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""
+Import the rideable road network from a regional OSM extract into the
+memory-mapped graph get_route falls back to when OpenRouteService is
+unavailable.
+
+    osmium tags-filter region.osm.pbf w/highway -o roads.osm
+    python scripts/build_road_graph.py roads.osm
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.tools.road_graph import DEFAULT_PATH, import_osm_roads
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("extract", help="OSM XML extract (.osm, .osm.gz or .osm.bz2)")
+    parser.add_argument("--output", default=str(DEFAULT_PATH))
+    args = parser.parse_args()
+
+    graph = import_osm_roads(args.extract)
+    graph.save(args.output)
+    print(f"Imported {len(graph)} junctions and {graph.edge_count} edges into {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
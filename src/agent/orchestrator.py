@@ -4,15 +4,43 @@ import os
 import re
 import uuid
 import json
+from typing import NamedTuple
 
 import anthropic
 
 from src.agent.schemas import ChatMessage, ChatRequest, ChatResponse, DayPlan
-from src.tools.routes import RouteRequest, get_route
-from src.tools.weather import WeatherRequest, get_weather
-from src.tools.elevation import ElevationRequest, get_elevation_profile
-from src.tools.accommodation import AccommodationRequest, find_accommodation
-from src.tools.poi import get_points_of_interest, POIRequest
+from src.agent.tool_loop import run_tool_loop
+from src.agent.tool_registry import get_available_tools
+from src.tools.routes import RouteRequest, RouteWaypoint
+from src.tools.weather import (
+    RouteWeatherRequest,
+    WeatherPoint,
+    WeatherRequest,
+    get_route_weather,
+)
+from src.tools.elevation import ElevationRequest
+from src.tools.gazetteer import get_gazetteer
+from src.tools.accommodation import (
+    AccommodationRequest,
+    CorridorAccommodationRequest,
+    CorridorStay,
+    find_accommodation_along_route,
+)
+from src.tools.poi import POIRequest
+from src.tools.borders import countries_crossed, fill_gaps, get_borders
+from src.tools.budget import BudgetDay, BudgetResult, ItineraryBudgetRequest
+from src.tools.visa import VisaRequest, VisaResult
+from src.tools.upstream import Priority, deadline, guard, priority, remaining, share
+
+# Registry tools are called through their memoizing wrappers
+_tools = get_available_tools()
+get_route = _tools["get_route"]
+get_weather = _tools["get_weather"]
+get_elevation_profile = _tools["get_elevation_profile"]
+find_accommodation = _tools["find_accommodation"]
+get_points_of_interest = _tools["get_points_of_interest"]
+check_visa_requirements = _tools["check_visa_requirements"]
+estimate_itinerary_budget = _tools["estimate_itinerary_budget"]
 
 
 class ConversationMemory:
@@ -28,12 +56,30 @@ class ConversationMemory:
 
 def _extract_cities(text: str) -> tuple[str | None, str | None]:
     # Flexible matcher that stops at punctuation or the word "in" (common for dates/seasons)
-    match = re.search(r"from\s+([A-Za-z\s]+?)\s+to\s+([A-Za-z\s]+?)(?:\s+in\s+|[\.,]|$)", text, re.IGNORECASE)
+    match = re.search(r"from\s+([A-Za-z\s]+?)\s+to\s+([A-Za-z\s]+?)(?:\s+in\s+|\s+via\s+|[\.,]|$)", text, re.IGNORECASE)
     if match:
-        return match.group(1).strip(), match.group(2).strip()
+        origin = re.split(r"\s+via\s+", match.group(1), flags=re.IGNORECASE)[0]
+        return origin.strip(), match.group(2).strip()
     return None, None
 
 
+def _extract_via(text: str) -> list[str]:
+    """Places after "via" ("via Groningen and Hamburg"), in the order given."""
+    match = re.search(r"\bvia\s+([A-Za-z\s,]+?)(?:\s+to\s+|\s+in\s+|\.|$)", text, re.IGNORECASE)
+    if not match:
+        return []
+    return [p.strip() for p in re.split(r",|\s+and\s+", match.group(1)) if p.strip()]
+
+
+def _autocorrect_place(name: str) -> str:
+    """Swap a misspelled place ("Groningn") for its gazetteer name before routing."""
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return name
+    place = gazetteer.autocorrect(name)
+    return place.name if place else name
+
+
 def _extract_month(text: str) -> str | None:
     months = [
         "january",
@@ -69,49 +115,208 @@ def _hostel_frequency(text: str) -> int | None:
     return None
 
 
-def _find_stop_for_distance(target: float, waypoints: List) -> str:
-    closest = min(waypoints, key=lambda w: abs(w.distance_from_start_km - target))
-    return closest.name
+def _find_waypoint_for_distance(target: float, waypoints: List):
+    return min(waypoints, key=lambda w: abs(w.distance_from_start_km - target))
+
+
+# Worst-case wall time for one chat turn (PLAN_DEADLINE_S); stages get shares of it
+PLAN_DEADLINE_S = float(os.environ.get("PLAN_DEADLINE_S") or 20.0)
+
+# Below this much time left, POI enrichment and LLM wording are skipped
+ENRICHMENT_MIN_S = 4.0
+LLM_TIMEOUT_S = 15.0
+
+# A night's stop may move this far (as a share of the daily distance) from the
+# daily target to land on actual accommodation
+STOP_WINDOW_FRACTION = 0.25
+
+
+class _Stop(NamedTuple):
+    distance_km: float
+    waypoint: RouteWaypoint
+    stay_type: str
+    stay: CorridorStay | None
+
+
+def _stays_along_route(route_result, preferences: set[str]) -> list[CorridorStay]:
+    """
+    All accommodation of the wanted types along the route, from one corridor
+    query around the routed track (or the waypoints when there is no geometry).
+    """
+    track = route_result.geometry or [
+        (w.lat, w.lon, w.distance_from_start_km)
+        for w in route_result.waypoints
+        if w.lat is not None and w.lon is not None
+    ]
+    if len(track) < 2:
+        return []
+    try:
+        return find_accommodation_along_route(
+            CorridorAccommodationRequest(
+                points=[(lat, lon) for lat, lon, _ in track],
+                distances_km=[km for _, _, km in track],
+                preferences=sorted(preferences),
+            )
+        )
+    except Exception:
+        return []
+
+
+def _choose_stops(route_result, daily_km: float, accommodation_pref: str, hostel_every: int | None) -> list[_Stop]:
+    """Overnight stops, each moved to the accommodation nearest its daily target.
+
+    A stop only moves within ``STOP_WINDOW_FRACTION`` of a day's distance; the
+    next day's target is measured from wherever the rider actually slept.
+    """
+    wanted = {accommodation_pref, "hostel"} if hostel_every else {accommodation_pref}
+    stays = _stays_along_route(route_result, wanted)
+    window = daily_km * STOP_WINDOW_FRACTION
+    total = route_result.total_distance_km
+
+    stops: list[_Stop] = []
+    distance_done = 0.0
+    while distance_done < total:
+        target = min(distance_done + daily_km, total)
+        stay_type = accommodation_pref
+        if hostel_every and (len(stops) + 1) % hostel_every == 0:
+            stay_type = "hostel"
+
+        stay = None
+        if target < total:
+            nearby = [
+                s for s in stays
+                if s.type == stay_type and abs(s.along_km - target) <= window and distance_done < s.along_km < total
+            ]
+            stay = min(nearby, key=lambda s: abs(s.along_km - target), default=None)
+        distance = stay.along_km if stay else target
+        stops.append(_Stop(distance, _find_waypoint_for_distance(distance, route_result.waypoints), stay_type, stay))
+        distance_done = distance
+    return stops
+
+
+def _weather_per_stop(stops: list[_Stop], month: str) -> list:
+    """Weather for each overnight stop, resolved in one batched lookup.
+
+    Stops without coordinates get None so the caller can fall back to the
+    destination-level forecast.
+    """
+    points = [
+        (stop.stay.lat, stop.stay.lon) if stop.stay else (stop.waypoint.lat, stop.waypoint.lon)
+        for stop in stops
+    ]
+    located = [i for i, (lat, lon) in enumerate(points) if lat is not None and lon is not None]
+    if not located:
+        return [None] * len(stops)
+
+    resolved = get_route_weather(
+        RouteWeatherRequest(
+            month=month,
+            stops=[
+                WeatherPoint(location=stops[i].waypoint.name, lat=points[i][0], lon=points[i][1])
+                for i in located
+            ],
+        )
+    )
+    by_stop = dict(zip(located, resolved))
+    return [by_stop.get(i) for i in range(len(stops))]
+
+
+def _countries_along(route_result, stops: list[_Stop]) -> tuple[list[str | None], list[str]]:
+    """
+    Country each night is spent in and the countries the route passes
+    through in order, from one batched border lookup over the route track
+    and the stops.
+    """
+    borders = get_borders()
+    track = [(lat, lon) for lat, lon, _ in route_result.geometry] or [
+        (w.lat, w.lon) for w in route_result.waypoints if w.lat is not None and w.lon is not None
+    ]
+    nights = [
+        (stop.stay.lat, stop.stay.lon) if stop.stay else (stop.waypoint.lat, stop.waypoint.lon)
+        for stop in stops
+    ]
+    located = [i for i, (lat, lon) in enumerate(nights) if lat is not None and lon is not None]
+    if borders is None or not (track or located):
+        return [None] * len(stops), []
+
+    points = track + [nights[i] for i in located]
+    codes = borders.countries_at([lat for lat, _ in points], [lon for _, lon in points])
+    by_stop = dict(zip(located, codes[len(track):]))
+    day_codes = fill_gaps([by_stop.get(i) for i in range(len(stops))])
+    crossed = countries_crossed(codes[:len(track)] or day_codes)
+    return [borders.name(code) if code else None for code in day_codes], [borders.name(code) for code in crossed]
+
+
+def _visa_for(countries: list[str], preferences: dict | None) -> VisaResult | None:
+    """Visa check over every country crossed, once the traveller's citizenship is known."""
+    citizenship = (preferences or {}).get("citizenship")
+    if not citizenship or not countries:
+        return None
+    return check_visa_requirements(VisaRequest(citizenship=citizenship, destinations=countries))
+
+
+def _budget_for(stops: list[_Stop], day_countries: list[str | None]) -> BudgetResult:
+    """Budget for the itinerary as planned: each day in its country, each night at the stay chosen for it."""
+    itinerary = [
+        # The last stop is the destination, with no night to pay for
+        BudgetDay(country=country, accommodation=stop.stay_type if day < len(stops) else None)
+        for day, (stop, country) in enumerate(zip(stops, day_countries), start=1)
+    ]
+    return estimate_itinerary_budget(ItineraryBudgetRequest(itinerary=itinerary, simulate=True))
+
+
+def _accommodation_for_stop(stop: _Stop) -> tuple[str, str]:
+    """The stay to show for a stop, and the data source it came from."""
+    if stop.stay:
+        return f"{stop.stay.name} ({stop.stay.type}, {stop.stay.offset_km:g}km off route)", stop.stay.source
+    options = find_accommodation(AccommodationRequest(location=stop.waypoint.name, preference=stop.stay_type))
+    if options:
+        return f"{options[0].name} ({options[0].type})", options[0].source
+    return f"No {stop.stay_type} found near {stop.waypoint.name}, book ahead", "none"
 
 
 def _build_plan(
     route_result,
-    daily_km: float,
-    accommodation_pref: str,
-    hostel_every: int | None,
+    stops: list[_Stop],
     weather,
     elevation,
+    stop_weather: list | None = None,
+    day_countries: list[str | None] | None = None,
 ) -> list[DayPlan]:
     plans: list[DayPlan] = []
-    total = route_result.total_distance_km
     distance_done = 0.0
-    day = 1
-    while distance_done < total:
-        next_distance = min(distance_done + daily_km, total)
-        stop_name = _find_stop_for_distance(next_distance, route_result.waypoints)
-        stay_type = accommodation_pref
-        if hostel_every and day % hostel_every == 0:
-            stay_type = "hostel"
-        options = find_accommodation(
-            AccommodationRequest(location=stop_name, preference=stay_type)
-        )
-        accommodation = options[0]
-        poi_list = get_points_of_interest(POIRequest(location=stop_name))
-        note_parts = [f"POIs: {', '.join(p.name for p in poi_list)}"]
+    for day, stop in enumerate(stops, start=1):
+        note_parts = []
+        poi_source = "skipped"
+        # POIs are the first thing dropped when the request is running out of time
+        if _has_time_for_enrichment():
+            with priority(Priority.ENRICHMENT):
+                poi_list = get_points_of_interest(POIRequest(location=stop.waypoint.name))
+            note_parts.append(f"POIs: {', '.join(p.name for p in poi_list)}")
+            poi_source = poi_list[0].source if poi_list else "none"
+        day_weather = (stop_weather[day - 1] if stop_weather else None) or weather
+        accommodation, accommodation_source = _accommodation_for_stop(stop)
         plans.append(
             DayPlan(
                 day=day,
                 start=route_result.origin if day == 1 else plans[-1].end,
-                end=stop_name,
-                distance_km=round(next_distance - distance_done, 1),
-                accommodation=f"{accommodation.name} ({accommodation.type})",
-                weather=f"{weather.avg_temp_c}C avg, {weather.notes}",
+                end=stop.waypoint.name,
+                distance_km=round(stop.distance_km - distance_done, 1),
+                accommodation=accommodation,
+                weather=f"{day_weather.avg_temp_c}C avg, {day_weather.notes}",
                 elevation=f"{elevation.total_elevation_gain_m}m gain over trip, {elevation.difficulty}",
-                notes="; ".join(note_parts),
+                notes="; ".join(note_parts) or None,
+                country=day_countries[day - 1] if day_countries else None,
+                sources={
+                    "route": route_result.source,
+                    "accommodation": accommodation_source,
+                    "weather": day_weather.source,
+                    "elevation": elevation.source,
+                    "pois": poi_source,
+                },
             )
         )
-        distance_done = next_distance
-        day += 1
+        distance_done = stop.distance_km
     return plans
 
 
@@ -127,12 +332,24 @@ def _clarifying_questions(origin: str | None, destination: str | None, month: st
 
 
 def handle_chat(request: ChatRequest, memory: ConversationMemory) -> ChatResponse:
+    """Answer one chat turn within ``PLAN_DEADLINE_S``, degrading to fallbacks as the budget runs out."""
+    with deadline(PLAN_DEADLINE_S):
+        return _handle_chat(request, memory)
+
+
+def _has_time_for_enrichment() -> bool:
+    left = remaining()
+    return left is None or left >= ENRICHMENT_MIN_S
+
+
+def _handle_chat(request: ChatRequest, memory: ConversationMemory) -> ChatResponse:
     session_id = request.session_id or str(uuid.uuid4())
     incoming = ChatMessage(role="user", content=request.message)
     memory.append(session_id, incoming)
 
     # Try to use Claude for intent extraction
-    extracted = _extract_with_claude(request.message, memory.get(session_id))
+    with share(0.25):
+        extracted = _extract_with_claude(request.message, memory.get(session_id))
     
     # Fallback to regex if Claude extraction fails
     if not extracted:
@@ -143,12 +360,15 @@ def handle_chat(request: ChatRequest, memory: ConversationMemory) -> ChatRespons
     month = extracted.get("month")
     daily_km = extracted.get("daily_km")
     hostel_every = extracted.get("hostel_every")
+    via = extracted.get("via") or []
     accommodation_pref = extracted.get("accommodation", "camping")
 
     questions = _clarifying_questions(origin, destination, month)
     if questions:
         # Use Claude to generate natural clarifying response
-        response_text = _generate_clarifying_response_with_claude(questions, request.message)
+        response_text = None
+        if _has_time_for_enrichment():
+            response_text = _generate_clarifying_response_with_claude(questions, request.message)
         if not response_text:
             response_text = "I need a bit more detail before planning: " + " ".join(questions)
         
@@ -161,21 +381,39 @@ def handle_chat(request: ChatRequest, memory: ConversationMemory) -> ChatRespons
             status="needs_clarification",
         )
 
-    route = get_route(
-        RouteRequest(
-            origin=origin,
-            destination=destination,
-            preferred_daily_km=daily_km,
+    origin = _autocorrect_place(origin)
+    destination = _autocorrect_place(destination)
+    via = [_autocorrect_place(place) for place in via]
+
+    # Each stage gets a share of whatever budget is left when it starts
+    with share(0.4):
+        route = get_route(
+            RouteRequest(
+                origin=origin,
+                destination=destination,
+                preferred_daily_km=daily_km,
+                via=via,
+            )
         )
-    )
-    weather = get_weather(WeatherRequest(location=destination, month=month or "June"))
-    elevation = get_elevation_profile(ElevationRequest(origin=origin, destination=destination))
+    with share(0.2):
+        weather = get_weather(WeatherRequest(location=destination, month=month or "June"))
+    with share(0.2):
+        elevation = get_elevation_profile(ElevationRequest(origin=origin, destination=destination))
 
     preferred_daily = daily_km or 100.0
-    plan = _build_plan(route, preferred_daily, accommodation_pref, hostel_every, weather, elevation)
+    with share(0.4):
+        stops = _choose_stops(route, preferred_daily, accommodation_pref, hostel_every)
+    with share(0.3):
+        stop_weather = _weather_per_stop(stops, month or "June")
+    day_countries, countries = _countries_along(route, stops)
+    plan = _build_plan(route, stops, weather, elevation, stop_weather, day_countries)
 
     # Use Claude to generate natural response summary
-    summary_text = _generate_plan_summary_with_claude(route, weather, elevation, plan, preferred_daily)
+    summary_text = None
+    if _has_time_for_enrichment():
+        summary_text = _generate_plan_summary_with_claude(
+            route, weather, elevation, plan, preferred_daily, request.message
+        )
     if not summary_text:
         summary_text = (
             f"Planned {len(plan)} days from {route.origin} to {route.destination} "
@@ -187,7 +425,15 @@ def handle_chat(request: ChatRequest, memory: ConversationMemory) -> ChatRespons
     assistant_summary = ChatMessage(role="assistant", content=summary_text)
     memory.append(session_id, assistant_summary)
 
-    return ChatResponse(session_id=session_id, messages=memory.get(session_id), day_plan=plan, status="ok")
+    return ChatResponse(
+        session_id=session_id,
+        messages=memory.get(session_id),
+        day_plan=plan,
+        countries=countries,
+        budget=_budget_for(stops, day_countries) if stops else None,
+        visa=_visa_for(countries, request.preferences),
+        status="ok",
+    )
 
 
 def _extract_with_claude(message: str, conversation_history: list[ChatMessage]) -> dict | None:
@@ -197,7 +443,7 @@ def _extract_with_claude(message: str, conversation_history: list[ChatMessage])
         return None
     
     try:
-        client = anthropic.Anthropic(api_key=api_key)
+        client = anthropic.Anthropic(api_key=api_key, max_retries=0)
         
         # Build conversation context
         history = "\n".join([f"{msg.role}: {msg.content}" for msg in conversation_history[:-1]])
@@ -214,16 +460,18 @@ Extract these parameters if mentioned:
 - month: travel month
 - daily_km: kilometers per day
 - hostel_every: hostel every N nights
+- via: list of places to pass through on the way, in order
 - accommodation: preference (camping/hostel/hotel)
 
 Return ONLY a JSON object with the parameters found. Use null for missing values.
-Example: {{"origin": "Amsterdam", "destination": "Copenhagen", "month": "June", "daily_km": 100, "hostel_every": 4, "accommodation": "camping"}}"""
+Example: {{"origin": "Amsterdam", "destination": "Copenhagen", "month": "June", "daily_km": 100, "hostel_every": 4, "accommodation": "camping", "via": ["Hamburg"]}}"""
 
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=200,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with guard("anthropic", timeout=LLM_TIMEOUT_S) as timeout:
+            response = client.with_options(timeout=timeout).messages.create(
+                model="claude-3-5-sonnet-20241022",
+                max_tokens=200,
+                messages=[{"role": "user", "content": prompt}]
+            )
         
         response_text = response.content[0].text.strip()
         # Extract JSON from response (might have markdown code blocks)
@@ -245,6 +493,7 @@ def _extract_with_regex(message: str, preferences: dict | None) -> dict:
     month = _extract_month(message) or (preferences.get("month") if preferences else None)
     daily_km = _extract_daily_distance(message) or (preferences.get("daily_km") if preferences else None)
     hostel_every = _hostel_frequency(message) or (preferences.get("hostel_every") if preferences else None)
+    via = _extract_via(message) or (preferences.get("via") if preferences else None) or []
     accommodation_pref = preferences.get("accommodation", "camping") if preferences else "camping"
     
     return {
@@ -253,6 +502,7 @@ def _extract_with_regex(message: str, preferences: dict | None) -> dict:
         "month": month,
         "daily_km": daily_km,
         "hostel_every": hostel_every,
+        "via": via,
         "accommodation": accommodation_pref,
     }
 
@@ -264,7 +514,7 @@ def _generate_clarifying_response_with_claude(questions: list[str], user_message
         return None
     
     try:
-        client = anthropic.Anthropic(api_key=api_key)
+        client = anthropic.Anthropic(api_key=api_key, max_retries=0)
         
         prompt = f"""The user said: "{user_message}"
 
@@ -273,41 +523,30 @@ I need to ask for these missing details:
 
 Generate a friendly, natural response asking for these details. Be conversational and helpful."""
 
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=150,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with guard("anthropic", timeout=LLM_TIMEOUT_S) as timeout:
+            response = client.with_options(timeout=timeout).messages.create(
+                model="claude-3-5-sonnet-20241022",
+                max_tokens=150,
+                messages=[{"role": "user", "content": prompt}]
+            )
         
         return response.content[0].text.strip()
     except Exception:
         return None
 
 
-def _generate_plan_summary_with_claude(route, weather, elevation, plan, daily_km) -> str | None:
-    """Use Claude to generate natural plan summary."""
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if not api_key:
-        return None
-    
-    try:
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        prompt = f"""Generate a brief, enthusiastic summary for this cycling trip plan:
+def _generate_plan_summary_with_claude(route, weather, elevation, plan, daily_km, user_message: str) -> str | None:
+    """Use Claude to summarise the plan, calling registry tools for anything the plan doesn't cover."""
+    prompt = f"""The user said: "{user_message}"
+
+Generate a brief, enthusiastic summary for this cycling trip plan:
 - Route: {route.origin} to {route.destination}
 - Distance: {route.total_distance_km}km over {len(plan)} days
 - Daily average: {daily_km}km
 - Weather: {weather.avg_temp_c}°C, {weather.notes}
 - Terrain: {elevation.difficulty} ({elevation.total_elevation_gain_m}m elevation gain)
 
+If the user asked something this plan doesn't answer, use the tools to find out.
 Make it conversational and encouraging, 2-3 sentences."""
 
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=200,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text.strip()
-    except Exception:
-        return None
+    return run_tool_loop([{"role": "user", "content": prompt}])
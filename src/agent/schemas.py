@@ -3,6 +3,9 @@ from __future__ import annotations
 from typing import Literal
 from pydantic import BaseModel, Field
 
+from src.tools.budget import BudgetResult
+from src.tools.visa import VisaResult
+
 
 Role = Literal["user", "assistant", "system", "tool"]
 
@@ -21,6 +24,10 @@ class DayPlan(BaseModel):
     weather: str
     elevation: str
     notes: str | None = None
+    # Country the night is spent in, from the route's coordinates
+    country: str | None = None
+    # Which data source answered each field, e.g. {"route": "openrouteservice", "weather": "climatology"}
+    sources: dict[str, str] = Field(default_factory=dict)
 
 
 class ChatRequest(BaseModel):
@@ -34,4 +41,8 @@ class ChatResponse(BaseModel):
     messages: list[ChatMessage]
     day_plan: list[DayPlan] | None = None
     clarifying_questions: list[str] | None = None
+    # Countries the route passes through, in order, and the checks run on them
+    countries: list[str] | None = None
+    budget: BudgetResult | None = None
+    visa: VisaResult | None = None
     status: Literal["ok", "needs_clarification"] = "ok"
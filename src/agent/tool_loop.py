@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import contextvars
+import inspect
+import json
+import os
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any
+
+import anthropic
+from pydantic import BaseModel
+
+from src.agent.tool_registry import ToolFunction, get_available_tools
+from src.tools.upstream import deadline, guard, remaining
+
+
+TOOL_LOOP_MODEL = "claude-3-5-sonnet-20241022"
+MAX_TOOL_ITERATIONS = 5
+# Wall-clock caps: one tool call, and all the calls the model asks for in one turn
+TOOL_TIMEOUT_S = 10.0
+TOOL_TURN_TIMEOUT_S = 15.0
+TOOL_CONCURRENCY = 8
+LLM_TIMEOUT_S = 15.0
+# Tool results longer than this are cut before they go back to the model
+MAX_RESULT_CHARS = 4000
+
+
+def request_model(tool: ToolFunction) -> type[BaseModel]:
+    """The pydantic model a registry tool takes as its single argument."""
+    first = next(iter(inspect.signature(tool).parameters))
+    return typing.get_type_hints(tool)[first]
+
+
+def _strip_titles(schema: Any) -> Any:
+    """Drop pydantic's generated ``title`` keys (field names are kept) to save tokens."""
+    if isinstance(schema, list):
+        return [_strip_titles(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    stripped = {}
+    for key, value in schema.items():
+        if key == "title":
+            continue
+        if key in ("properties", "$defs"):
+            stripped[key] = {name: _strip_titles(sub) for name, sub in value.items()}
+        else:
+            stripped[key] = _strip_titles(value)
+    return stripped
+
+
+def tool_specs(tools: dict[str, ToolFunction]) -> list[dict]:
+    """Anthropic tool definitions, with input schemas generated from each tool's request model."""
+    specs = []
+    for name, tool in tools.items():
+        doc = inspect.getdoc(tool) or name.replace("_", " ")
+        specs.append({
+            "name": name,
+            "description": " ".join(doc.split("\n\n")[0].split()),
+            "input_schema": _strip_titles(request_model(tool).model_json_schema()),
+        })
+    return specs
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        # Fields hidden from repr (e.g. full route geometry) are too bulky for the model too
+        return {
+            name: _jsonable(getattr(value, name))
+            for name, field in type(value).model_fields.items()
+            if field.repr and getattr(value, name) is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    return value
+
+
+def compact_json(value: Any) -> str:
+    """Serialise a tool result as compact JSON, cut to ``MAX_RESULT_CHARS``."""
+    text = json.dumps(_jsonable(value), separators=(",", ":"), ensure_ascii=False, default=str)
+    if len(text) > MAX_RESULT_CHARS:
+        text = text[:MAX_RESULT_CHARS] + "…(truncated)"
+    return text
+
+
+def _call_tool(tool: ToolFunction, arguments: dict, seconds: float) -> str:
+    with deadline(seconds):
+        return compact_json(tool(request_model(tool).model_validate(arguments)))
+
+
+def run_tools(calls: list, tools: dict[str, ToolFunction]) -> list[dict]:
+    """
+    Run every tool_use block from one model turn concurrently and return their
+    tool_result blocks in the same order, so a turn costs about as much as its
+    slowest tool. Each call runs under its own deadline; whatever hasn't
+    finished when the turn's time is up is reported as a timeout.
+    """
+    left = remaining()
+    turn_s = TOOL_TURN_TIMEOUT_S if left is None else min(TOOL_TURN_TIMEOUT_S, left)
+    tool_s = min(TOOL_TIMEOUT_S, turn_s)
+    turn_ends = time.monotonic() + turn_s
+
+    pool = ThreadPoolExecutor(max_workers=min(TOOL_CONCURRENCY, max(len(calls), 1)), thread_name_prefix="tool")
+    futures = {}
+    for call in calls:
+        if call.name in tools:
+            futures[call.id] = pool.submit(
+                contextvars.copy_context().run, _call_tool, tools[call.name], call.input, tool_s
+            )
+
+    results = []
+    for call in calls:
+        block = {"type": "tool_result", "tool_use_id": call.id}
+        future = futures.get(call.id)
+        try:
+            if future is None:
+                raise KeyError(f"unknown tool {call.name!r}")
+            block["content"] = future.result(timeout=max(0.0, min(tool_s, turn_ends - time.monotonic())))
+        except FutureTimeout:
+            future.cancel()
+            block.update(content=f"{call.name} timed out", is_error=True)
+        except Exception as exc:
+            block.update(content=f"{call.name} failed: {exc}", is_error=True)
+        results.append(block)
+    # Don't wait for stragglers; their deadline makes them give up soon anyway
+    pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def run_tool_loop(
+    messages: list[dict],
+    system: str | None = None,
+    tools: dict[str, ToolFunction] | None = None,
+    client: Any = None,
+    max_tokens: int = 400,
+) -> str | None:
+    """
+    Let Claude answer ``messages`` using the registry's tools, running the
+    tools it asks for until it replies with text. Returns None without an API
+    key, on any error, or when ``MAX_TOOL_ITERATIONS`` turns go by without an answer.
+    """
+    if client is None:
+        api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            return None
+    tools = get_available_tools() if tools is None else tools
+
+    try:
+        if client is None:
+            client = anthropic.Anthropic(api_key=api_key, max_retries=0)
+        specs = tool_specs(tools)
+        messages = list(messages)
+        extra = {"system": system} if system else {}
+
+        for _ in range(MAX_TOOL_ITERATIONS):
+            with guard("anthropic", timeout=LLM_TIMEOUT_S) as timeout:
+                response = client.with_options(timeout=timeout).messages.create(
+                    model=TOOL_LOOP_MODEL,
+                    max_tokens=max_tokens,
+                    tools=specs,
+                    messages=messages,
+                    **extra,
+                )
+            calls = [block for block in response.content if block.type == "tool_use"]
+            if response.stop_reason != "tool_use" or not calls:
+                text = "".join(block.text for block in response.content if block.type == "text").strip()
+                return text or None
+            messages.append({
+                "role": "assistant",
+                "content": [block.model_dump(exclude_none=True) for block in response.content],
+            })
+            messages.append({"role": "user", "content": run_tools(calls, tools)})
+        return None
+    except Exception:
+        return None
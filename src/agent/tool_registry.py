@@ -1,21 +1,137 @@
 from __future__ import annotations
 
+import functools
+import inspect
+import json
+import os
+import typing
+from dataclasses import dataclass, replace
 from typing import Any, Callable
 
+from pydantic import BaseModel, TypeAdapter
+
+from src.tools.cache import TTLCache
+from src.tools.upstream import is_fallback_source
 from src.tools.routes import get_route
 from src.tools.accommodation import find_accommodation
 from src.tools.weather import get_weather
 from src.tools.elevation import get_elevation_profile
 from src.tools.poi import get_points_of_interest
 from src.tools.visa import check_visa_requirements
-from src.tools.budget import estimate_budget
+from src.tools.budget import estimate_budget, estimate_itinerary_budget
+from src.tools.reachability import find_reachable_places
 
 
 ToolFunction = Callable[..., Any]
 
+HOUR = 3600
+DAY = 24 * HOUR
+FOREVER = float("inf")
 
-def get_available_tools() -> dict[str, ToolFunction]:
-    return {
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl: float
+    max_entries: int = 1_000
+    # Per-key files on disk, pruned to this many; None keeps the tool in memory only
+    disk_entries: int | None = None
+    # Results depend only on the request and static tables, so every one is kept
+    pure: bool = False
+
+
+# Visa and budget answers are pure lookups over static tables, so they never go
+# stale and recomputing beats a disk read. Upstream-backed tools get a disk tier
+# for warm restarts, with TTLs matching how fast their data changes. Override
+# per tool with TOOL_CACHE_POLICIES='{"get_weather": {"ttl": 3600}}'
+DEFAULT_CACHE_POLICIES = {
+    "get_route": CachePolicy(ttl=30 * DAY, max_entries=500, disk_entries=5_000),
+    "find_accommodation": CachePolicy(ttl=6 * HOUR, max_entries=2_000, disk_entries=20_000),
+    "get_weather": CachePolicy(ttl=90 * DAY, max_entries=10_000, disk_entries=50_000),
+    "get_elevation_profile": CachePolicy(ttl=365 * DAY, max_entries=5_000, disk_entries=20_000),
+    "get_points_of_interest": CachePolicy(ttl=7 * DAY, max_entries=2_000, disk_entries=20_000),
+    "check_visa_requirements": CachePolicy(ttl=FOREVER, max_entries=10_000, pure=True),
+    "estimate_budget": CachePolicy(ttl=FOREVER, max_entries=10_000, pure=True),
+    "estimate_itinerary_budget": CachePolicy(ttl=FOREVER, max_entries=2_000, pure=True),
+    "find_reachable_places": CachePolicy(ttl=DAY, max_entries=500),
+}
+
+
+def _load_cache_policies() -> dict[str, CachePolicy]:
+    try:
+        overrides = json.loads(os.environ.get("TOOL_CACHE_POLICIES") or "{}")
+        return {
+            name: replace(policy, **overrides.get(name, {}))
+            for name, policy in DEFAULT_CACHE_POLICIES.items()
+        }
+    except (ValueError, TypeError):
+        return dict(DEFAULT_CACHE_POLICIES)
+
+
+CACHE_POLICIES = _load_cache_policies()
+
+
+def _cacheable(result: Any, policy: CachePolicy) -> bool:
+    """
+    Whether a result may be memoized. Results of upstream-backed tools are
+    only kept when they, or every item of a list, name a source with no
+    fallback part; an empty list may just mean the upstream failed, and the
+    tools' own tile and leg caches already remember genuinely empty areas.
+    """
+    if policy.pure:
+        return True
+    items = result if isinstance(result, list) else [result]
+    return bool(items) and not any(is_fallback_source(getattr(item, "source", None)) for item in items)
+
+
+def request_key(request: BaseModel) -> str:
+    """Canonical cache key for a tool request: its validated fields as sorted, compact JSON."""
+    return json.dumps(request.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+
+
+def memoize(name: str, tool: ToolFunction, policy: CachePolicy) -> ToolFunction:
+    """
+    Wrap ``tool`` in a cache keyed by its canonicalised request. Results are
+    stored as JSON and rebuilt on every hit, so callers never share (or
+    mutate) a cached object. Stale results are served while a background
+    refresh runs; fallbacks and possible failures are never stored (see ``_cacheable``).
+    """
+    hints = typing.get_type_hints(tool)
+    request_type = hints[next(iter(inspect.signature(tool).parameters))]
+    result_type = TypeAdapter(hints["return"])
+    cache = TTLCache(
+        f"tool_{name}",
+        ttl=policy.ttl,
+        max_entries=policy.max_entries,
+        persist=policy.disk_entries is not None,
+        disk_entries=policy.disk_entries,
+    )
+
+    def load(request: BaseModel) -> Any:
+        result = tool(request)
+        return result_type.dump_python(result, mode="json") if _cacheable(result, policy) else None
+
+    @functools.wraps(tool)
+    def cached(request: BaseModel) -> Any:
+        if not isinstance(request, request_type):
+            request = request_type.model_validate(request)
+        key = request_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            if entry.stale:
+                cache.refresh([key], lambda keys: {key: load(request)})
+            return result_type.validate_python(entry.value)
+        result = tool(request)
+        if _cacheable(result, policy):
+            cache.set(key, result_type.dump_python(result, mode="json"))
+        return result
+
+    cached.cache = cache
+    return cached
+
+
+_TOOLS: dict[str, ToolFunction] = {
+    name: memoize(name, tool, CACHE_POLICIES[name])
+    for name, tool in {
         "get_route": get_route,
         "find_accommodation": find_accommodation,
         "get_weather": get_weather,
@@ -23,4 +139,12 @@ def get_available_tools() -> dict[str, ToolFunction]:
         "get_points_of_interest": get_points_of_interest,
         "check_visa_requirements": check_visa_requirements,
         "estimate_budget": estimate_budget,
-    }
+        "estimate_itinerary_budget": estimate_itinerary_budget,
+        "find_reachable_places": find_reachable_places,
+    }.items()
+}
+
+
+def get_available_tools() -> dict[str, ToolFunction]:
+    """Every tool, memoized under its ``CACHE_POLICIES`` entry; the raw function is ``__wrapped__``."""
+    return dict(_TOOLS)
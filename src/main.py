@@ -5,6 +5,14 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from src.api.chat import router as chat_router
+from src.tools.cache import get_cache_stats
+from src.tools.climatology import get_store
+from src.tools.hubs import get_segment_stats
+from src.tools.singleflight import get_singleflight_stats
+from src.tools.upstream import get_breaker_stats, get_limiter_stats, is_offline
+
+# Memory-map the climatology grid once so weather lookups stay local
+get_store()
 
 app = FastAPI(title="Cycling Trip Planner Agent")
 app.include_router(chat_router)
@@ -12,4 +20,16 @@ app.include_router(chat_router)
 
 @app.get("/health")
 def health() -> dict:
-    return {"status": "ok"}
+    return {"status": "ok", "offline": is_offline()}
+
+
+@app.get("/stats")
+def stats() -> dict:
+    """Cache hit rates, route-leg reuse, calls saved by request coalescing, rate-limiter queues and circuit states."""
+    return {
+        "caches": get_cache_stats(),
+        "route_segments": get_segment_stats(),
+        "coalesced": get_singleflight_stats(),
+        "rate_limits": get_limiter_stats(),
+        "circuits": get_breaker_stats(),
+    }
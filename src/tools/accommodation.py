@@ -1,8 +1,16 @@
 from __future__ import annotations
 
-import httpx
+from dataclasses import replace
+
+import numpy as np
 from pydantic import BaseModel
 
+from src.tools import overpass
+from src.tools.corridor import CorridorMatches, cumulative_km, project_onto_polyline
+from src.tools.geocoding import geocode
+from src.tools.osm_index import get_osm_index
+from src.tools.spatial import KM_PER_DEG_LAT
+
 
 class AccommodationRequest(BaseModel):
     location: str
@@ -14,6 +22,25 @@ class AccommodationResult(BaseModel):
     name: str
     type: str
     description: str
+    source: str = "mock"
+
+
+class CorridorAccommodationRequest(BaseModel):
+    points: list[tuple[float, float]]
+    distances_km: list[float] | None = None
+    preferences: list[str]
+    buffer_km: float = 5.0
+
+
+class CorridorStay(BaseModel):
+    name: str
+    type: str
+    description: str
+    lat: float
+    lon: float
+    along_km: float
+    offset_km: float
+    source: str = "mock"
 
 
 MOCK_ACCOMMODATION = {
@@ -50,13 +77,17 @@ MOCK_ACCOMMODATION = {
 
 def find_accommodation(request: AccommodationRequest) -> list[AccommodationResult]:
     """
-    Find accommodation using OpenStreetMap Overpass API.
+    Find accommodation from the local OSM index, or the OpenStreetMap Overpass
+    API for regions it doesn't cover.
     Searches for camping, hostels, hotels near the location.
     """
     # Try to get real accommodation data
     try:
         coords = _geocode_location(request.location)
         if coords:
+            results = _search_accommodation_index(coords, request.preference)
+            if results:
+                return results
             results = _search_accommodation_osm(coords, request.preference)
             if results:
                 return results
@@ -69,95 +100,132 @@ def find_accommodation(request: AccommodationRequest) -> list[AccommodationResul
     if options:
         return [opt for opt in options if opt.type == request.preference] or options
     
-    # Final fallback
-    return [
-        AccommodationResult(
-            location=request.location.title(),
-            name=f"{request.location.title()} {request.preference.title()} Option",
-            type=request.preference,
-            description="Mock accommodation recommendation",
-        )
-    ]
+    return []
 
 
-def _geocode_location(location: str) -> tuple[float, float] | None:
-    """Geocode location using Nominatim API."""
+def find_accommodation_along_route(request: CorridorAccommodationRequest) -> list[CorridorStay]:
+    """
+    Find every stay of the requested types within ``buffer_km`` of a route,
+    ordered by distance along it.
+    ``points`` is the route as (lat, lon) pairs; ``distances_km`` gives the
+    route distance at each point so results line up with the router's own
+    kilometres (measured along the points when omitted). One corridor query
+    against the local OSM index, or cached Overpass tiles where it has nothing.
+    """
+    if len(request.points) < 2:
+        return []
+    kinds = {tuple(TAG_MAP[p].split("=")): p for p in request.preferences if p in TAG_MAP}
+    if not kinds:
+        return []
+
+    route = np.asarray(request.points, dtype=np.float64)
+    lats, lons = route[:, 0], route[:, 1]
+    features, matches, source = _corridor_candidates(lats, lons, request.buffer_km, list(kinds))
+    if not len(matches):
+        return []
+
+    measured = cumulative_km(lats, lons)
+    route_km = np.asarray(request.distances_km, dtype=np.float64) if request.distances_km else measured
+
+    stays = []
+    for idx, along, offset in zip(matches.ids, matches.along_km, matches.offset_km):
+        feature = features[idx]
+        preference = kinds[feature.kind]
+        result = _to_result(feature.tags, preference, (feature.lat, feature.lon), source)
+        stays.append(CorridorStay(
+            name=result.name,
+            type=preference,
+            description=result.description,
+            lat=feature.lat,
+            lon=feature.lon,
+            along_km=round(float(np.interp(along, measured, route_km)), 1),
+            offset_km=round(float(offset), 2),
+            source=source,
+        ))
+    return stays
+
+
+def _corridor_candidates(
+    lats, lons, buffer_km: float, kinds: list[tuple[str, str]]
+) -> tuple[list, CorridorMatches, str]:
+    """
+    Features within ``buffer_km`` of the route from the local index, else from
+    Overpass tiles, with their projection onto the route (``ids`` index the features).
+    """
+    index = get_osm_index()
+    if index is not None:
+        pad_lat = buffer_km / KM_PER_DEG_LAT
+        pad_lon = pad_lat / max(np.cos(np.radians(np.abs(lats).max())), 0.01)
+        ids = index.ids_in_bbox(
+            lats.min() - pad_lat, lons.min() - pad_lon, lats.max() + pad_lat, lons.max() + pad_lon, kinds
+        )
+        if len(ids):
+            # Only features near the line get their tags decoded
+            near = project_onto_polyline(
+                lats, lons, np.asarray(index.grid.lats[ids]), np.asarray(index.grid.lons[ids]), buffer_km
+            )
+            features = [index.feature(int(i)) for i in ids[near.ids]]
+            return features, replace(near, ids=np.arange(len(features))), "osm_index"
     try:
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            "q": location,
-            "format": "json",
-            "limit": 1
-        }
-        headers = {"User-Agent": "CyclingPlanner/1.0"}
-        
-        with httpx.Client(timeout=10.0) as client:
-            response = client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            results = response.json()
-            
-            if results:
-                return (float(results[0]["lat"]), float(results[0]["lon"]))
+        features = overpass.query_corridor(lats, lons, buffer_km, kinds)
     except Exception:
-        pass
-    return None
+        features = []
+    matches = project_onto_polyline(lats, lons, [f.lat for f in features], [f.lon for f in features], buffer_km)
+    return features, matches, "overpass"
 
 
-def _search_accommodation_osm(coords: tuple[float, float], preference: str) -> list[AccommodationResult]:
-    """Search for accommodation using Overpass API."""
+def _geocode_location(location: str) -> tuple[float, float] | None:
+    """Geocode location via the local gazetteer, falling back to Nominatim."""
+    return geocode(location)
+
+
+# Map preference to OSM tags
+TAG_MAP = {
+    "camping": "tourism=camp_site",
+    "hostel": "tourism=hostel",
+    "hotel": "tourism=hotel",
+}
+
+SEARCH_RADIUS_M = 5000
+
+
+def _search_accommodation_index(coords: tuple[float, float], preference: str) -> list[AccommodationResult]:
+    """Search the memory-mapped OSM index; empty when no index covers the area."""
+    index = get_osm_index()
+    if index is None:
+        return []
+    kind = tuple(TAG_MAP.get(preference, "tourism=hotel").split("="))
+    features = index.nearest(coords[0], coords[1], [kind], SEARCH_RADIUS_M, limit=3)
+    return [_to_result(f.tags, preference, coords, "osm_index") for f in features]
+
+
+def _to_result(tags_dict: dict, preference: str, coords: tuple[float, float], source: str) -> AccommodationResult:
+    """Build a result from an OSM element's tags."""
     lat, lon = coords
+    name = tags_dict.get("name", "Unnamed")
     
-    # Map preference to OSM tags
-    tag_map = {
-        "camping": "tourism=camp_site",
-        "hostel": "tourism=hostel",
-        "hotel": "tourism=hotel",
-    }
-    
-    tags = tag_map.get(preference, "tourism=hotel")
+    # Build description from available tags
+    desc_parts = []
+    if "description" in tags_dict:
+        desc_parts.append(tags_dict["description"])
+    if "stars" in tags_dict:
+        desc_parts.append(f"{tags_dict['stars']} stars")
+    if "website" in tags_dict:
+        desc_parts.append(f"Website available")
     
-    # Overpass query
-    query = f"""
-    [out:json][timeout:25];
-    (
-      node[{tags}](around:5000,{lat},{lon});
-      way[{tags}](around:5000,{lat},{lon});
-    );
-    out body 5;
-    """
+    description = "; ".join(desc_parts) if desc_parts else f"{preference.title()} near {coords}"
     
-    try:
-        url = "https://overpass-api.de/api/interpreter"
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(url, data={"data": query})
-            response.raise_for_status()
-            data = response.json()
-            
-            results = []
-            for element in data.get("elements", []):
-                tags_dict = element.get("tags", {})
-                name = tags_dict.get("name", "Unnamed")
-                
-                # Build description from available tags
-                desc_parts = []
-                if "description" in tags_dict:
-                    desc_parts.append(tags_dict["description"])
-                if "stars" in tags_dict:
-                    desc_parts.append(f"{tags_dict['stars']} stars")
-                if "website" in tags_dict:
-                    desc_parts.append(f"Website available")
-                
-                description = "; ".join(desc_parts) if desc_parts else f"{preference.title()} near {coords}"
-                
-                results.append(AccommodationResult(
-                    location=f"Near {lat:.2f}, {lon:.2f}",
-                    name=name,
-                    type=preference,
-                    description=description
-                ))
-            
-            return results[:3]  # Return top 3 results
-    except Exception:
-        pass
-    
-    return []
+    return AccommodationResult(
+        location=f"Near {lat:.2f}, {lon:.2f}",
+        name=name,
+        type=preference,
+        description=description,
+        source=source,
+    )
+
+
+def _search_accommodation_osm(coords: tuple[float, float], preference: str) -> list[AccommodationResult]:
+    """Search for accommodation through the tile-cached Overpass client."""
+    kind = tuple(TAG_MAP.get(preference, "tourism=hotel").split("="))
+    features = overpass.query_radius(coords[0], coords[1], SEARCH_RADIUS_M, [kind], limit=3)
+    return [_to_result(f.tags, preference, coords, "overpass") for f in features]
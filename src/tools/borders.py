@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+
+from src.tools.gazetteer import DATA_DIR
+
+
+DEFAULT_PATH = DATA_DIR / "borders.geojson"
+
+# Grid cells the prefilter and the prepared edge buckets work in
+CELL_DEG = 0.5
+# Boundary points are ray-cast in chunks of this many to bound memory
+CHUNK_POINTS = 4096
+
+# Natural Earth admin-0 files carry the code under one of these
+_CODE_KEYS = ("iso_a2", "ISO_A2_EH", "ISO_A2")
+_NAME_KEYS = ("name", "NAME", "ADMIN", "admin")
+
+_borders: BorderIndex | None = None
+_borders_loaded = False
+
+
+class BorderIndex:
+    """Point-in-polygon lookup over country boundaries.
+
+    Polygons are prepared once: every ring edge goes into CSR buckets keyed
+    by (country, grid row), so an even-odd ray cast only walks the edges in
+    the point's latitude band. A grid of cells over the countries' bounding
+    boxes answers most points outright: cells no edge touches are wholly
+    inside one country (or none) and only boundary cells are ray cast, in
+    one vectorised pass per (country, row) group.
+    """
+
+    def __init__(self, codes: list[str], names: list[str], rings: list[tuple[int, np.ndarray, np.ndarray]]) -> None:
+        self.codes = list(codes)
+        self.names = list(names)
+        self.n_rows = int(math.ceil(180 / CELL_DEG))
+        self.n_cols = int(math.ceil(360 / CELL_DEG))
+
+        country, x1, y1, x2, y2 = [], [], [], [], []
+        for idx, lons, lats in rings:
+            lons = np.asarray(lons, dtype=np.float64)
+            lats = np.asarray(lats, dtype=np.float64)
+            country.append(np.full(len(lons), idx, dtype=np.int32))
+            x1.append(lons)
+            y1.append(lats)
+            x2.append(np.roll(lons, -1))
+            y2.append(np.roll(lats, -1))
+        if rings:
+            country_ids, x1, y1, x2, y2 = (np.concatenate(v) for v in (country, x1, y1, x2, y2))
+        else:
+            country_ids = np.empty(0, dtype=np.int32)
+            x1 = y1 = x2 = y2 = np.empty(0)
+        # Horizontal edges never cross a horizontal ray
+        keep = y1 != y2
+        self._country = country_ids[keep]
+        self._x1, self._y1, self._x2, self._y2 = x1[keep], y1[keep], x2[keep], y2[keep]
+        self._slope = (self._x2 - self._x1) / (self._y2 - self._y1)
+
+        self.bboxes = np.full((len(self.codes), 4), np.nan)
+        for idx in range(len(self.codes)):
+            mine = self._country == idx
+            if mine.any():
+                xs = np.concatenate([self._x1[mine], self._x2[mine]])
+                ys = np.concatenate([self._y1[mine], self._y2[mine]])
+                self.bboxes[idx] = (xs.min(), ys.min(), xs.max(), ys.max())
+
+        self._build_edge_buckets()
+        self._build_cells()
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def from_geojson(cls, path: str | os.PathLike) -> BorderIndex:
+        """Load a GeoJSON FeatureCollection of (Multi)Polygons with ISO alpha-2 codes."""
+        with open(path, encoding="utf-8") as handle:
+            collection = json.load(handle)
+
+        codes: list[str] = []
+        names: list[str] = []
+        rings: list[tuple[int, np.ndarray, np.ndarray]] = []
+        for feature in collection.get("features", []):
+            props = feature.get("properties") or {}
+            geometry = feature.get("geometry") or {}
+            code = next((str(props[k]) for k in _CODE_KEYS if len(str(props.get(k, ""))) == 2), None)
+            if code is None or geometry.get("type") not in ("Polygon", "MultiPolygon"):
+                continue
+            if code not in codes:
+                codes.append(code)
+                names.append(next((str(props[k]) for k in _NAME_KEYS if props.get(k)), code))
+            polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+            for polygon in polygons:
+                # Outer rings and holes alike: the even-odd rule sorts them out
+                for ring in polygon:
+                    coords = np.asarray(ring, dtype=np.float64)
+                    if len(coords) and np.array_equal(coords[0], coords[-1]):
+                        coords = coords[:-1]
+                    if len(coords) >= 3:
+                        rings.append((codes.index(code), coords[:, 0], coords[:, 1]))
+        return cls(codes, names, rings)
+
+    def name(self, code: str) -> str:
+        """Display name for an ISO code, or the code itself when unknown."""
+        return self.names[self.codes.index(code)] if code in self.codes else code
+
+    def locate(self, lats, lons) -> np.ndarray:
+        """Country index (into ``codes``) for each point, -1 where no country contains it."""
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        found = np.full(len(lats), -1, dtype=np.int32)
+        if not len(lats) or not len(self._cells):
+            return found
+
+        keys = self._cell_keys(lats, lons)
+        slots = np.minimum(np.searchsorted(self._cells, keys), len(self._cells) - 1)
+        known = self._cells[slots] == keys
+        found[known] = self._interior[slots[known]]
+
+        # Points in boundary cells: ray cast against each candidate country in turn
+        pending = np.nonzero(known & (self._interior[slots] < 0))[0]
+        if not len(pending):
+            return found
+        starts = self._cand_offsets[slots[pending]]
+        ends = self._cand_offsets[slots[pending] + 1]
+        rows = self._rows(lats[pending])
+        width = int((ends - starts).max()) if len(pending) else 0
+        for k in range(width):
+            active = (starts + k < ends) & (found[pending] < 0)
+            if not active.any():
+                continue
+            points = pending[active]
+            countries = self._cand_countries[(starts + k)[active]]
+            buckets = countries.astype(np.int64) * self.n_rows + rows[active]
+            inside = self._inside(lats[points], lons[points], buckets)
+            found[points[inside]] = countries[inside]
+        return found
+
+    def countries_at(self, lats, lons) -> list[str | None]:
+        """ISO code for each point, or None outside every country."""
+        return [self.codes[i] if i >= 0 else None for i in self.locate(lats, lons)]
+
+    def _inside(self, lats: np.ndarray, lons: np.ndarray, buckets: np.ndarray) -> np.ndarray:
+        """Even-odd test of each point against its bucket's edges, one bucket at a time."""
+        inside = np.zeros(len(lats), dtype=bool)
+        order = np.argsort(buckets, kind="stable")
+        unique, first = np.unique(buckets[order], return_index=True)
+        bounds = np.append(first, len(order))
+        for b, bucket in enumerate(unique):
+            slot = np.searchsorted(self._bucket_keys, bucket)
+            if slot >= len(self._bucket_keys) or self._bucket_keys[slot] != bucket:
+                continue
+            edges = self._bucket_edges[self._bucket_starts[slot]:self._bucket_starts[slot + 1]]
+            ex1, ey1, ey2, slope = self._x1[edges], self._y1[edges], self._y2[edges], self._slope[edges]
+            members = order[bounds[b]:bounds[b + 1]]
+            for lo in range(0, len(members), CHUNK_POINTS):
+                chunk = members[lo:lo + CHUNK_POINTS]
+                py = lats[chunk, None]
+                px = lons[chunk, None]
+                spans = (ey1 > py) != (ey2 > py)
+                crossings = spans & (px < ex1 + (py - ey1) * slope)
+                inside[chunk] = np.count_nonzero(crossings, axis=1) % 2 == 1
+        return inside
+
+    def _build_edge_buckets(self) -> None:
+        """CSR lists of edge ids per (country, grid row) the edge's latitude span touches."""
+        lo = self._rows(np.minimum(self._y1, self._y2))
+        hi = self._rows(np.maximum(self._y1, self._y2))
+        counts = hi - lo + 1
+        edges = np.repeat(np.arange(len(lo)), counts)
+        rows = np.repeat(lo, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        keys = self._country[edges].astype(np.int64) * self.n_rows + rows
+        order = np.argsort(keys, kind="stable")
+        self._bucket_edges = edges[order]
+        self._bucket_keys, starts = np.unique(keys[order], return_index=True)
+        self._bucket_starts = np.append(starts, len(order))
+
+    def _build_cells(self) -> None:
+        """Classify every cell under a country's bounding box as interior to it, or a boundary cell."""
+        cell_country: dict[int, int] = {}
+        candidates: dict[int, list[int]] = {}
+        for idx, (west, south, east, north) in enumerate(self.bboxes):
+            if np.isnan(west):
+                continue
+            rows = np.arange(self._rows(south), self._rows(north) + 1)
+            cols = np.arange(self._cols(west), self._cols(east) + 1)
+            grid_rows, grid_cols = (a.ravel() for a in np.meshgrid(rows, cols, indexing="ij"))
+            keys = grid_rows.astype(np.int64) * self.n_cols + grid_cols
+
+            # Cells an edge's bounding box overlaps need the exact test
+            mine = np.nonzero(self._country == idx)[0]
+            touched = set()
+            for edge in mine:
+                r0, r1 = sorted((self._rows(self._y1[edge]), self._rows(self._y2[edge])))
+                c0, c1 = sorted((self._cols(self._x1[edge]), self._cols(self._x2[edge])))
+                touched.update(r * self.n_cols + c for r in range(r0, r1 + 1) for c in range(c0, c1 + 1))
+            boundary = np.isin(keys, np.fromiter(touched, dtype=np.int64, count=len(touched)))
+
+            # The rest lie wholly inside or outside; their centre decides
+            clear = np.nonzero(~boundary)[0]
+            centre_lats = (grid_rows[clear] + 0.5) * CELL_DEG - 90
+            centre_lons = (grid_cols[clear] + 0.5) * CELL_DEG - 180
+            buckets = np.full(len(clear), idx, dtype=np.int64) * self.n_rows + grid_rows[clear]
+            inside = self._inside(centre_lats, centre_lons, buckets)
+            for key in keys[clear[inside]]:
+                cell_country[int(key)] = idx
+            for key in keys[boundary]:
+                candidates.setdefault(int(key), []).append(idx)
+            for key in keys[clear[~inside]]:
+                candidates.setdefault(int(key), [])
+
+        cells = sorted(set(cell_country) | set(candidates))
+        self._cells = np.asarray(cells, dtype=np.int64)
+        self._interior = np.asarray([cell_country.get(key, -1) for key in cells], dtype=np.int32)
+        # A cell inside one country can still be a boundary cell of another's bbox; interior wins
+        lists = [[] if key in cell_country else candidates.get(key, []) for key in cells]
+        self._cand_offsets = np.concatenate([[0], np.cumsum([len(c) for c in lists])]).astype(np.int64)
+        self._cand_countries = np.asarray([c for cands in lists for c in cands], dtype=np.int32)
+
+    def _rows(self, lats) -> np.ndarray:
+        return np.clip(np.floor((np.asarray(lats) + 90) / CELL_DEG).astype(np.int64), 0, self.n_rows - 1)
+
+    def _cols(self, lons) -> np.ndarray:
+        return np.clip(np.floor((np.asarray(lons) + 180) / CELL_DEG).astype(np.int64), 0, self.n_cols - 1)
+
+    def _cell_keys(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        return self._rows(lats) * self.n_cols + self._cols(lons)
+
+
+def countries_crossed(codes: list[str | None]) -> list[str]:
+    """Countries in the order a sequence of per-point codes enters them, ignoring gaps (sea, unmapped)."""
+    crossed: list[str] = []
+    for code in codes:
+        if code and (not crossed or crossed[-1] != code):
+            crossed.append(code)
+    return crossed
+
+
+def fill_gaps(codes: list[str | None]) -> list[str | None]:
+    """Carry the last known country over points outside every polygon (ferries, simplified coastlines)."""
+    filled: list[str | None] = []
+    last = next((code for code in codes if code), None)
+    for code in codes:
+        last = code or last
+        filled.append(last)
+    return filled
+
+
+def get_borders() -> BorderIndex | None:
+    """Return the process-wide border index, loading it on first use."""
+    global _borders, _borders_loaded
+    if not _borders_loaded:
+        _borders_loaded = True
+        path = Path(os.environ.get("BORDERS_PATH") or DEFAULT_PATH)
+        if path.exists():
+            try:
+                _borders = BorderIndex.from_geojson(path)
+            except Exception:
+                _borders = None
+    return _borders
+
+
+def set_borders(borders: BorderIndex | None) -> None:
+    """Install a border index (tests, or a detailed boundary set loaded elsewhere)."""
+    global _borders, _borders_loaded
+    _borders = borders
+    _borders_loaded = True
@@ -1,17 +1,47 @@
 from __future__ import annotations
 
-from pydantic import BaseModel
+import numpy as np
+from pydantic import BaseModel, Field
+
+
+DEFAULT_TRIALS = 100_000
 
 
 class BudgetRequest(BaseModel):
     days: int
     accommodation_mix: dict
     country: str = "netherlands"  # Default country for pricing
+    # Monte Carlo range on top of the point estimate
+    simulate: bool = False
+    trials: int = Field(DEFAULT_TRIALS, ge=1_000, le=1_000_000)
+    seed: int = 0
+
+
+class BudgetDay(BaseModel):
+    country: str | None = None  # None prices the day at DEFAULT_COSTS
+    accommodation: str | None = None  # Night at the end of the day; None when there's no night to pay for
+
+
+class ItineraryBudgetRequest(BaseModel):
+    itinerary: list[BudgetDay] = Field(min_length=1)
+    simulate: bool = False
+    trials: int = Field(DEFAULT_TRIALS, ge=1_000, le=1_000_000)
+    seed: int = 0
+
+
+class BudgetRange(BaseModel):
+    trials: int
+    p10: float
+    p50: float
+    p90: float
+    # The same percentiles for accommodation, food and miscellaneous on their own
+    by_category: dict[str, dict[str, float]]
 
 
 class BudgetResult(BaseModel):
     estimated_total_eur: float
     breakdown: dict
+    estimate_range: BudgetRange | None = None
 
 
 # Average daily costs in EUR for different countries and accommodation types
@@ -92,50 +122,177 @@ DEFAULT_COSTS = {
 }
 
 
+STAY_TYPES = ("camping", "hostel", "hotel")
+DAILY_CATEGORIES = ("food_per_day", "misc_per_day")
+# ~2 EUR per day for minor repairs/maintenance
+BIKE_MAINTENANCE_PER_DAY = 2.0
+
+# One row per country (DEFAULT_COSTS last), one column per stay type then daily category
+_COUNTRY_ROWS = {country: row for row, country in enumerate(COUNTRY_COSTS)}
+_DEFAULT_ROW = len(COUNTRY_COSTS)
+_COST_MATRIX = np.array(
+    [[costs[key] for key in STAY_TYPES + DAILY_CATEGORIES] for costs in [*COUNTRY_COSTS.values(), DEFAULT_COSTS]],
+    dtype=np.float64,
+)
+_ROW_NAMES = [*COUNTRY_COSTS, "other"]
+_STAY_COLUMNS = {stay: col for col, stay in enumerate(STAY_TYPES)}
+_NO_STAY = -1
+
+# Log-space spread of real prices around the means above, per cost column
+PRICE_SIGMA = np.array([0.20, 0.25, 0.30, 0.20, 0.45])
+# Which reported category each cost column adds to
+RANGE_CATEGORIES = ("accommodation", "food", "miscellaneous")
+_CATEGORY_OF_COLUMN = np.array([0, 0, 0, 1, 2])
+PERCENTILES = (10, 50, 90)
+
+
+def _country_row(country: str | None) -> int:
+    return _COUNTRY_ROWS.get((country or "").lower().strip(), _DEFAULT_ROW)
+
+
 def estimate_budget(request: BudgetRequest) -> BudgetResult:
     """
     Estimate cycling trip budget with realistic country-specific costs.
     Includes accommodation, food, and miscellaneous expenses.
     """
-    country_key = request.country.lower().strip()
-    costs = COUNTRY_COSTS.get(country_key, DEFAULT_COSTS)
-    
+    costs = _COST_MATRIX[_country_row(request.country)]
     nights = request.days - 1 if request.days > 1 else 1
-    
-    # Calculate accommodation costs
-    camping_nights = nights * request.accommodation_mix.get("camping", 0)
-    hostel_nights = nights * request.accommodation_mix.get("hostel", 0)
-    hotel_nights = nights * request.accommodation_mix.get("hotel", 0)
-    
-    camping_cost = camping_nights * costs["camping"]
-    hostel_cost = hostel_nights * costs["hostel"]
-    hotel_cost = hotel_nights * costs["hotel"]
-    
-    total_accommodation = camping_cost + hostel_cost + hotel_cost
-    
-    # Calculate food and misc costs for all days
-    food_cost = request.days * costs["food_per_day"]
-    misc_cost = request.days * costs["misc_per_day"]
-    
-    # Additional one-time costs
-    bike_maintenance = request.days * 2  # ~2 EUR per day for minor repairs/maintenance
-    
-    estimated_total = total_accommodation + food_cost + misc_cost + bike_maintenance
-    
-    breakdown = {
-        "accommodation": {
-            "camping": round(camping_cost, 2),
-            "hostel": round(hostel_cost, 2),
-            "hotel": round(hotel_cost, 2),
-            "total": round(total_accommodation, 2),
+
+    # Nights of each stay type times that stay's price, in one product
+    mix = np.array([request.accommodation_mix.get(stay, 0) for stay in STAY_TYPES], dtype=np.float64)
+    stay_costs = nights * mix * costs[:len(STAY_TYPES)]
+    daily = request.days * costs[len(STAY_TYPES):]
+    days = np.array([request.days])
+    result = _results(stay_costs[None, :], daily[None, :], days)[0]
+    if request.simulate:
+        amounts = np.concatenate([stay_costs, daily])[None, :]
+        result.estimate_range = _simulate(amounts, request.days * BIKE_MAINTENANCE_PER_DAY, request.trials, request.seed)
+    return result
+
+
+def estimate_itinerary_budget(request: ItineraryBudgetRequest) -> BudgetResult:
+    """
+    Price an actual day-by-day itinerary: each day's food and misc at its
+    country's rates, each night at its country's price for the stay type.
+    """
+    return estimate_budgets([request])[0]
+
+
+def estimate_budgets(requests: list[ItineraryBudgetRequest]) -> list[BudgetResult]:
+    """
+    Price many itineraries in one pass.
+
+    Every day of every itinerary becomes a (country row, stay column) pair
+    into the cost matrix; per-itinerary totals are bincounts over the
+    gathered prices, so a whole catalogue costs a handful of array ops.
+    """
+    if not requests:
+        return []
+    n = len(requests)
+    lengths = np.fromiter((len(r.itinerary) for r in requests), dtype=np.int64, count=n)
+    owners = np.repeat(np.arange(n), lengths)
+    countries = [day.country for r in requests for day in r.itinerary]
+    accommodations = [day.accommodation for r in requests for day in r.itinerary]
+    row_of = {country: _country_row(country) for country in set(countries)}
+    column_of = {stay: _STAY_COLUMNS.get((stay or "").lower(), _NO_STAY) for stay in set(accommodations)}
+    rows = np.fromiter(map(row_of.__getitem__, countries), dtype=np.int64, count=len(countries))
+    stays = np.fromiter(map(column_of.__getitem__, accommodations), dtype=np.int64, count=len(countries))
+
+    prices = _COST_MATRIX[rows]
+    booked = stays != _NO_STAY
+    night_prices = prices[booked, stays[booked]]
+    stay_costs = np.zeros((n, len(STAY_TYPES)))
+    np.add.at(stay_costs, (owners[booked], stays[booked]), night_prices)
+    daily = np.stack(
+        [np.bincount(owners, weights=prices[:, col], minlength=n) for col in range(len(STAY_TYPES), prices.shape[1])],
+        axis=1,
+    )
+
+    # Spend per country, for itineraries that cross borders
+    day_totals = prices[:, len(STAY_TYPES):].sum(axis=1) + BIKE_MAINTENANCE_PER_DAY
+    day_totals[booked] += night_prices
+    by_country = np.zeros((n, len(_ROW_NAMES)))
+    np.add.at(by_country, (owners, rows), day_totals)
+
+    results = _results(stay_costs, daily, lengths)
+    starts = np.cumsum(lengths) - lengths
+    for i, request in enumerate(requests):
+        if request.simulate:
+            days = slice(starts[i], starts[i] + lengths[i])
+            amounts = np.zeros((len(_ROW_NAMES), _COST_MATRIX.shape[1]))
+            np.add.at(amounts, (rows[days], slice(len(STAY_TYPES), None)), prices[days, len(STAY_TYPES):])
+            nights = booked[days]
+            np.add.at(amounts, (rows[days][nights], stays[days][nights]), prices[days][nights, stays[days][nights]])
+            fixed = lengths[i] * BIKE_MAINTENANCE_PER_DAY
+            results[i].estimate_range = _simulate(amounts, fixed, request.trials, request.seed)
+    spent = by_country.round(2)
+    for result, row, present in zip(results, spent.tolist(), (by_country > 0).tolist()):
+        result.breakdown["by_country"] = {
+            _ROW_NAMES[col]: amount for col, (amount, seen) in enumerate(zip(row, present)) if seen
+        }
+    return results
+
+
+def _results(stay_costs: np.ndarray, daily: np.ndarray, days: np.ndarray) -> list[BudgetResult]:
+    """
+    Assemble the usual breakdown for each row of per-stay-type costs
+    (n x 3) and daily-category costs (n x 2) over ``days`` days.
+    """
+    maintenance = days * BIKE_MAINTENANCE_PER_DAY
+    accommodation = stay_costs.sum(axis=1)
+    totals = accommodation + daily.sum(axis=1) + maintenance
+    columns = np.column_stack([stay_costs, accommodation, daily, maintenance, totals / days, totals]).round(2)
+    results = []
+    for camping, hostel, hotel, total_stay, food, misc, upkeep, average, total in columns.tolist():
+        breakdown = {
+            "accommodation": {"camping": camping, "hostel": hostel, "hotel": hotel, "total": total_stay},
+            "food": food,
+            "miscellaneous": misc,
+            "bike_maintenance": upkeep,
+            "daily_average": average,
+        }
+        results.append(BudgetResult(estimated_total_eur=total, breakdown=breakdown))
+    return results
+
+
+def _simulate(amounts: np.ndarray, fixed: float, trials: int, seed: int) -> BudgetRange:
+    """
+    Monte Carlo range for a trip whose expected spend is ``amounts``
+    (countries x cost columns) plus a ``fixed`` part.
+
+    Each country's price level for a cost column is one lognormal shock
+    (mean 1, ``PRICE_SIGMA`` spread) shared by every day spent there. The
+    countries' shocks in a column are folded into one lognormal with the
+    same mean and variance (Fenton-Wilkinson), so each trial draws one
+    number per column however many borders the trip crosses.
+    """
+    mean = amounts.sum(axis=0)
+    variance = (amounts ** 2).sum(axis=0) * np.expm1(PRICE_SIGMA ** 2)
+    present = np.nonzero(mean > 0)[0]
+    sigma2 = np.log1p(variance[present] / mean[present] ** 2)
+    mu = np.log(mean[present]) - sigma2 / 2
+
+    rng = np.random.default_rng(seed)
+    draws = rng.standard_normal((trials, len(present)), dtype=np.float32)
+    np.multiply(draws, np.sqrt(sigma2).astype(np.float32), out=draws)
+    np.add(draws, mu.astype(np.float32), out=draws)
+    np.exp(draws, out=draws)
+
+    # Columns into reported categories, then the trip total
+    grouping = np.zeros((len(present), len(RANGE_CATEGORIES)), dtype=np.float32)
+    grouping[np.arange(len(present)), _CATEGORY_OF_COLUMN[present]] = 1
+    categories = draws @ grouping
+    totals = categories.sum(axis=1) + np.float32(fixed)
+
+    ranks = [round(q / 100 * (trials - 1)) for q in PERCENTILES]
+    total_marks = np.partition(totals, ranks)[ranks].tolist()
+    category_marks = np.partition(categories, ranks, axis=0)[ranks].T.tolist()
+    labels = [f"p{q}" for q in PERCENTILES]
+    return BudgetRange(
+        trials=trials,
+        **{label: round(mark, 2) for label, mark in zip(labels, total_marks)},
+        by_category={
+            category: {label: round(mark, 2) for label, mark in zip(labels, marks)}
+            for category, marks in zip(RANGE_CATEGORIES, category_marks)
         },
-        "food": round(food_cost, 2),
-        "miscellaneous": round(misc_cost, 2),
-        "bike_maintenance": round(bike_maintenance, 2),
-        "daily_average": round(estimated_total / request.days, 2),
-    }
-    
-    return BudgetResult(
-        estimated_total_eur=round(estimated_total, 2),
-        breakdown=breakdown
     )
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from src.tools.upstream import Priority, priority
+
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+CACHE_DIR = Path(os.environ.get("CYCLING_PLANNER_CACHE_DIR") or DATA_DIR / "cache")
+
+# How long failed lookups are remembered, by outcome. Kept short and separate
+# from positive TTLs; override with NEGATIVE_CACHE_TTLS='{"error": 60}'
+DEFAULT_NEGATIVE_TTLS = {
+    "not_found": 24 * 3600,  # the upstream answered, and there is no such thing
+    "empty": 6 * 3600,  # the query worked but matched nothing
+    "error": 120,  # the upstream failed or was skipped
+}
+
+
+def _load_negative_ttls() -> dict[str, float]:
+    try:
+        return {**DEFAULT_NEGATIVE_TTLS, **json.loads(os.environ.get("NEGATIVE_CACHE_TTLS") or "{}")}
+    except ValueError:
+        return dict(DEFAULT_NEGATIVE_TTLS)
+
+
+NEGATIVE_TTLS = _load_negative_ttls()
+
+# Snapshot files are rewritten at most this often, however many stores arrive
+# in between; per-key disk tiers write through
+SNAPSHOT_DELAY_S = 2.0
+
+_registry: dict[str, TTLCache] = {}
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    stored_at: float
+    stale: bool = False
+
+
+class TTLCache:
+    """Bounded LRU cache with a TTL, stale-while-revalidate and a JSON disk tier.
+
+    Entries past their TTL are still returned (flagged ``stale``) so callers can
+    answer immediately and refresh in the background. Values must be
+    JSON-serialisable when ``persist`` is enabled.
+
+    The disk tier is either a single snapshot file, rewritten atomically at
+    most every ``SNAPSHOT_DELAY_S`` after a store (and at exit or ``flush``)
+    and reloaded on construction (fine for many small entries), or
+    with ``disk_entries`` set, one file per key that is read lazily on a memory
+    miss and pruned to the ``disk_entries`` most recent (for large values).
+
+    Failed lookups are remembered separately (``set_negative``), in memory
+    only, with short per-outcome TTLs, so a known-bad key doesn't hit the
+    upstream on every request.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int = 10_000,
+        persist: bool = True,
+        disk_entries: int | None = None,
+        negative_ttls: dict[str, float] | None = None,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_entries = disk_entries
+        self.path = (CACHE_DIR / name if disk_entries else CACHE_DIR / f"{name}.json") if persist else None
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self.negative_ttls = {**NEGATIVE_TTLS, **(negative_ttls or {})}
+        self._negative: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._refreshing: set[str] = set()
+        self._lock = threading.Lock()
+        # Serialises snapshot writes so an older snapshot never replaces a newer one
+        self._save_lock = threading.Lock()
+        self._save_timer: threading.Timer | None = None
+        self._disk_writes = 0
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            **{f"negative_{reason}": 0 for reason in self.negative_ttls},
+            "negative_hits": 0,
+        }
+        previous = _registry.get(name)
+        if previous is not None:
+            # A replacement instance starts from everything its predecessor stored
+            previous.flush()
+        if not disk_entries:
+            self._load()
+        _registry[name] = self
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries.move_to_end(key)
+        if item is None and self.disk_entries:
+            item = self._read_entry(key)
+            if item is not None:
+                with self._lock:
+                    self._entries[key] = item
+                    self._evict()
+                self.stats["disk_hits"] += 1
+        if item is None:
+            self.stats["misses"] += 1
+            return None
+        value, stored_at = item
+        stale = time.time() - stored_at > self.ttl
+        self.stats["stale_hits" if stale else "hits"] += 1
+        return CacheEntry(value=value, stored_at=stored_at, stale=stale)
+
+    def get_negative(self, key: str) -> str | None:
+        """The remembered failure reason for ``key``, while its negative TTL lasts."""
+        with self._lock:
+            item = self._negative.get(key)
+            if item is None:
+                return None
+            reason, stored_at = item
+            if time.time() - stored_at > self.negative_ttls.get(reason, 0):
+                del self._negative[key]
+                return None
+            self.stats["negative_hits"] += 1
+            return reason
+
+    def set_negative(self, key: str, reason: str) -> None:
+        self.set_negative_many([key], reason)
+
+    def set_negative_many(self, keys: Iterable[str], reason: str) -> None:
+        """Remember that ``keys`` failed with ``reason`` ("not_found", "empty" or "error")."""
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                self._negative[key] = (reason, now)
+                self._negative.move_to_end(key)
+                self.stats[f"negative_{reason}"] = self.stats.get(f"negative_{reason}", 0) + 1
+            while len(self._negative) > self.max_entries:
+                self._negative.popitem(last=False)
+
+    def set(self, key: str, value: Any) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, values: dict[str, Any]) -> None:
+        if not values:
+            return
+        now = time.time()
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (value, now)
+                self._entries.move_to_end(key)
+                self._negative.pop(key, None)
+            self._evict()
+        if self.disk_entries:
+            for key, value in values.items():
+                self._write_entry(key, value, now)
+        else:
+            self._schedule_save()
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """Return a cached value, loading it on a miss.
+
+        Stale values are returned as-is and refreshed on a background thread.
+        A ``None`` result is remembered as "not_found" and an exception as
+        "error" (and re-raised); either way the key returns None until its
+        negative TTL runs out.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            if entry.stale:
+                self.refresh([key], lambda keys: {key: loader()})
+            return entry.value
+        if self.get_negative(key):
+            return None
+        try:
+            value = loader()
+        except Exception:
+            self.set_negative(key, "error")
+            raise
+        if value is None:
+            self.set_negative(key, "not_found")
+        else:
+            self.set(key, value)
+        return value
+
+    def refresh(self, keys: Iterable[str], fetch: Callable[[list[str]], dict[str, Any]]) -> None:
+        """Reload ``keys`` in the background; keys already being refreshed are skipped."""
+        with self._lock:
+            pending = [key for key in keys if key not in self._refreshing]
+            self._refreshing.update(pending)
+        if not pending:
+            return
+
+        def run() -> None:
+            try:
+                with priority(Priority.BACKGROUND):
+                    fetched = fetch(pending)
+                self.set_many({k: v for k, v in fetched.items() if v is not None})
+                self.stats["refreshes"] += 1
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(pending)
+
+        threading.Thread(target=run, name=f"{self.name}-refresh", daemon=True).start()
+
+    def flush(self) -> None:
+        """Write a pending snapshot now rather than when its timer fires."""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self._save()
+
+    def clear(self, disk: bool = False) -> None:
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            self._entries.clear()
+            self._negative.clear()
+            self._refreshing.clear()
+            for stat in self.stats:
+                self.stats[stat] = 0
+        if disk and self.path is not None and self.path.exists():
+            for file in self.path.glob("*.json") if self.path.is_dir() else [self.path]:
+                file.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    def _read_entry(self, key: str) -> tuple[Any, float] | None:
+        if self.path is None:
+            return None
+        try:
+            data = json.loads(self._entry_path(key).read_text())
+            return (data["value"], data["stored_at"]) if data["key"] == key else None
+        except Exception:
+            return None
+
+    def _write_entry(self, key: str, value: Any, stored_at: float) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            _write_atomic(self._entry_path(key), json.dumps({"key": key, "value": value, "stored_at": stored_at}))
+            self._disk_writes += 1
+            if self._disk_writes % 100 == 0:
+                self._prune_disk()
+        except Exception:
+            pass
+
+    def _prune_disk(self) -> None:
+        files = sorted(self.path.glob("*.json"), key=lambda f: f.stat().st_mtime)
+        for file in files[: max(0, len(files) - self.disk_entries)]:
+            file.unlink(missing_ok=True)
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+            for key, (value, stored_at) in data.items():
+                self._entries[key] = (value, stored_at)
+        except Exception:
+            self._entries.clear()
+
+    def _schedule_save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SNAPSHOT_DELAY_S, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        with self._save_lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self._lock:
+                    payload = json.dumps(dict(self._entries))
+                _write_atomic(self.path, payload)
+            except Exception:
+                pass
+
+
+def _write_atomic(target: Path, text: str) -> None:
+    """Write ``text`` to a temp file of its own next to ``target``, then swap it into place."""
+    tmp = tempfile.NamedTemporaryFile("w", dir=target.parent, prefix=f".{target.stem}.", suffix=".tmp", delete=False)
+    try:
+        with tmp:
+            tmp.write(text)
+        os.replace(tmp.name, target)
+    except BaseException:
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
+
+
+def get_cache_stats() -> dict[str, dict[str, int]]:
+    """Hit/miss counters for every cache in the process."""
+    return {
+        name: {**cache.stats, "entries": len(cache), "negative_entries": len(cache._negative)}
+        for name, cache in _registry.items()
+    }
+
+
+def flush_all_caches() -> None:
+    """Write every pending snapshot, e.g. before the process exits."""
+    for cache in list(_registry.values()):
+        cache.flush()
+
+
+atexit.register(flush_all_caches)
+
+
+def clear_all_caches(disk: bool = False) -> None:
+    """Empty every in-memory cache, and optionally its disk tier too."""
+    for cache in _registry.values():
+        cache.clear(disk=disk)
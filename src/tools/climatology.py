@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import calendar
+import json
+import os
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from src.tools.upstream import throttle
+
+
+# Layout of the value array: (month, field, lat, lon), float32, NaN where unknown
+FIELDS = ("avg_temp_c", "precipitation_mm", "rain_days")
+RAIN_DAY_THRESHOLD_MM = 1.0
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+DEFAULT_PATH = DATA_DIR / "climatology.npy"
+
+_store: ClimatologyStore | None = None
+_store_loaded = False
+
+
+class ClimatologyStore:
+    """Monthly climate normals on a regular lat/lon grid.
+
+    Values live in a single ``.npy`` array that is memory-mapped on load, with
+    the grid origin and step stored in a JSON sidecar next to it. Lookups are
+    O(1): the cell is found by index arithmetic and the four surrounding grid
+    points are bilinearly interpolated.
+    """
+
+    def __init__(self, values: np.ndarray, south: float, west: float, step: float) -> None:
+        if values.ndim != 4 or values.shape[:2] != (12, len(FIELDS)):
+            raise ValueError(f"Expected shape (12, {len(FIELDS)}, n_lat, n_lon), got {values.shape}")
+        self.values = values
+        self.south = float(south)
+        self.west = float(west)
+        self.step = float(step)
+        self.n_lat, self.n_lon = values.shape[2], values.shape[3]
+
+    @property
+    def north(self) -> float:
+        return self.south + (self.n_lat - 1) * self.step
+
+    @property
+    def east(self) -> float:
+        return self.west + (self.n_lon - 1) * self.step
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> ClimatologyStore:
+        path = Path(path)
+        meta = json.loads(path.with_suffix(".json").read_text())
+        values = np.load(path, mmap_mode="r")
+        return cls(values, meta["south"], meta["west"], meta["step"])
+
+    def save(self, path: str | os.PathLike) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path, np.ascontiguousarray(self.values, dtype=np.float32))
+        meta = {"south": self.south, "west": self.west, "step": self.step, "fields": list(FIELDS)}
+        path.with_suffix(".json").write_text(json.dumps(meta))
+
+    def covers(self, lat: float, lon: float) -> bool:
+        return self.south <= lat <= self.north and self.west <= lon <= self.east
+
+    def lookup(self, lat: float, lon: float, month: int) -> dict[str, float] | None:
+        """Interpolate the normals for ``month`` (1-12) at a coordinate."""
+        if not self.covers(lat, lon) or not 1 <= month <= 12:
+            return None
+
+        y = (lat - self.south) / self.step
+        x = (lon - self.west) / self.step
+        i = min(int(y), self.n_lat - 2) if self.n_lat > 1 else 0
+        j = min(int(x), self.n_lon - 2) if self.n_lon > 1 else 0
+        fy, fx = y - i, x - j
+
+        block = np.asarray(self.values[month - 1, :, i:i + 2, j:j + 2], dtype=np.float64)
+        weights = np.array([[(1 - fy) * (1 - fx), (1 - fy) * fx], [fy * (1 - fx), fy * fx]])
+        weights = weights[: block.shape[1], : block.shape[2]]
+
+        # Ignore missing grid points (e.g. over sea) and renormalise the rest
+        valid = ~np.isnan(block)
+        weighted = np.where(valid, block, 0.0) * weights
+        norm = (valid * weights).sum(axis=(1, 2))
+        if np.any(norm <= 0):
+            return None
+        result = weighted.sum(axis=(1, 2)) / norm
+        return dict(zip(FIELDS, (float(v) for v in result)))
+
+
+def get_store() -> ClimatologyStore | None:
+    """Return the process-wide climatology store, loading it on first use."""
+    global _store, _store_loaded
+    if not _store_loaded:
+        _store_loaded = True
+        path = Path(os.environ.get("CLIMATOLOGY_PATH") or DEFAULT_PATH)
+        if path.exists():
+            try:
+                _store = ClimatologyStore.load(path)
+            except Exception:
+                _store = None
+    return _store
+
+
+def set_store(store: ClimatologyStore | None) -> None:
+    """Install a store explicitly (used by tests and the build script)."""
+    global _store, _store_loaded
+    _store = store
+    _store_loaded = True
+
+
+def build_climatology(
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    step: float = 0.5,
+    start_year: int = 2014,
+    end_year: int = 2023,
+    batch_size: int = 50,
+) -> ClimatologyStore:
+    """Build a store from the Open-Meteo archive.
+
+    Daily means and precipitation over ``start_year``..``end_year`` are reduced
+    to per-month normals: mean temperature, mean monthly precipitation total
+    and mean number of days with at least ``RAIN_DAY_THRESHOLD_MM`` of rain.
+    """
+    lats = np.arange(south, north + step / 2, step)
+    lons = np.arange(west, east + step / 2, step)
+    values = np.full((12, len(FIELDS), len(lats), len(lons)), np.nan, dtype=np.float32)
+    n_years = end_year - start_year + 1
+
+    points = [(i, j) for i in range(len(lats)) for j in range(len(lons))]
+    for offset in range(0, len(points), batch_size):
+        batch = points[offset:offset + batch_size]
+        params = {
+            "latitude": ",".join(f"{lats[i]:.4f}" for i, _ in batch),
+            "longitude": ",".join(f"{lons[j]:.4f}" for _, j in batch),
+            "start_date": f"{start_year}-01-01",
+            "end_date": f"{end_year}-12-31",
+            "daily": "temperature_2m_mean,precipitation_sum",
+            "timezone": "GMT",
+        }
+        throttle("open_meteo")
+        with httpx.Client(timeout=120.0) as client:
+            response = client.get("https://archive-api.open-meteo.com/v1/archive", params=params)
+            response.raise_for_status()
+            data = response.json()
+        if isinstance(data, dict):
+            data = [data]
+
+        for (i, j), location in zip(batch, data):
+            daily = location.get("daily", {})
+            months = np.array([int(d[5:7]) for d in daily.get("time", [])])
+            temps = np.array(daily.get("temperature_2m_mean", []), dtype=float)
+            precip = np.array(daily.get("precipitation_sum", []), dtype=float)
+            if not len(months):
+                continue
+            for month in range(1, 13):
+                mask = months == month
+                values[month - 1, 0, i, j] = np.nanmean(temps[mask])
+                values[month - 1, 1, i, j] = np.nansum(precip[mask]) / n_years
+                values[month - 1, 2, i, j] = np.sum(precip[mask] >= RAIN_DAY_THRESHOLD_MM) / n_years
+
+    return ClimatologyStore(values, float(lats[0]), float(lons[0]), step)
+
+
+def month_number(month: str) -> int | None:
+    """Map an English month name (any case) to 1-12."""
+    names = [name.lower() for name in calendar.month_name]
+    try:
+        return names.index(month.lower().strip()) or None
+    except ValueError:
+        return None
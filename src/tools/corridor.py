@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.tools.spatial import KM_PER_DEG_LAT, GridIndex, haversine_km
+
+
+# Towns further than this from the route line are not on the way
+DEFAULT_CORRIDOR_KM = 5.0
+
+
+@dataclass
+class CorridorMatches:
+    """Candidates within the corridor, ordered by distance along the route."""
+
+    ids: np.ndarray
+    along_km: np.ndarray
+    offset_km: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def cumulative_km(lats, lons) -> np.ndarray:
+    """Distance along a polyline at every vertex, starting at 0."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    steps = haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    return np.concatenate([[0.0], np.cumsum(steps)])
+
+
+def densify(lats, lons, max_step_km: float) -> tuple[np.ndarray, np.ndarray]:
+    """Insert vertices so no segment is longer than ``max_step_km``."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if len(lats) < 2:
+        return lats, lons
+    steps = haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    pieces = np.maximum(1, np.ceil(steps / max_step_km).astype(np.int64))
+    seg = np.repeat(np.arange(len(steps)), pieces)
+    frac = (np.arange(len(seg)) - np.repeat(np.cumsum(pieces) - pieces, pieces)) / np.repeat(pieces, pieces)
+    out_lats = np.append(lats[seg] + (lats[seg + 1] - lats[seg]) * frac, lats[-1])
+    out_lons = np.append(lons[seg] + (lons[seg + 1] - lons[seg]) * frac, lons[-1])
+    return out_lats, out_lons
+
+
+def project_onto_polyline(
+    route_lats,
+    route_lons,
+    cand_lats,
+    cand_lons,
+    corridor_km: float = DEFAULT_CORRIDOR_KM,
+) -> CorridorMatches:
+    """
+    Project candidate points onto a route polyline and keep those within ``corridor_km``.
+
+    Candidates are prefiltered to the route's padded bounding box, then matched
+    to their nearest (densified) route vertex through a grid index. Only the
+    two segments touching that vertex are projected, so the cost grows with
+    route points + candidates rather than their product.
+    """
+    cand_lats = np.asarray(cand_lats, dtype=np.float64)
+    cand_lons = np.asarray(cand_lons, dtype=np.float64)
+    empty = CorridorMatches(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+    if len(route_lats) < 2 or not len(cand_lats):
+        return empty
+
+    step_km = max(corridor_km, 0.5)
+    lats, lons = densify(route_lats, route_lons, step_km)
+    along = cumulative_km(lats, lons)
+
+    # Cheap bounding-box prefilter before touching the grid
+    pad_lat = corridor_km / KM_PER_DEG_LAT
+    pad_lon = pad_lat / max(np.cos(np.radians(np.abs(lats).max())), 0.01)
+    in_box = (
+        (cand_lats >= lats.min() - pad_lat) & (cand_lats <= lats.max() + pad_lat)
+        & (cand_lons >= lons.min() - pad_lon) & (cand_lons <= lons.max() + pad_lon)
+    )
+    cand_ids = np.nonzero(in_box)[0]
+    if not len(cand_ids):
+        return empty
+
+    vertex_index = GridIndex(lats, lons, cell_deg=max(step_km / KM_PER_DEG_LAT, 0.02))
+    vertex, _ = vertex_index.nearest(cand_lats[cand_ids], cand_lons[cand_ids], max_km=corridor_km + step_km)
+    near = vertex >= 0
+    cand_ids, vertex = cand_ids[near], vertex[near]
+    if not len(cand_ids):
+        return empty
+
+    # Project onto the segments before and after the nearest vertex; keep the closer one
+    p_lat, p_lon = cand_lats[cand_ids], cand_lons[cand_ids]
+    best_offset = np.full(len(cand_ids), np.inf)
+    best_along = np.zeros(len(cand_ids))
+    last = len(lats) - 1
+    for start in (np.maximum(vertex - 1, 0), np.minimum(vertex, last - 1)):
+        offset, position = _project_on_segments(lats, lons, along, start, p_lat, p_lon)
+        better = offset < best_offset
+        best_offset[better] = offset[better]
+        best_along[better] = position[better]
+
+    keep = best_offset <= corridor_km
+    order = np.argsort(best_along[keep], kind="stable")
+    return CorridorMatches(
+        ids=cand_ids[keep][order],
+        along_km=best_along[keep][order],
+        offset_km=best_offset[keep][order],
+    )
+
+
+def _project_on_segments(lats, lons, along, start, p_lat, p_lon) -> tuple[np.ndarray, np.ndarray]:
+    """Perpendicular offset and along-route position of points on segments ``start -> start+1``."""
+    scale_x = KM_PER_DEG_LAT * np.cos(np.radians(p_lat))
+    ax, ay = (lons[start] - p_lon) * scale_x, (lats[start] - p_lat) * KM_PER_DEG_LAT
+    bx, by = (lons[start + 1] - p_lon) * scale_x, (lats[start + 1] - p_lat) * KM_PER_DEG_LAT
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    t = np.clip(np.where(length_sq > 0, -(ax * dx + ay * dy) / np.where(length_sq > 0, length_sq, 1), 0.0), 0, 1)
+    offset = np.hypot(ax + t * dx, ay + t * dy)
+    position = along[start] + t * (along[start + 1] - along[start])
+    return offset, position
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+
+# ISO 3166-1 alpha-2 code -> display name for every country the tools know about
+COUNTRY_NAMES = {
+    "AT": "Austria", "BE": "Belgium", "BG": "Bulgaria", "CH": "Switzerland", "CY": "Cyprus",
+    "CZ": "Czechia", "DE": "Germany", "DK": "Denmark", "EE": "Estonia", "ES": "Spain",
+    "FI": "Finland", "FR": "France", "GB": "United Kingdom", "GR": "Greece", "HR": "Croatia",
+    "HU": "Hungary", "IE": "Ireland", "IS": "Iceland", "IT": "Italy", "LI": "Liechtenstein",
+    "LT": "Lithuania", "LU": "Luxembourg", "LV": "Latvia", "MT": "Malta", "NL": "Netherlands",
+    "NO": "Norway", "PL": "Poland", "PT": "Portugal", "RO": "Romania", "SE": "Sweden",
+    "SI": "Slovenia", "SK": "Slovakia",
+    "AE": "United Arab Emirates", "AR": "Argentina", "AU": "Australia", "BR": "Brazil",
+    "CA": "Canada", "CL": "Chile", "IL": "Israel", "JP": "Japan", "KR": "South Korea",
+    "MX": "Mexico", "NZ": "New Zealand", "SG": "Singapore", "US": "United States",
+}
+
+# Other names, local names and demonyms people type for the same countries
+_ALIASES = {
+    "holland": "NL", "the netherlands": "NL", "nederland": "NL", "dutch": "NL",
+    "deutschland": "DE", "german": "DE",
+    "danmark": "DK", "danish": "DK",
+    "sverige": "SE", "swedish": "SE",
+    "norge": "NO", "norwegian": "NO",
+    "belgian": "BE", "french": "FR", "swiss": "CH", "austrian": "AT", "italian": "IT",
+    "espana": "ES", "spanish": "ES", "portuguese": "PT", "polish": "PL", "irish": "IE",
+    "czech republic": "CZ", "czech": "CZ",
+    "uk": "GB", "britain": "GB", "great britain": "GB", "british": "GB",
+    "england": "GB", "scotland": "GB", "wales": "GB", "northern ireland": "GB",
+    "usa": "US", "us": "US", "united states of america": "US", "america": "US", "american": "US",
+    "uae": "AE", "korea": "KR", "republic of korea": "KR",
+    "canadian": "CA", "australian": "AU", "japanese": "JP",
+}
+
+COUNTRY_ALIASES = {**{name.lower(): code for code, name in COUNTRY_NAMES.items()}, **_ALIASES}
+
+
+def country_code(name: str | None) -> str | None:
+    """ISO alpha-2 code for a country name, alias, demonym or code; None when unrecognised."""
+    key = " ".join((name or "").lower().replace(".", "").split())
+    if key in COUNTRY_ALIASES:
+        return COUNTRY_ALIASES[key]
+    return key.upper() if len(key) == 2 and key.isalpha() else None
+
+
+def country_name(code: str) -> str:
+    """Display name for an ISO code, or the code itself when unknown."""
+    return COUNTRY_NAMES.get(code, code)
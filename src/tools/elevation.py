@@ -3,6 +3,13 @@ from __future__ import annotations
 import httpx
 from pydantic import BaseModel
 
+from src.tools.geocoding import geocode
+from src.tools.singleflight import SingleFlight
+from src.tools.upstream import guard
+
+
+_flight = SingleFlight("open_elevation")
+
 
 class ElevationRequest(BaseModel):
     origin: str
@@ -12,6 +19,7 @@ class ElevationRequest(BaseModel):
 class ElevationResult(BaseModel):
     total_elevation_gain_m: float
     difficulty: str
+    source: str = "mock"
 
 
 def get_elevation_profile(request: ElevationRequest) -> ElevationResult:
@@ -24,7 +32,8 @@ def get_elevation_profile(request: ElevationRequest) -> ElevationResult:
         dest_coords = _geocode_location(request.destination)
         
         if origin_coords and dest_coords:
-            elevation_data = _fetch_elevation(origin_coords, dest_coords)
+            key = f"{origin_coords[0]:.4f},{origin_coords[1]:.4f}:{dest_coords[0]:.4f},{dest_coords[1]:.4f}"
+            elevation_data = _flight.do(key, lambda: _fetch_elevation(origin_coords, dest_coords))
             if elevation_data:
                 return elevation_data
     except Exception:
@@ -33,32 +42,14 @@ def get_elevation_profile(request: ElevationRequest) -> ElevationResult:
     # Fallback to heuristic mock
     if any(city.lower() in {"bergen", "innsbruck", "geneva", "salzburg", "alps"} 
            for city in [request.origin, request.destination]):
-        return ElevationResult(total_elevation_gain_m=5200.0, difficulty="hard")
+        return ElevationResult(total_elevation_gain_m=5200.0, difficulty="hard", source="heuristic")
     
-    return ElevationResult(total_elevation_gain_m=1800.0, difficulty="moderate")
+    return ElevationResult(total_elevation_gain_m=1800.0, difficulty="moderate", source="heuristic")
 
 
 def _geocode_location(location: str) -> tuple[float, float] | None:
-    """Geocode location using Nominatim API."""
-    try:
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            "q": location,
-            "format": "json",
-            "limit": 1
-        }
-        headers = {"User-Agent": "CyclingPlanner/1.0"}
-        
-        with httpx.Client(timeout=10.0) as client:
-            response = client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            results = response.json()
-            
-            if results:
-                return (float(results[0]["lat"]), float(results[0]["lon"]))
-    except Exception:
-        pass
-    return None
+    """Geocode location via the local gazetteer, falling back to Nominatim."""
+    return geocode(location)
 
 
 def _fetch_elevation(origin: tuple[float, float], dest: tuple[float, float]) -> ElevationResult | None:
@@ -79,7 +70,7 @@ def _fetch_elevation(origin: tuple[float, float], dest: tuple[float, float]) ->
     try:
         url = "https://api.open-elevation.com/api/v1/lookup"
         
-        with httpx.Client(timeout=30.0) as client:
+        with guard("open_elevation") as timeout, httpx.Client(timeout=timeout) as client:
             response = client.post(url, json={"locations": locations})
             response.raise_for_status()
             data = response.json()
@@ -105,7 +96,8 @@ def _fetch_elevation(origin: tuple[float, float], dest: tuple[float, float]) ->
                 
                 return ElevationResult(
                     total_elevation_gain_m=round(total_gain, 1),
-                    difficulty=difficulty
+                    difficulty=difficulty,
+                    source="open_elevation",
                 )
     except Exception:
         pass
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# How many trigram candidates get the (more expensive) edit-distance re-rank
+RERANK_CANDIDATES = 25
+
+
+@dataclass(frozen=True)
+class FuzzyMatch:
+    key: str
+    index: int
+    score: float
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance with a single rolling row."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class TrigramIndex:
+    """Inverted trigram index over already-normalised keys.
+
+    A query gathers the posting lists of its trigrams, scores keys by Dice
+    overlap with one ``bincount``, and re-ranks the best few by edit distance.
+    """
+
+    def __init__(self, keys: list[str]) -> None:
+        self.keys = keys
+        postings: dict[str, list[int]] = defaultdict(list)
+        counts = np.zeros(len(keys), dtype=np.int32)
+        for idx, key in enumerate(keys):
+            grams = trigrams(key)
+            counts[idx] = len(grams)
+            for gram in grams:
+                postings[gram].append(idx)
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._gram_counts = counts
+
+    def search(self, query: str, limit: int = 5) -> list[FuzzyMatch]:
+        """Closest keys to a normalised ``query``, best first, scored 0..1."""
+        grams = trigrams(query)
+        hits = [self._postings[g] for g in grams if g in self._postings]
+        if not hits:
+            return []
+
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.keys))
+        # Only keys sharing a trigram can match; pick the top few without sorting them all
+        candidates = np.nonzero(shared)[0]
+        dice = 2 * shared[candidates] / (len(grams) + self._gram_counts[candidates])
+        if len(candidates) > RERANK_CANDIDATES:
+            top = np.argpartition(-dice, RERANK_CANDIDATES - 1)[:RERANK_CANDIDATES]
+            candidates, dice = candidates[top], dice[top]
+        candidates = candidates[np.lexsort((candidates, -dice))]
+
+        matches = []
+        for idx in candidates:
+            key = self.keys[idx]
+            similarity = 1 - edit_distance(query, key) / max(len(query), len(key))
+            matches.append(FuzzyMatch(key=key, index=int(idx), score=round(float(similarity), 3)))
+        matches.sort(key=lambda m: -m.score)
+        return matches[:limit]
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import os
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from src.tools.countries import country_code
+from src.tools.fuzzy import TrigramIndex
+from src.tools.spatial import GridIndex
+
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+DEFAULT_PATH = DATA_DIR / "settlements.tsv"
+
+# Prefix matches on very short queries ("Ha") are mostly noise
+MIN_PREFIX_LENGTH = 4
+
+# Fuzzy matches must be this similar (1 - normalised edit distance), and this
+# far ahead of the runner-up, before we silently auto-correct a place name
+AUTOCORRECT_MIN_SCORE = 0.75
+AUTOCORRECT_MIN_MARGIN = 0.05
+
+# Letters NFKD doesn't decompose into base + combining mark
+_FOLD = str.maketrans({"ß": "ss", "ø": "o", "Ø": "o", "æ": "ae", "Æ": "ae", "ł": "l", "Ł": "l", "đ": "d", "ı": "i"})
+
+_gazetteer: Gazetteer | None = None
+_gazetteer_loaded = False
+
+
+def normalize_name(text: str) -> str:
+    """Fold case, diacritics and punctuation so "Lübeck" and "lubeck" compare equal."""
+    folded = unicodedata.normalize("NFKD", text.translate(_FOLD))
+    stripped = "".join(ch for ch in folded if not unicodedata.combining(ch)).lower()
+    return re.sub(r"[\W_]+", " ", stripped).strip()
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    country: str
+    lat: float
+    lon: float
+    population: int
+
+
+class Gazetteer:
+    """Settlements held in parallel NumPy arrays with a sorted name-prefix index.
+
+    Every primary and alternate name is normalised into one sorted key list that
+    points back at row ids, so exact and prefix resolution are two bisections.
+    Ambiguous names ("Frankfurt", "Halle") resolve to the most populous match.
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        countries: list[str],
+        lats: list[float],
+        lons: list[float],
+        populations: list[int],
+        alternate_names: list[list[str]] | None = None,
+    ) -> None:
+        self.names = list(names)
+        self.countries = np.asarray(countries, dtype="U2")
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.populations = np.asarray(populations, dtype=np.int64)
+
+        alternate_names = alternate_names or [[] for _ in self.names]
+        pairs = sorted(
+            {
+                (key, idx)
+                for idx, (name, alternates) in enumerate(zip(self.names, alternate_names))
+                for key in (normalize_name(n) for n in [name, *alternates])
+                if key
+            }
+        )
+        self._keys = [key for key, _ in pairs]
+        self._ids = np.fromiter((idx for _, idx in pairs), dtype=np.int32, count=len(pairs))
+        self._trigrams: TrigramIndex | None = None
+        self._spatial: dict[int, tuple[GridIndex, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_geonames(cls, path: str | os.PathLike, min_population: int = 0) -> Gazetteer:
+        """Load a GeoNames ``cities*.txt`` / ``XX.txt`` dump (populated places only)."""
+        names, countries, lats, lons, populations, alternates = [], [], [], [], [], []
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) < 15 or cols[6] != "P":
+                    continue
+                population = int(cols[14] or 0)
+                if population < min_population:
+                    continue
+                names.append(cols[1])
+                alternates.append([cols[2], *filter(None, cols[3].split(","))])
+                lats.append(float(cols[4]))
+                lons.append(float(cols[5]))
+                countries.append(cols[8])
+                populations.append(population)
+        return cls(names, countries, lats, lons, populations, alternates)
+
+    def place(self, idx: int) -> Place:
+        return Place(
+            name=self.names[idx],
+            country=str(self.countries[idx]),
+            lat=float(self.lats[idx]),
+            lon=float(self.lons[idx]),
+            population=int(self.populations[idx]),
+        )
+
+    def lookup(self, query: str, country: str | None = None, limit: int = 5) -> list[Place]:
+        """Exact name matches, else prefix matches, most populous first."""
+        key = normalize_name(query)
+        if not key:
+            return []
+        ids = self._matching_ids(key, prefix=False)
+        if not len(ids) and len(key) >= MIN_PREFIX_LENGTH:
+            ids = self._matching_ids(key, prefix=True)
+        if country:
+            ids = ids[self.countries[ids] == country.upper()]
+        ranked = ids[np.argsort(-self.populations[ids], kind="stable")][:limit]
+        return [self.place(int(idx)) for idx in ranked]
+
+    def resolve(self, query: str) -> Place | None:
+        """Best match for free text such as "Lubeck" or "Copenhagen, Denmark"."""
+        name, _, qualifier = query.partition(",")
+        qualifier = normalize_name(qualifier)
+        country = country_code(qualifier)
+        matches = self.lookup(name, country=country, limit=1)
+        if not matches and country:
+            matches = self.lookup(name, limit=1)
+        return matches[0] if matches else None
+
+    def fuzzy_lookup(self, query: str, limit: int = 5) -> list[tuple[Place, float]]:
+        """Closest places to a possibly misspelled name, with 0..1 similarity scores."""
+        key = normalize_name(query)
+        if not key:
+            return []
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex(self._keys)
+
+        best: dict[int, float] = {}
+        for match in self._trigrams.search(key, limit=limit * 3):
+            idx = int(self._ids[match.index])
+            best[idx] = max(best.get(idx, 0.0), match.score)
+        ranked = sorted(best.items(), key=lambda item: (-item[1], -self.populations[item[0]]))
+        return [(self.place(idx), score) for idx, score in ranked[:limit]]
+
+    def autocorrect(self, query: str) -> Place | None:
+        """Resolve a name, correcting a misspelling only when one candidate is clearly best."""
+        place = self.resolve(query)
+        if place:
+            return place
+        candidates = self.fuzzy_lookup(query.partition(",")[0], limit=2)
+        if not candidates or candidates[0][1] < AUTOCORRECT_MIN_SCORE:
+            return None
+        if len(candidates) > 1 and candidates[0][1] - candidates[1][1] < AUTOCORRECT_MIN_MARGIN:
+            return None
+        return candidates[0][0]
+
+    def nearest_places(
+        self, lats, lons, min_population: int = 0, max_km: float = 25.0
+    ) -> list[Place | None]:
+        """Reverse geocode a batch of coordinates to the closest sufficiently large place."""
+        index, ids = self.spatial_index(min_population)
+        nearest, _ = index.nearest(lats, lons, max_km)
+        return [self.place(int(ids[i])) if i >= 0 else None for i in nearest]
+
+    def spatial_index(self, min_population: int = 0) -> tuple[GridIndex, np.ndarray]:
+        """Grid index over places with at least ``min_population``, plus their row ids."""
+        if min_population not in self._spatial:
+            ids = np.nonzero(self.populations >= min_population)[0]
+            self._spatial[min_population] = (GridIndex(self.lats[ids], self.lons[ids]), ids)
+        return self._spatial[min_population]
+
+    def _matching_ids(self, key: str, prefix: bool) -> np.ndarray:
+        lo = bisect_left(self._keys, key)
+        hi = bisect_left(self._keys, key + "\uffff") if prefix else bisect_right(self._keys, key)
+        return np.unique(self._ids[lo:hi])
+
+
+def get_gazetteer() -> Gazetteer | None:
+    """Return the process-wide gazetteer, loading it on first use."""
+    global _gazetteer, _gazetteer_loaded
+    if not _gazetteer_loaded:
+        _gazetteer_loaded = True
+        path = Path(os.environ.get("GAZETTEER_PATH") or DEFAULT_PATH)
+        if path.exists():
+            try:
+                _gazetteer = Gazetteer.from_geonames(path)
+            except Exception:
+                _gazetteer = None
+    return _gazetteer
+
+
+def set_gazetteer(gazetteer: Gazetteer | None) -> None:
+    """Install a gazetteer explicitly (used by tests)."""
+    global _gazetteer, _gazetteer_loaded
+    _gazetteer = gazetteer
+    _gazetteer_loaded = True
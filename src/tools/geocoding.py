@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import httpx
+
+from src.tools.cache import TTLCache
+from src.tools.gazetteer import Place, get_gazetteer, normalize_name
+from src.tools.singleflight import SingleFlight
+from src.tools.upstream import guard
+
+
+# Synthetic stops snap to towns at least this big and at most this far away
+REVERSE_GEOCODE_MIN_POPULATION = 5000
+REVERSE_GEOCODE_MAX_KM = 40.0
+
+# Places don't move; unknown names ("Waypoint 3") are remembered as not found
+GEOCODE_CACHE_TTL = 90 * 24 * 3600
+_cache = TTLCache("geocode", ttl=GEOCODE_CACHE_TTL, max_entries=20_000)
+_flight = SingleFlight("nominatim")
+
+
+def geocode(location: str) -> tuple[float, float] | None:
+    """
+    Resolve a place name to (lat, lon).
+    Uses the local gazetteer first and only asks Nominatim about misses,
+    which keeps us well inside its one-request-per-second usage policy.
+    Nominatim answers are cached, including "not found" and failures (briefly).
+    """
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        place = gazetteer.resolve(location)
+        if place:
+            return (place.lat, place.lon)
+    key = normalize_name(location)
+    try:
+        coords = _cache.get_or_load(key, lambda: _flight.do(key, lambda: _nominatim_search(location)))
+    except Exception:
+        return None
+    return tuple(coords) if coords else None
+
+
+def reverse_geocode_batch(
+    coords: list[tuple[float, float]],
+    min_population: int = REVERSE_GEOCODE_MIN_POPULATION,
+    max_km: float = REVERSE_GEOCODE_MAX_KM,
+) -> list[Place | None]:
+    """Nearest real town for each (lat, lon), answered locally in one batch query."""
+    gazetteer = get_gazetteer()
+    if gazetteer is None or not coords:
+        return [None] * len(coords)
+    lats, lons = zip(*coords)
+    return gazetteer.nearest_places(lats, lons, min_population=min_population, max_km=max_km)
+
+
+def _nominatim_search(location: str) -> tuple[float, float] | None:
+    """Geocode location using Nominatim API; None when it has no match, raises when it fails."""
+    url = "https://nominatim.openstreetmap.org/search"
+    params = {
+        "q": location,
+        "format": "json",
+        "limit": 1
+    }
+    headers = {"User-Agent": "CyclingPlanner/1.0"}
+    
+    with guard("nominatim", timeout=10.0) as timeout, httpx.Client(timeout=timeout) as client:
+        response = client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        results = response.json()
+    
+    if results:
+        return (float(results[0]["lat"]), float(results[0]["lon"]))
+    return None
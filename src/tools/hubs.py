@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import heapq
+import threading
+from collections import Counter
+
+import numpy as np
+
+from src.tools.corridor import project_onto_polyline
+from src.tools.gazetteer import Gazetteer, get_gazetteer
+from src.tools.spatial import haversine_km
+
+
+# Towns this big, thinned to at most one per HUB_SPACING_KM (largest first),
+# are the canonical points long routes are cut at
+HUB_MIN_POPULATION = 50_000
+HUB_SPACING_KM = 40.0
+# Hubs this close to the straight line between two stops are on the way
+HUB_CORRIDOR_KM = 20.0
+# Stops closer than this to a hub start or end at it rather than beside it
+HUB_END_KM = 10.0
+# Shorter trips are routed directly; cutting them would only add legs
+HUB_MIN_TRIP_KM = 100.0
+# A cached chain may start and end this far from the trip's own ends...
+HUB_ENTRY_KM = 50.0
+# ...as long as the whole trip stays within this much of a direct route
+MAX_CHAIN_DETOUR = 1.15
+# and the links cover at least this share of it
+MIN_CHAIN_COVER = 0.5
+# Straight-line km times this estimates the road distance of an unrouted stretch
+ROAD_FACTOR = 1.2
+
+_hubs: HubSet | None = None
+_hubs_source: Gazetteer | None = None
+_lock = threading.Lock()
+_stats: Counter[str] = Counter()
+_stats_lock = threading.Lock()
+
+
+class HubSet:
+    """Well-spread large towns from the gazetteer, as canonical cut points.
+
+    Trips that overlap pass the same hubs, so the legs between hubs are the
+    same (lat, lon) pairs for all of them and can be served from one cache.
+    Routed hub-to-hub legs are remembered as links, and a new trip first
+    looks for a chain of links from near its start to near its end.
+    """
+
+    def __init__(self, lats, lons, names: list[str]) -> None:
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.names = names
+        self._links: dict[int, dict[int, float]] = {}
+        self._links_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_gazetteer(
+        cls, gazetteer: Gazetteer, min_population: int = HUB_MIN_POPULATION, spacing_km: float = HUB_SPACING_KM
+    ) -> HubSet:
+        ids = np.nonzero(gazetteer.populations >= min_population)[0]
+        ids = ids[np.argsort(-gazetteer.populations[ids], kind="stable")]
+        kept: list[int] = []
+        for idx in ids:
+            gaps = haversine_km(gazetteer.lats[idx], gazetteer.lons[idx], gazetteer.lats[kept], gazetteer.lons[kept])
+            if not len(kept) or gaps.min() >= spacing_km:
+                kept.append(int(idx))
+        kept.sort()
+        return cls(gazetteer.lats[kept], gazetteer.lons[kept], [gazetteer.names[i] for i in kept])
+
+    def point(self, hub: int) -> tuple[float, float]:
+        return (float(self.lats[hub]), float(self.lons[hub]))
+
+    def at(self, lat: float, lon: float, max_km: float = 1.0) -> int:
+        """The hub a (lat, lon) point is, or -1 (stops named after a hub town are at it)."""
+        if not len(self):
+            return -1
+        gaps = haversine_km(lat, lon, self.lats, self.lons)
+        nearest = int(np.argmin(gaps))
+        return nearest if gaps[nearest] <= max_km else -1
+
+    def chain(self, start: tuple[float, float], end: tuple[float, float]) -> list[int]:
+        """
+        Hubs to cut a trip from ``start`` to ``end`` (lat, lon) at, in order:
+        a chain of already-routed links when one covers the trip without much
+        of a detour, else the hubs along the straight line.
+        """
+        total = float(haversine_km(start[0], start[1], end[0], end[1]))
+        if not len(self) or total < HUB_MIN_TRIP_KM:
+            return []
+        return self._linked_chain(start, end, total) or self._line_chain(start, end, total)
+
+    def link(self, a: int, b: int, distance_km: float) -> None:
+        """Remember a routed leg from hub ``a`` to hub ``b``."""
+        with self._links_lock:
+            self._links.setdefault(a, {})[b] = distance_km
+
+    def _line_chain(self, start: tuple[float, float], end: tuple[float, float], total: float) -> list[int]:
+        matches = project_onto_polyline(
+            [start[0], end[0]], [start[1], end[1]], self.lats, self.lons, HUB_CORRIDOR_KM
+        )
+        between = (matches.along_km > HUB_END_KM) & (matches.along_km < total - HUB_END_KM)
+        return [int(i) for i in matches.ids[between]]
+
+    def _linked_chain(self, start: tuple[float, float], end: tuple[float, float], total: float) -> list[int]:
+        """Cheapest chain of links, plus estimated ends, within ``MAX_CHAIN_DETOUR`` of a direct route."""
+        with self._links_lock:
+            if not self._links:
+                return []
+            links = {a: dict(targets) for a, targets in self._links.items()}
+        from_start = haversine_km(start[0], start[1], self.lats, self.lons) * ROAD_FACTOR
+        to_end = haversine_km(end[0], end[1], self.lats, self.lons) * ROAD_FACTOR
+        limit = total * ROAD_FACTOR * MAX_CHAIN_DETOUR
+
+        dist = {int(h): float(from_start[h]) for h in np.nonzero(from_start <= HUB_ENTRY_KM * ROAD_FACTOR)[0] if h in links}
+        via: dict[int, int] = {}
+        heap = [(d, h) for h, d in dist.items()]
+        heapq.heapify(heap)
+        best, exit_hub = limit, -1
+        while heap:
+            d, hub = heapq.heappop(heap)
+            if d > dist[hub] or d >= best:
+                continue
+            if hub in via and to_end[hub] <= HUB_ENTRY_KM * ROAD_FACTOR and d + to_end[hub] <= best:
+                best, exit_hub = d + float(to_end[hub]), hub
+            for nxt, km in links.get(hub, {}).items():
+                if d + km < dist.get(nxt, np.inf):
+                    dist[nxt], via[nxt] = d + km, hub
+                    heapq.heappush(heap, (d + km, nxt))
+        if exit_hub < 0:
+            return []
+        chain = [exit_hub]
+        while chain[-1] in via:
+            chain.append(via[chain[-1]])
+        chain.reverse()
+        linked_km = dist[exit_hub] - from_start[chain[0]]
+        return chain if linked_km >= MIN_CHAIN_COVER * best else []
+
+
+def get_hubs() -> HubSet | None:
+    """Hubs for the current gazetteer, built on first use."""
+    global _hubs, _hubs_source
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return None
+    with _lock:
+        if _hubs is None or _hubs_source is not gazetteer:
+            _hubs, _hubs_source = HubSet.from_gazetteer(gazetteer), gazetteer
+        return _hubs
+
+
+def reset_hubs() -> None:
+    """Drop the hub set and its links; both are rebuilt as trips are routed."""
+    global _hubs, _hubs_source
+    with _lock:
+        _hubs, _hubs_source = None, None
+
+
+def record_leg(shared: bool, cached: bool, distance_km: float) -> None:
+    """Count one leg served from cache or routed; ``shared`` legs run hub to hub."""
+    kind = "hub" if shared else "end"
+    outcome = "hits" if cached else "misses"
+    with _stats_lock:
+        _stats[f"{kind}_{outcome}"] += 1
+        _stats[f"{kind}_km_{outcome}"] += distance_km
+
+
+def get_segment_stats() -> dict[str, float]:
+    """Leg cache hit ratios, by legs and by kilometres, for hub-to-hub and end legs."""
+    with _stats_lock:
+        stats = dict(_stats)
+    hits = stats.get("hub_hits", 0) + stats.get("end_hits", 0)
+    legs = hits + stats.get("hub_misses", 0) + stats.get("end_misses", 0)
+    km_hits = stats.get("hub_km_hits", 0.0) + stats.get("end_km_hits", 0.0)
+    km = km_hits + stats.get("hub_km_misses", 0.0) + stats.get("end_km_misses", 0.0)
+    return {
+        **{key: round(value, 1) if "_km_" in key else value for key, value in stats.items()},
+        "hit_ratio": round(hits / legs, 3) if legs else 0.0,
+        "km_hit_ratio": round(km_hits / km, 3) if km else 0.0,
+    }
+
+
+def clear_segment_stats() -> None:
+    """Reset the leg counters behind ``get_segment_stats``."""
+    with _stats_lock:
+        _stats.clear()
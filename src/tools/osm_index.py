@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import bz2
+import gzip
+import json
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from src.tools.spatial import GridIndex
+
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+DEFAULT_PATH = DATA_DIR / "osm_index"
+
+# (tag key, tag value) pairs we index; position in the tuple is the stored kind code
+KINDS = (
+    ("tourism", "camp_site"),
+    ("tourism", "hostel"),
+    ("tourism", "hotel"),
+    ("tourism", "attraction"),
+    ("tourism", "viewpoint"),
+    ("historic", "monument"),
+    ("historic", "castle"),
+)
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# The only tags the tools read when describing a result
+KEPT_TAGS = ("name", "description", "stars", "website", "tourism", "historic", "wikipedia")
+
+CELL_DEG = 0.05
+
+_index: OSMFeatureIndex | None = None
+_index_loaded = False
+
+
+@dataclass(frozen=True)
+class OSMFeature:
+    lat: float
+    lon: float
+    kind: tuple[str, str]
+    tags: dict
+    distance_m: float = 0.0
+
+
+class OSMFeatureIndex:
+    """Accommodation and POI features from an OSM extract, bucketed on a lat/lon grid.
+
+    Everything is stored as flat arrays sorted by grid cell: coordinates, kind
+    codes, and trimmed tags as one UTF-8 JSON blob addressed by offsets. All
+    arrays are memory-mapped on load, so opening an index is instant and only
+    the cells a query touches are paged in.
+    """
+
+    def __init__(self, lats, lons, kinds, tag_offsets, tag_blob, cells, starts, cell_deg: float = CELL_DEG) -> None:
+        self.kinds = kinds
+        self.tag_offsets = tag_offsets
+        self.tag_blob = tag_blob
+        self.cell_deg = cell_deg
+        self.grid = GridIndex.from_sorted(lats, lons, cells, starts, cell_deg)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @classmethod
+    def build(cls, features: list[tuple[float, float, int, dict]], cell_deg: float = CELL_DEG) -> OSMFeatureIndex:
+        """Build from ``(lat, lon, kind_code, tags)`` tuples."""
+        lats = np.array([f[0] for f in features], dtype=np.float64)
+        lons = np.array([f[1] for f in features], dtype=np.float64)
+        grid = GridIndex(lats, lons, cell_deg)
+        ordered = [features[i] for i in grid.order]
+
+        encoded = [json.dumps(f[3], separators=(",", ":"), ensure_ascii=False).encode() for f in ordered]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        return cls(
+            lats=grid.lats.astype(np.float32),
+            lons=grid.lons.astype(np.float32),
+            kinds=np.array([f[2] for f in ordered], dtype=np.uint8),
+            tag_offsets=offsets,
+            tag_blob=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            cells=grid.cells,
+            starts=grid.starts,
+            cell_deg=cell_deg,
+        )
+
+    def save(self, path: str | os.PathLike) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, array in self._arrays().items():
+            np.save(path / f"{name}.npy", np.asarray(array))
+        (path / "meta.json").write_text(json.dumps({"cell_deg": self.cell_deg, "kinds": KINDS}))
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> OSMFeatureIndex:
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text())
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in cls._array_names()}
+        return cls(**arrays, cell_deg=meta["cell_deg"])
+
+    def nearest(
+        self, lat: float, lon: float, kinds: list[tuple[str, str]], radius_m: float, limit: int = 5
+    ) -> list[OSMFeature]:
+        """Nearest ``limit`` features of the given kinds within ``radius_m``."""
+        codes = [KIND_CODES[k] for k in kinds if k in KIND_CODES]
+        ids, dists = self.grid.query_radius(lat, lon, radius_m / 1000)
+        if not len(ids) or not codes:
+            return []
+        keep = np.isin(np.asarray(self.kinds[ids]), codes)
+        return [
+            self.feature(int(idx), distance_m=round(float(dist) * 1000, 1))
+            for idx, dist in zip(ids[keep][:limit], dists[keep][:limit])
+        ]
+
+    def ids_in_bbox(
+        self, south: float, west: float, north: float, east: float, kinds: list[tuple[str, str]]
+    ) -> np.ndarray:
+        """Ids of every feature of the given kinds inside a bounding box, without decoding tags."""
+        codes = [KIND_CODES[k] for k in kinds if k in KIND_CODES]
+        slots = self.grid._candidates(south, north, west, east, 0.0)
+        if not len(slots) or not codes:
+            return np.empty(0, dtype=np.int64)
+        lats, lons = np.asarray(self.grid.lats[slots]), np.asarray(self.grid.lons[slots])
+        keep = (
+            (lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)
+            & np.isin(np.asarray(self.kinds[slots]), codes)
+        )
+        return slots[keep]
+
+    def feature(self, idx: int, distance_m: float = 0.0) -> OSMFeature:
+        return OSMFeature(
+            lat=float(self.grid.lats[idx]),
+            lon=float(self.grid.lons[idx]),
+            kind=KINDS[int(self.kinds[idx])],
+            tags=self._tags(idx),
+            distance_m=distance_m,
+        )
+
+    def _tags(self, idx: int) -> dict:
+        start, end = int(self.tag_offsets[idx]), int(self.tag_offsets[idx + 1])
+        return json.loads(bytes(self.tag_blob[start:end]).decode())
+
+    def _arrays(self) -> dict[str, np.ndarray]:
+        return {
+            "lats": self.grid.lats,
+            "lons": self.grid.lons,
+            "kinds": self.kinds,
+            "tag_offsets": self.tag_offsets,
+            "tag_blob": self.tag_blob,
+            "cells": self.grid.cells,
+            "starts": self.grid.starts,
+        }
+
+    @staticmethod
+    def _array_names() -> tuple[str, ...]:
+        return ("lats", "lons", "kinds", "tag_offsets", "tag_blob", "cells", "starts")
+
+
+def import_osm_xml(path: str | os.PathLike) -> OSMFeatureIndex:
+    """
+    Import tourism/historic features from an OSM XML extract (.osm, .osm.gz, .osm.bz2).
+
+    Ways are placed at the centroid of their nodes, so node coordinates are
+    kept while streaming; pre-filter large extracts first, e.g.
+    ``osmium tags-filter region.osm.pbf nwr/tourism nwr/historic -o pois.osm``.
+    """
+    opener = {".gz": gzip.open, ".bz2": bz2.open}.get(Path(path).suffix, open)
+    node_coords: dict[str, tuple[float, float]] = {}
+    features: list[tuple[float, float, int, dict]] = []
+
+    with opener(path, "rb") as handle:
+        way_refs: list[str] = []
+        for _, elem in ET.iterparse(handle, events=("end",)):
+            if elem.tag == "nd":
+                way_refs.append(elem.get("ref"))
+                continue
+            if elem.tag not in ("node", "way"):
+                continue
+
+            tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+            if elem.tag == "node":
+                coords = (float(elem.get("lat")), float(elem.get("lon")))
+                node_coords[elem.get("id")] = coords
+            else:
+                points = [node_coords[ref] for ref in way_refs if ref in node_coords]
+                coords = tuple(np.mean(points, axis=0)) if points else None
+                way_refs = []
+
+            kind = kind_for(tags)
+            if kind is not None and coords is not None:
+                trimmed = {k: v for k, v in tags.items() if k in KEPT_TAGS}
+                features.append((coords[0], coords[1], KIND_CODES[kind], trimmed))
+            elem.clear()
+
+    return OSMFeatureIndex.build(features)
+
+
+def kind_for(tags: dict) -> tuple[str, str] | None:
+    for key, value in KINDS:
+        if tags.get(key) == value:
+            return (key, value)
+    return None
+
+
+def get_osm_index() -> OSMFeatureIndex | None:
+    """Return the process-wide OSM feature index, memory-mapping it on first use."""
+    global _index, _index_loaded
+    if not _index_loaded:
+        _index_loaded = True
+        path = Path(os.environ.get("OSM_INDEX_PATH") or DEFAULT_PATH)
+        if (path / "meta.json").exists():
+            try:
+                _index = OSMFeatureIndex.load(path)
+            except Exception:
+                _index = None
+    return _index
+
+
+def set_osm_index(index: OSMFeatureIndex | None) -> None:
+    """Install an index explicitly (used by tests and the import script)."""
+    global _index, _index_loaded
+    _index = index
+    _index_loaded = True
@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import contextvars
+import itertools
+import math
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+import numpy as np
+
+from src.tools.cache import TTLCache
+from src.tools.corridor import densify
+from src.tools.singleflight import SingleFlight
+from src.tools.osm_index import KEPT_TAGS, KIND_CODES, KINDS, OSMFeature, kind_for
+from src.tools.spatial import haversine_km
+from src.tools.upstream import DeadlineExceeded, guard, remaining
+
+
+DEFAULT_MIRRORS = (
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://overpass.private.coffee/api/interpreter",
+)
+
+# Queries are snapped to fixed tiles (~11km x 7km in central Europe) so nearby
+# stops and repeat trips reuse the same cached results
+TILE_DEG = 0.1
+
+# Missing tiles spanning more than this many tiles are grouped into blocks, and
+# each block becomes one bbox in a union query rather than one huge bbox. Only
+# corridors with more than ``MAX_QUERY_BLOCKS`` blocks (well over 1000km) need a
+# second query, run at most ``FETCH_CONCURRENCY`` at a time
+FETCH_BLOCK_TILES = 4
+MAX_QUERY_BLOCKS = 64
+FETCH_CONCURRENCY = 2
+
+# Start the next mirror if the current one hasn't answered within this long
+HEDGE_DELAY_S = 2.0
+REQUEST_TIMEOUT_S = 30.0
+
+# Accommodation and sights change slowly; stale tiles are served and refreshed
+OVERPASS_CACHE_TTL = 7 * 24 * 3600
+_cache = TTLCache("overpass_tiles", ttl=OVERPASS_CACHE_TTL, max_entries=512, disk_entries=20_000)
+
+_flight = SingleFlight("overpass")
+
+_rotation = itertools.count()
+_rotation_lock = threading.Lock()
+
+
+def mirrors() -> list[str]:
+    """Configured Overpass endpoints (``OVERPASS_MIRRORS``, comma-separated)."""
+    configured = os.environ.get("OVERPASS_MIRRORS") or ""
+    urls = [url.strip() for url in configured.split(",") if url.strip()]
+    return urls or list(DEFAULT_MIRRORS)
+
+
+def query_radius(
+    lat: float, lon: float, radius_m: float, kinds: list[tuple[str, str]], limit: int = 5
+) -> list[OSMFeature]:
+    """
+    Nearest ``limit`` features of the given kinds within ``radius_m``.
+    Every tile the search circle touches is loaded from the cache, and all
+    uncached tiles are fetched together in one bounding-box query.
+    """
+    codes = [KIND_CODES[k] for k in kinds if k in KIND_CODES]
+    if not codes:
+        return []
+
+    tiles = _tiles_for_radius(lat, lon, radius_m)
+    features = [f for rows in _load_tiles(tiles).values() for f in rows if f[2] in codes]
+    if not features:
+        return []
+
+    dists = haversine_km(lat, lon, [f[0] for f in features], [f[1] for f in features]) * 1000
+    ranked = [i for i in np.argsort(dists, kind="stable") if dists[i] <= radius_m][:limit]
+    return [
+        OSMFeature(
+            lat=features[i][0],
+            lon=features[i][1],
+            kind=KINDS[features[i][2]],
+            tags=features[i][3],
+            distance_m=round(float(dists[i]), 1),
+        )
+        for i in ranked
+    ]
+
+
+def query_corridor(
+    route_lats, route_lons, buffer_km: float, kinds: list[tuple[str, str]]
+) -> list[OSMFeature]:
+    """
+    Every feature of the given kinds in the tiles a ``buffer_km`` corridor
+    around a route touches (``distance_m`` is left at 0). Callers project the
+    candidates onto the route themselves to get the exact offset.
+    """
+    codes = [KIND_CODES[k] for k in kinds if k in KIND_CODES]
+    if not codes or not len(route_lats):
+        return []
+
+    lats, lons = densify(route_lats, route_lons, TILE_DEG * 111.32 / 2)
+    tiles = list(dict.fromkeys(
+        tile for lat, lon in zip(lats, lons) for tile in _tiles_for_radius(lat, lon, buffer_km * 1000)
+    ))
+    return [
+        OSMFeature(lat=row[0], lon=row[1], kind=KINDS[row[2]], tags=row[3])
+        for rows in _load_tiles(tiles).values()
+        for row in rows
+        if row[2] in codes
+    ]
+
+
+def _tiles_for_radius(lat: float, lon: float, radius_m: float) -> list[tuple[int, int]]:
+    pad_lat = radius_m / 111_320
+    pad_lon = pad_lat / max(math.cos(math.radians(min(abs(lat) + pad_lat, 89.0))), 0.01)
+    row_lo, col_lo = _tile(lat - pad_lat, lon - pad_lon)
+    row_hi, col_hi = _tile(lat + pad_lat, lon + pad_lon)
+    return [(row, col) for row in range(row_lo, row_hi + 1) for col in range(col_lo, col_hi + 1)]
+
+
+def _tile(lat: float, lon: float) -> tuple[int, int]:
+    return (math.floor((lat + 90) / TILE_DEG), math.floor((lon + 180) / TILE_DEG))
+
+
+def _tile_key(tile: tuple[int, int]) -> str:
+    return f"{tile[0]}:{tile[1]}"
+
+
+def _load_tiles(tiles: list[tuple[int, int]]) -> dict[tuple[int, int], list]:
+    """
+    Cached tile contents; missing tiles are fetched, stale ones refreshed in
+    the background. Empty tiles and failed fetches are negative-cached, so
+    known-empty areas answer locally and failing ones aren't retried at once.
+    """
+    loaded: dict[tuple[int, int], list] = {}
+    missing, stale = [], []
+    for tile in tiles:
+        key = _tile_key(tile)
+        entry = _cache.get(key)
+        if entry is None:
+            reason = _cache.get_negative(key)
+            if reason == "empty":
+                loaded[tile] = []
+            elif reason is None:
+                missing.append(tile)
+            continue
+        loaded[tile] = entry.value
+        if entry.stale:
+            stale.append(tile)
+
+    if missing:
+        batches = _fetch_batches(missing)
+        if len(batches) == 1:
+            results = [_fetch_tiles(batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix="overpass-fetch") as pool:
+                futures = [pool.submit(contextvars.copy_context().run, _fetch_tiles, batch) for batch in batches]
+                results = [future.result() for future in futures]
+        for batch, fetched in zip(batches, results):
+            if not fetched:
+                _cache.set_negative_many([_tile_key(tile) for tile in batch], "error")
+                continue
+            _cache.set_negative_many([_tile_key(tile) for tile, rows in fetched.items() if not rows], "empty")
+            _cache.set_many({_tile_key(tile): rows for tile, rows in fetched.items() if rows})
+            loaded.update(fetched)
+
+    if stale:
+        by_key = {_tile_key(tile): tile for tile in stale}
+
+        def refetch(keys: list[str]) -> dict[str, list]:
+            fetched = _fetch_tiles([by_key[key] for key in keys])
+            return {_tile_key(tile): rows for tile, rows in fetched.items()}
+
+        _cache.refresh(by_key, refetch)
+    return loaded
+
+
+def _blocks(tiles: list[tuple[int, int]]) -> list[list[tuple[int, int]]]:
+    """One block when the tiles are close together, else one per ``FETCH_BLOCK_TILES`` square."""
+    rows = [row for row, _ in tiles]
+    cols = [col for _, col in tiles]
+    if max(rows) - min(rows) < FETCH_BLOCK_TILES and max(cols) - min(cols) < FETCH_BLOCK_TILES:
+        return [tiles]
+    blocks: dict[tuple[int, int], list] = defaultdict(list)
+    for row, col in tiles:
+        blocks[(row // FETCH_BLOCK_TILES, col // FETCH_BLOCK_TILES)].append((row, col))
+    return list(blocks.values())
+
+
+def _fetch_batches(tiles: list[tuple[int, int]]) -> list[list[tuple[int, int]]]:
+    """The tiles grouped into queries of at most ``MAX_QUERY_BLOCKS`` blocks each."""
+    blocks = _blocks(tiles)
+    return [
+        [tile for block in blocks[i:i + MAX_QUERY_BLOCKS] for tile in block]
+        for i in range(0, len(blocks), MAX_QUERY_BLOCKS)
+    ]
+
+
+def _bbox(tiles: list[tuple[int, int]]) -> str:
+    south = min(row for row, _ in tiles) * TILE_DEG - 90
+    north = (max(row for row, _ in tiles) + 1) * TILE_DEG - 90
+    west = min(col for _, col in tiles) * TILE_DEG - 180
+    east = (max(col for _, col in tiles) + 1) * TILE_DEG - 180
+    return f"{south:.4f},{west:.4f},{north:.4f},{east:.4f}"
+
+
+def _fetch_tiles(tiles: list[tuple[int, int]]) -> dict[tuple[int, int], list]:
+    """
+    Fetch every indexed kind inside the tiles' blocks with one union query
+    (one bbox per block) and partition the elements back into tiles as
+    ``[lat, lon, kind_code, tags]``. Tiles come back empty-but-present when
+    the area has nothing, and absent when every mirror failed, so failures
+    are retried rather than cached.
+    """
+    selectors = [
+        f'nwr["{key}"~"^({"|".join(v for k, v in KINDS if k == key)})$"]'
+        for key in dict.fromkeys(k for k, _ in KINDS)
+    ]
+    bboxes = [_bbox(block) for block in _blocks(tiles)]
+    statements = "\n".join(f"  {selector}({bbox});" for bbox in bboxes for selector in selectors)
+    query = f"[out:json][timeout:25];\n(\n{statements}\n);\nout center tags;"
+
+    try:
+        data = _flight.do(";".join(bboxes), lambda: _post(query))
+        elements = data["elements"]
+    except Exception:
+        return {}
+
+    wanted = set(tiles)
+    rows: dict[tuple[int, int], list] = {tile: [] for tile in tiles}
+    for element in elements:
+        tags = element.get("tags", {})
+        kind = kind_for(tags)
+        point = element if "lat" in element else element.get("center")
+        if kind is None or not point:
+            continue
+        tile = _tile(point["lat"], point["lon"])
+        if tile in wanted:
+            trimmed = {k: v for k, v in tags.items() if k in KEPT_TAGS}
+            rows[tile].append([point["lat"], point["lon"], KIND_CODES[kind], trimmed])
+    return rows
+
+
+def _post(query: str) -> dict:
+    """
+    Run a query against the mirrors, starting at the next one in rotation.
+    A mirror that errors hands over immediately; one that is merely slow gets
+    a hedge request to the next mirror after ``HEDGE_DELAY_S``, and whichever
+    answers first wins.
+    """
+    urls = mirrors()
+    with _rotation_lock:
+        start = next(_rotation) % len(urls)
+    urls = urls[start:] + urls[:start]
+
+    pool = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="overpass")
+    pending: set = set()
+    error: Exception | None = None
+    try:
+        for url in urls:
+            pending.add(pool.submit(contextvars.copy_context().run, _post_to, url, query))
+            done, pending = wait(pending, timeout=HEDGE_DELAY_S, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        while pending:
+            done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("Overpass mirrors still busy at the deadline")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error or RuntimeError("no Overpass mirror answered")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _post_to(url: str, query: str) -> dict:
+    with guard("overpass", url, timeout=REQUEST_TIMEOUT_S) as timeout:
+        with httpx.Client(timeout=timeout) as client:
+            response = client.post(url, data={"data": query})
+            response.raise_for_status()
+            data = response.json()
+        if not isinstance(data, dict) or "elements" not in data:
+            raise ValueError(f"unexpected Overpass response from {url}")
+    return data
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-import httpx
 from pydantic import BaseModel
 
+from src.tools import overpass
+from src.tools.geocoding import geocode
+from src.tools.osm_index import get_osm_index
+
 
 class POIRequest(BaseModel):
     location: str
@@ -12,6 +15,7 @@ class POIResult(BaseModel):
     location: str
     name: str
     description: str
+    source: str = "mock"
 
 
 MOCK_POIS = {
@@ -28,12 +32,16 @@ MOCK_POIS = {
 
 def get_points_of_interest(request: POIRequest) -> list[POIResult]:
     """
-    Get points of interest using OpenStreetMap Overpass API.
+    Get points of interest from the local OSM index, or the OpenStreetMap
+    Overpass API for regions it doesn't cover.
     Searches for tourist attractions, viewpoints, and landmarks.
     """
     try:
         coords = _geocode_location(request.location)
         if coords:
+            pois = _search_pois_index(coords, request.location)
+            if pois:
+                return pois
             pois = _search_pois_osm(coords, request.location)
             if pois:
                 return pois
@@ -52,82 +60,59 @@ def get_points_of_interest(request: POIRequest) -> list[POIResult]:
 
 
 def _geocode_location(location: str) -> tuple[float, float] | None:
-    """Geocode location using Nominatim API."""
-    try:
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            "q": location,
-            "format": "json",
-            "limit": 1
-        }
-        headers = {"User-Agent": "CyclingPlanner/1.0"}
-        
-        with httpx.Client(timeout=10.0) as client:
-            response = client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            results = response.json()
-            
-            if results:
-                return (float(results[0]["lat"]), float(results[0]["lon"]))
-    except Exception:
-        pass
-    return None
+    """Geocode location via the local gazetteer, falling back to Nominatim."""
+    return geocode(location)
 
 
-def _search_pois_osm(coords: tuple[float, float], location_name: str) -> list[POIResult]:
-    """Search for points of interest using Overpass API."""
-    lat, lon = coords
+POI_KINDS = [
+    ("tourism", "attraction"),
+    ("tourism", "viewpoint"),
+    ("historic", "monument"),
+    ("historic", "castle"),
+]
+
+SEARCH_RADIUS_M = 3000
+
+
+def _search_pois_index(coords: tuple[float, float], location_name: str) -> list[POIResult]:
+    """Search the memory-mapped OSM index; empty when no index covers the area."""
+    index = get_osm_index()
+    if index is None:
+        return []
+    features = index.nearest(coords[0], coords[1], POI_KINDS, SEARCH_RADIUS_M, limit=10)
+    results = [_to_result(f.tags, location_name, "osm_index") for f in features]
+    return [r for r in results if r][:5]
+
+
+def _to_result(tags_dict: dict, location_name: str, source: str) -> POIResult | None:
+    """Build a result from an OSM element's tags; unnamed POIs are skipped."""
+    name = tags_dict.get("name")
+    if not name:
+        return None
     
-    # Overpass query for tourist attractions, viewpoints, and monuments
-    query = f"""
-    [out:json][timeout:25];
-    (
-      node["tourism"="attraction"](around:3000,{lat},{lon});
-      node["tourism"="viewpoint"](around:3000,{lat},{lon});
-      node["historic"="monument"](around:3000,{lat},{lon});
-      node["historic"="castle"](around:3000,{lat},{lon});
-      way["tourism"="attraction"](around:3000,{lat},{lon});
-    );
-    out body 10;
-    """
+    # Build description from available tags
+    desc_parts = []
+    if "description" in tags_dict:
+        desc_parts.append(tags_dict["description"])
+    if "tourism" in tags_dict:
+        desc_parts.append(f"Type: {tags_dict['tourism']}")
+    if "historic" in tags_dict:
+        desc_parts.append(f"Historic {tags_dict['historic']}")
+    if "wikipedia" in tags_dict:
+        desc_parts.append("Wikipedia entry available")
     
-    try:
-        url = "https://overpass-api.de/api/interpreter"
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(url, data={"data": query})
-            response.raise_for_status()
-            data = response.json()
-            
-            results = []
-            for element in data.get("elements", []):
-                tags_dict = element.get("tags", {})
-                name = tags_dict.get("name", "Unnamed POI")
-                
-                # Skip unnamed POIs
-                if name == "Unnamed POI":
-                    continue
-                
-                # Build description from available tags
-                desc_parts = []
-                if "description" in tags_dict:
-                    desc_parts.append(tags_dict["description"])
-                if "tourism" in tags_dict:
-                    desc_parts.append(f"Type: {tags_dict['tourism']}")
-                if "historic" in tags_dict:
-                    desc_parts.append(f"Historic {tags_dict['historic']}")
-                if "wikipedia" in tags_dict:
-                    desc_parts.append("Wikipedia entry available")
-                
-                description = "; ".join(desc_parts) if desc_parts else "Point of interest"
-                
-                results.append(POIResult(
-                    location=location_name.title(),
-                    name=name,
-                    description=description
-                ))
-            
-            return results[:5] if results else []
-    except Exception:
-        pass
+    description = "; ".join(desc_parts) if desc_parts else "Point of interest"
     
-    return []
+    return POIResult(
+        location=location_name.title(),
+        name=name,
+        description=description,
+        source=source,
+    )
+
+
+def _search_pois_osm(coords: tuple[float, float], location_name: str) -> list[POIResult]:
+    """Search for points of interest through the tile-cached Overpass client."""
+    features = overpass.query_radius(coords[0], coords[1], SEARCH_RADIUS_M, POI_KINDS, limit=10)
+    results = [_to_result(f.tags, location_name, "overpass") for f in features]
+    return [r for r in results if r][:5]
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from src.tools.gazetteer import get_gazetteer
+from src.tools.geocoding import geocode
+from src.tools.osm_index import KIND_CODES, OSMFeatureIndex, get_osm_index
+from src.tools.poi import POI_KINDS
+from src.tools.routes import DETOUR_FACTOR, RouteRequest, RouteResult
+from src.tools.spatial import haversine_km
+from src.tools.upstream import is_fallback_source
+
+
+class ReachabilityRequest(BaseModel):
+    origin: str
+    days: int = Field(ge=1)
+    daily_km: float = Field(90.0, gt=0)
+    # Distance band in road km; defaults to the last quarter of the trip's reach
+    min_km: float | None = None
+    max_km: float | None = None
+    rank_by: Literal["population", "poi_density"] = "population"
+    min_population: int = 0
+    limit: int = Field(10, ge=1, le=100)
+    # Route this many of the best candidates for real distances (slower)
+    refine_top_k: int = Field(0, ge=0, le=20)
+
+
+class ReachablePlace(BaseModel):
+    name: str
+    country: str
+    lat: float
+    lon: float
+    population: int
+    distance_km: float
+    days: float
+    poi_count: int | None = None
+    source: str = "estimate"
+
+
+class ReachabilityResult(BaseModel):
+    origin: str
+    min_km: float
+    max_km: float
+    places: list[ReachablePlace]
+    # "gazetteer", plus the routing sources of refined places; "mock" when the origin wasn't found
+    source: str = "mock"
+
+
+# Without an explicit band, places this far short of the full reach still count
+DEFAULT_BAND_FRACTION = 0.25
+REFINE_CONCURRENCY = 4
+
+_poi_counts: tuple[OSMFeatureIndex, np.ndarray] | None = None
+
+
+def find_reachable_places(request: ReachabilityRequest) -> ReachabilityResult:
+    """
+    Settlements reachable from an origin in a number of riding days.
+
+    Distances to every place in the gazetteer are computed in one vectorised
+    great-circle pass, scaled by the usual detour factor, filtered to the
+    distance band and ranked by population or by POI density from the local
+    OSM index. The best ``refine_top_k`` can then be routed for real.
+    """
+    reach = request.days * request.daily_km
+    max_km = request.max_km if request.max_km is not None else reach
+    min_km = request.min_km if request.min_km is not None else reach * (1 - DEFAULT_BAND_FRACTION)
+    result = ReachabilityResult(origin=request.origin.title(), min_km=min_km, max_km=max_km, places=[])
+
+    gazetteer = get_gazetteer()
+    coords = geocode(request.origin)
+    if gazetteer is None or not coords or not len(gazetteer):
+        return result
+    result.source = "gazetteer"
+
+    distances = haversine_km(coords[0], coords[1], gazetteer.lats, gazetteer.lons) * DETOUR_FACTOR
+    candidates = np.nonzero(
+        (distances >= min_km) & (distances <= max_km) & (gazetteer.populations >= request.min_population)
+    )[0]
+
+    poi_counts = _poi_counts_for(gazetteer.lats[candidates], gazetteer.lons[candidates])
+    if request.rank_by == "poi_density" and poi_counts is not None:
+        score = poi_counts * 1e12 + gazetteer.populations[candidates]
+    else:
+        score = gazetteer.populations[candidates].astype(np.float64)
+
+    # Refined candidates may fall out of the band, so keep a few spares
+    wanted = min(len(candidates), request.limit + request.refine_top_k)
+    top = np.argpartition(-score, wanted - 1)[:wanted] if wanted else np.empty(0, dtype=np.int64)
+    top = top[np.argsort(-score[top], kind="stable")]
+
+    places = [
+        ReachablePlace(
+            name=gazetteer.names[idx],
+            country=str(gazetteer.countries[idx]),
+            lat=float(gazetteer.lats[idx]),
+            lon=float(gazetteer.lons[idx]),
+            population=int(gazetteer.populations[idx]),
+            distance_km=round(float(distances[idx]), 1),
+            days=round(float(distances[idx]) / request.daily_km, 1),
+            poi_count=int(poi_counts[i]) if poi_counts is not None else None,
+        )
+        for i, idx in zip(top, candidates[top])
+    ]
+    if request.refine_top_k:
+        places, routed_sources = _refine(request, places, min_km, max_km)
+        result.source = "+".join(dict.fromkeys(["gazetteer", *routed_sources]))
+    result.places = places[:request.limit]
+    return result
+
+
+def _route(request: RouteRequest) -> RouteResult:
+    # Through the registry, so refinement shares the memoized get_route
+    from src.agent.tool_registry import get_available_tools
+
+    return get_available_tools()["get_route"](request)
+
+
+def _refine(
+    request: ReachabilityRequest, places: list[ReachablePlace], min_km: float, max_km: float
+) -> tuple[list[ReachablePlace], list[str]]:
+    """
+    Replace estimates for the leading places with routed distances and drop
+    those that end up outside the band. Places whose route was even partly
+    estimated keep their estimate. Also returns the routes' sources.
+    """
+    head, tail = places[:request.refine_top_k], places[request.refine_top_k:]
+
+    def route(place: ReachablePlace):
+        return _route(RouteRequest(
+            origin=request.origin, destination=f"{place.name}, {place.country}", preferred_daily_km=request.daily_km
+        ))
+
+    with ThreadPoolExecutor(max_workers=REFINE_CONCURRENCY, thread_name_prefix="reachability") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, route, place) for place in head]
+        routes = [future.result() for future in futures]
+
+    refined = []
+    for place, routed in zip(head, routes):
+        if is_fallback_source(routed.source):
+            refined.append(place)
+        elif min_km <= routed.total_distance_km <= max_km:
+            refined.append(place.model_copy(update={
+                "distance_km": routed.total_distance_km,
+                "days": round(routed.total_distance_km / request.daily_km, 1),
+                "source": routed.source,
+            }))
+    return refined + tail, [routed.source for routed in routes]
+
+
+def _poi_counts_for(lats: np.ndarray, lons: np.ndarray) -> np.ndarray | None:
+    """POIs in each point's OSM index grid cell, or None without an index."""
+    index = get_osm_index()
+    if index is None:
+        return None
+    grid = index.grid
+    if not len(grid.cells):
+        return np.zeros(len(lats), dtype=np.int64)
+    cumulative = _poi_cumulative(index)
+    keys = grid.cell_keys(lats, lons)
+    slots = np.minimum(np.searchsorted(grid.cells, keys), len(grid.cells) - 1)
+    found = np.asarray(grid.cells)[slots] == keys
+    counts = cumulative[np.asarray(grid.ends)[slots]] - cumulative[np.asarray(grid.starts)[slots]]
+    return np.where(found, counts, 0)
+
+
+def _poi_cumulative(index: OSMFeatureIndex) -> np.ndarray:
+    """Running count of POI features in the index's cell order, computed once per index."""
+    global _poi_counts
+    if _poi_counts is None or _poi_counts[0] is not index:
+        codes = [KIND_CODES[kind] for kind in POI_KINDS]
+        is_poi = np.isin(np.asarray(index.kinds), codes)
+        _poi_counts = (index, np.concatenate([[0], np.cumsum(is_poi)]))
+    return _poi_counts[1]
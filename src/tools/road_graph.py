@@ -0,0 +1,443 @@
+from __future__ import annotations
+
+import bz2
+import gzip
+import heapq
+import json
+import math
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from src.tools.spatial import EARTH_RADIUS_KM, GridIndex, haversine_km
+
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+DEFAULT_PATH = DATA_DIR / "road_graph"
+
+# Cost per metre relative to a quiet road; highway types missing here aren't rideable
+HIGHWAY_FACTORS = {
+    "cycleway": 0.8,
+    "living_street": 0.95,
+    "residential": 1.0,
+    "unclassified": 1.0,
+    "tertiary": 1.1,
+    "tertiary_link": 1.1,
+    "service": 1.1,
+    "road": 1.1,
+    "track": 1.2,
+    "path": 1.2,
+    "secondary": 1.3,
+    "secondary_link": 1.3,
+    "bridleway": 1.5,
+    "primary": 1.6,
+    "primary_link": 1.6,
+    "footway": 2.0,
+    "pedestrian": 2.0,
+    "trunk": 3.0,
+    "trunk_link": 3.0,
+}
+UNPAVED_SURFACES = {"unpaved", "gravel", "fine_gravel", "compacted", "dirt", "ground", "grass", "sand", "mud"}
+UNPAVED_FACTOR = 1.25
+# Shared paths signed for bikes ride like a quiet road
+DESIGNATED_FACTOR = 1.0
+
+CELL_DEG = 0.05
+# Origins and destinations further than this from any junction aren't on the graph
+SNAP_MAX_KM = 2.0
+
+_graph: RoadGraph | None = None
+_graph_loaded = False
+
+
+@dataclass(frozen=True)
+class RoadPath:
+    points: list[tuple[float, float]]  # (lat, lon) from origin junction to destination junction
+    distance_km: float
+    explored: int  # nodes settled by the search, for tuning and tests
+
+
+class RoadGraph:
+    """Rideable road network from an OSM extract, as CSR adjacency arrays.
+
+    Only junctions (way ends and nodes shared by several ways) are graph
+    nodes; the shape points between them are kept per edge for the returned
+    polyline. Nodes are sorted by grid cell so the same arrays double as a
+    snapping index. Forward edges are grouped by source (``offsets``), and
+    ``rev_offsets``/``rev_edges`` list every node's incoming edges for the
+    backward half of the search. All arrays are memory-mapped on load.
+    """
+
+    def __init__(
+        self,
+        lats,
+        lons,
+        offsets,
+        sources,
+        targets,
+        lengths,
+        costs,
+        shapes,
+        rev_offsets,
+        rev_edges,
+        shape_offsets,
+        shape_lats,
+        shape_lons,
+        cells,
+        starts,
+        cell_deg: float = CELL_DEG,
+        min_factor: float = min(HIGHWAY_FACTORS.values()),
+    ) -> None:
+        self.offsets = offsets
+        self.sources = sources
+        self.targets = targets
+        self.lengths = lengths
+        self.costs = costs
+        self.shapes = shapes
+        self.rev_offsets = rev_offsets
+        self.rev_edges = rev_edges
+        self.shape_offsets = shape_offsets
+        self.shape_lats = shape_lats
+        self.shape_lons = shape_lons
+        self.cell_deg = cell_deg
+        self.min_factor = min_factor
+        self.grid = GridIndex.from_sorted(lats, lons, cells, starts, cell_deg)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    @classmethod
+    def build(
+        cls,
+        node_lats,
+        node_lons,
+        ways: list[tuple[list[int], float, int]],
+        cell_deg: float = CELL_DEG,
+    ) -> RoadGraph:
+        """
+        Build from node coordinates and ``(node indices, cost factor, direction)``
+        ways; direction is 0 for two-way, 1 for forward only, -1 for backward only.
+        """
+        node_lats = np.asarray(node_lats, dtype=np.float64)
+        node_lons = np.asarray(node_lons, dtype=np.float64)
+        uses = np.zeros(len(node_lats), dtype=np.int64)
+        for refs, _, _ in ways:
+            np.add.at(uses, refs, 1)
+            uses[[refs[0], refs[-1]]] += 2
+        junctions = np.nonzero(uses >= 2)[0]
+
+        grid = GridIndex(node_lats[junctions], node_lons[junctions], cell_deg)
+        node_id = np.full(len(node_lats), -1, dtype=np.int64)
+        node_id[junctions[grid.order]] = np.arange(len(junctions))
+
+        edges: list[tuple[int, int, float, float, int]] = []
+        geometry: list[np.ndarray] = []
+        for refs, factor, direction in ways:
+            refs = np.asarray(refs, dtype=np.int64)
+            steps = haversine_km(node_lats[refs[:-1]], node_lons[refs[:-1]], node_lats[refs[1:]], node_lons[refs[1:]])
+            along = np.concatenate([[0.0], np.cumsum(steps)]) * 1000
+            splits = np.nonzero(node_id[refs] >= 0)[0]
+            for a, b in zip(splits[:-1], splits[1:]):
+                u, v = int(node_id[refs[a]]), int(node_id[refs[b]])
+                length = float(along[b] - along[a])
+                if u == v or length <= 0:
+                    continue
+                shape = len(geometry)
+                geometry.append(refs[a:b + 1])
+                if direction >= 0:
+                    edges.append((u, v, length, length * factor, shape))
+                if direction <= 0:
+                    edges.append((v, u, length, length * factor, ~shape))
+
+        table = np.array([e[:2] for e in edges], dtype=np.int64).reshape(-1, 2)
+        order = np.argsort(table[:, 0], kind="stable")
+        sources, targets = table[order, 0], table[order, 1]
+        rev_edges = np.argsort(targets, kind="stable")
+        shape_sizes = np.array([len(g) for g in geometry], dtype=np.int64)
+        shape_refs = np.concatenate(geometry) if geometry else np.empty(0, dtype=np.int64)
+        factors = [factor for _, factor, _ in ways]
+
+        return cls(
+            lats=grid.lats.astype(np.float32),
+            lons=grid.lons.astype(np.float32),
+            offsets=_offsets(sources, len(junctions)),
+            sources=sources.astype(np.int32),
+            targets=targets.astype(np.int32),
+            lengths=np.array([edges[i][2] for i in order], dtype=np.float32),
+            costs=np.array([edges[i][3] for i in order], dtype=np.float32),
+            shapes=np.array([edges[i][4] for i in order], dtype=np.int32),
+            rev_offsets=_offsets(targets[rev_edges], len(junctions)),
+            rev_edges=rev_edges.astype(np.int32),
+            shape_offsets=np.concatenate([[0], np.cumsum(shape_sizes)]).astype(np.int64),
+            shape_lats=node_lats[shape_refs].astype(np.float32),
+            shape_lons=node_lons[shape_refs].astype(np.float32),
+            cells=grid.cells,
+            starts=grid.starts,
+            cell_deg=cell_deg,
+            min_factor=min(factors) if factors else 1.0,
+        )
+
+    def save(self, path: str | os.PathLike) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, array in self._arrays().items():
+            np.save(path / f"{name}.npy", np.asarray(array))
+        (path / "meta.json").write_text(json.dumps({"cell_deg": self.cell_deg, "min_factor": self.min_factor}))
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> RoadGraph:
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text())
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in cls._array_names()}
+        return cls(**arrays, cell_deg=meta["cell_deg"], min_factor=meta["min_factor"])
+
+    def snap(self, lat: float, lon: float, max_km: float = SNAP_MAX_KM) -> int:
+        """Nearest junction to a point, or -1 when none is within ``max_km``."""
+        ids, _ = self.grid.nearest([lat], [lon], max_km)
+        return int(ids[0])
+
+    def route(
+        self, origin: tuple[float, float], destination: tuple[float, float], max_snap_km: float = SNAP_MAX_KM
+    ) -> RoadPath | None:
+        """
+        Cheapest cycling path between two (lat, lon) points, or None when
+        either end is off the graph or the two aren't connected.
+        """
+        source = self.snap(*origin, max_km=max_snap_km)
+        target = self.snap(*destination, max_km=max_snap_km)
+        if source < 0 or target < 0:
+            return None
+        if source == target:
+            point = (float(self.grid.lats[source]), float(self.grid.lons[source]))
+            return RoadPath(points=[point], distance_km=0.0, explored=0)
+        found = self._search(source, target)
+        if found is None:
+            return None
+        edges, explored = found
+        return RoadPath(
+            points=self._polyline(edges),
+            distance_km=float(np.sum(np.asarray(self.lengths[edges], dtype=np.float64))) / 1000,
+            explored=explored,
+        )
+
+    def _search(self, source: int, target: int) -> tuple[list[int], int] | None:
+        """
+        Bidirectional A*: both halves run on costs reduced by the average
+        potential (h_to_target - h_to_source) / 2, which keeps them consistent
+        with each other, so the search can stop as soon as the two queue heads
+        together reach the best meeting cost found so far.
+        """
+        lats, lons = self.grid.lats, self.grid.lons
+        offsets, targets, costs = self.offsets, self.targets, self.costs
+        rev_offsets, rev_edges, sources = self.rev_offsets, self.rev_edges, self.sources
+
+        # Great-circle metres times the cheapest factor never overestimate the remaining cost
+        scale = EARTH_RADIUS_KM * 1000 * self.min_factor * 0.999
+        s_lat, s_lon = math.radians(float(lats[source])), math.radians(float(lons[source]))
+        t_lat, t_lon = math.radians(float(lats[target])), math.radians(float(lons[target]))
+        cos_s, cos_t = math.cos(s_lat), math.cos(t_lat)
+        potentials: dict[int, float] = {}
+
+        def potential(node: int) -> float:
+            found = potentials.get(node)
+            if found is None:
+                lat, lon = math.radians(float(lats[node])), math.radians(float(lons[node]))
+                cos_lat = math.cos(lat)
+                to_t = math.sin((t_lat - lat) / 2) ** 2 + cos_lat * cos_t * math.sin((t_lon - lon) / 2) ** 2
+                to_s = math.sin((s_lat - lat) / 2) ** 2 + cos_lat * cos_s * math.sin((s_lon - lon) / 2) ** 2
+                found = potentials[node] = scale * (math.asin(math.sqrt(min(to_t, 1.0))) - math.asin(math.sqrt(min(to_s, 1.0))))
+            return found
+
+        dist_f, dist_r = {source: 0.0}, {target: 0.0}
+        via_f, via_r = {source: -1}, {target: -1}
+        heap_f, heap_r = [(potential(source), source)], [(-potential(target), target)]
+        done_f: set[int] = set()
+        done_r: set[int] = set()
+        best, meet = math.inf, -1
+
+        while heap_f and heap_r:
+            if heap_f[0][0] + heap_r[0][0] >= best:
+                break
+            if len(heap_f) <= len(heap_r):
+                _, node = heapq.heappop(heap_f)
+                if node in done_f:
+                    continue
+                done_f.add(node)
+                base = dist_f[node]
+                lo, hi = int(offsets[node]), int(offsets[node + 1])
+                for edge, nxt, cost in zip(range(lo, hi), targets[lo:hi].tolist(), costs[lo:hi].tolist()):
+                    reached = base + cost
+                    if reached < dist_f.get(nxt, math.inf):
+                        dist_f[nxt], via_f[nxt] = reached, edge
+                        heapq.heappush(heap_f, (reached + potential(nxt), nxt))
+                        total = reached + dist_r.get(nxt, math.inf)
+                        if total < best:
+                            best, meet = total, nxt
+            else:
+                _, node = heapq.heappop(heap_r)
+                if node in done_r:
+                    continue
+                done_r.add(node)
+                base = dist_r[node]
+                lo, hi = int(rev_offsets[node]), int(rev_offsets[node + 1])
+                for edge in rev_edges[lo:hi].tolist():
+                    prev = int(sources[edge])
+                    reached = base + float(costs[edge])
+                    if reached < dist_r.get(prev, math.inf):
+                        dist_r[prev], via_r[prev] = reached, edge
+                        heapq.heappush(heap_r, (reached - potential(prev), prev))
+                        total = reached + dist_f.get(prev, math.inf)
+                        if total < best:
+                            best, meet = total, prev
+
+        if meet < 0:
+            return None
+        path: list[int] = []
+        node = meet
+        while via_f[node] >= 0:
+            path.append(via_f[node])
+            node = int(sources[via_f[node]])
+        path.reverse()
+        node = meet
+        while via_r[node] >= 0:
+            path.append(via_r[node])
+            node = int(targets[via_r[node]])
+        return path, len(done_f) + len(done_r)
+
+    def _polyline(self, edges: list[int]) -> list[tuple[float, float]]:
+        points: list[tuple[float, float]] = []
+        for edge in edges:
+            shape = int(self.shapes[edge])
+            forward = shape >= 0
+            shape = shape if forward else ~shape
+            lo, hi = int(self.shape_offsets[shape]), int(self.shape_offsets[shape + 1])
+            lats = np.asarray(self.shape_lats[lo:hi], dtype=np.float64)
+            lons = np.asarray(self.shape_lons[lo:hi], dtype=np.float64)
+            if not forward:
+                lats, lons = lats[::-1], lons[::-1]
+            # Consecutive edges share their junction point
+            start = 1 if points else 0
+            points.extend(zip(lats[start:].tolist(), lons[start:].tolist()))
+        return points
+
+    def _arrays(self) -> dict[str, np.ndarray]:
+        return {
+            "lats": self.grid.lats,
+            "lons": self.grid.lons,
+            "offsets": self.offsets,
+            "sources": self.sources,
+            "targets": self.targets,
+            "lengths": self.lengths,
+            "costs": self.costs,
+            "shapes": self.shapes,
+            "rev_offsets": self.rev_offsets,
+            "rev_edges": self.rev_edges,
+            "shape_offsets": self.shape_offsets,
+            "shape_lats": self.shape_lats,
+            "shape_lons": self.shape_lons,
+            "cells": self.grid.cells,
+            "starts": self.grid.starts,
+        }
+
+    @staticmethod
+    def _array_names() -> tuple[str, ...]:
+        return (
+            "lats", "lons", "offsets", "sources", "targets", "lengths", "costs", "shapes",
+            "rev_offsets", "rev_edges", "shape_offsets", "shape_lats", "shape_lons", "cells", "starts",
+        )
+
+
+def _offsets(sorted_nodes: np.ndarray, n_nodes: int) -> np.ndarray:
+    counts = np.bincount(sorted_nodes, minlength=n_nodes) if len(sorted_nodes) else np.zeros(n_nodes, dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def edge_factor(tags: dict) -> float | None:
+    """Cost factor for riding a way, or None when bikes can't use it."""
+    factor = HIGHWAY_FACTORS.get(tags.get("highway", ""))
+    bicycle = tags.get("bicycle")
+    if factor is None or bicycle == "no" or tags.get("access") in ("no", "private"):
+        return None
+    if bicycle in ("designated", "yes"):
+        factor = min(factor, DESIGNATED_FACTOR) if tags["highway"] not in ("trunk", "trunk_link") else factor
+    if tags.get("surface") in UNPAVED_SURFACES:
+        factor *= UNPAVED_FACTOR
+    return factor
+
+
+def way_direction(tags: dict) -> int:
+    """0 for two-way, 1 for forward only, -1 for backward only, as seen by a cyclist."""
+    if tags.get("oneway:bicycle") == "no" or tags.get("cycleway") in ("opposite", "opposite_lane"):
+        return 0
+    oneway = tags.get("oneway")
+    if oneway == "-1":
+        return -1
+    if oneway in ("yes", "1", "true") or tags.get("junction") == "roundabout":
+        return 1
+    return 0
+
+
+def import_osm_roads(path: str | os.PathLike) -> RoadGraph:
+    """
+    Import the rideable road network from an OSM XML extract (.osm, .osm.gz, .osm.bz2).
+
+    Every node's coordinates are kept while streaming, so pre-filter large
+    extracts to highways first, e.g.
+    ``osmium tags-filter region.osm.pbf w/highway -o roads.osm``.
+    """
+    opener = {".gz": gzip.open, ".bz2": bz2.open}.get(Path(path).suffix, open)
+    node_index: dict[str, int] = {}
+    lats: list[float] = []
+    lons: list[float] = []
+    ways: list[tuple[list[int], float, int]] = []
+
+    with opener(path, "rb") as handle:
+        way_refs: list[str] = []
+        for _, elem in ET.iterparse(handle, events=("end",)):
+            if elem.tag == "nd":
+                way_refs.append(elem.get("ref"))
+                continue
+            if elem.tag == "node":
+                node_index[elem.get("id")] = len(lats)
+                lats.append(float(elem.get("lat")))
+                lons.append(float(elem.get("lon")))
+            elif elem.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+                factor = edge_factor(tags)
+                refs = [node_index[ref] for ref in way_refs if ref in node_index]
+                if factor is not None and len(refs) >= 2:
+                    ways.append((refs, factor, way_direction(tags)))
+                way_refs = []
+            else:
+                continue
+            elem.clear()
+
+    return RoadGraph.build(lats, lons, ways)
+
+
+def get_road_graph() -> RoadGraph | None:
+    """Return the process-wide road graph, memory-mapping it on first use."""
+    global _graph, _graph_loaded
+    if not _graph_loaded:
+        _graph_loaded = True
+        path = Path(os.environ.get("ROAD_GRAPH_PATH") or DEFAULT_PATH)
+        if (path / "meta.json").exists():
+            try:
+                _graph = RoadGraph.load(path)
+            except Exception:
+                _graph = None
+    return _graph
+
+
+def set_road_graph(graph: RoadGraph | None) -> None:
+    """Install a graph explicitly (used by tests and the import script)."""
+    global _graph, _graph_loaded
+    _graph = graph
+    _graph_loaded = True
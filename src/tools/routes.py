@@ -1,19 +1,55 @@
 from __future__ import annotations
 
+import contextvars
+import math
 import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
 import httpx
-from pydantic import BaseModel
+import numpy as np
+from pydantic import BaseModel, Field
+
+from src.tools.cache import TTLCache
+from src.tools.corridor import cumulative_km, project_onto_polyline
+from src.tools.gazetteer import get_gazetteer
+from src.tools.geocoding import geocode, reverse_geocode_batch
+from src.tools.hubs import get_hubs, record_leg
+from src.tools.road_graph import get_road_graph
+from src.tools.singleflight import SingleFlight
+from src.tools.upstream import guard
 
 
 class RouteWaypoint(BaseModel):
     name: str
     distance_from_start_km: float
+    lat: float | None = None
+    lon: float | None = None
 
 
 class RouteRequest(BaseModel):
     origin: str
     destination: str
     preferred_daily_km: float | None = None
+    via: list[str] = Field(default_factory=list, description="Places to pass through, in order")
+
+
+# Settlements this big and this close to the route line become town waypoints
+TOWN_MIN_POPULATION = 2000
+TOWN_CORRIDOR_KM = 5.0
+
+# Legs longer than this (straight line) are split at towns along the way, which
+# keeps ORS requests inside its distance limit and makes legs small enough to reuse
+MAX_LEG_KM = 300.0
+LEG_CONCURRENCY = 4
+# Routed legs change only when the road network does
+ROUTE_LEG_CACHE_TTL = 30 * 24 * 3600
+# Straight-line estimates get this much extra for the roads' detours
+DETOUR_FACTOR = 1.2
+
+# Legs carry full geometry, so each is its own file rather than part of one snapshot
+_cache = TTLCache("route_legs", ttl=ROUTE_LEG_CACHE_TTL, max_entries=5_000, disk_entries=50_000)
+_flight = SingleFlight("openrouteservice")
 
 
 class RouteResult(BaseModel):
@@ -22,6 +58,16 @@ class RouteResult(BaseModel):
     total_distance_km: float
     estimated_days: int
     waypoints: list[RouteWaypoint]
+    source: str = "mock"
+    # (lat, lon, km from start) along the whole stitched route
+    geometry: list[tuple[float, float, float]] = Field(default_factory=list, repr=False)
+
+
+@dataclass(frozen=True)
+class _Leg:
+    points: list[tuple[float, float]]  # (lat, lon), first and last at the leg's ends
+    distance_km: float
+    source: str
 
 
 MOCK_ROUTES = {
@@ -31,19 +77,19 @@ MOCK_ROUTES = {
         total_distance_km=780.0,
         estimated_days=8,
         waypoints=[
-            RouteWaypoint(name="Almere", distance_from_start_km=30),
-            RouteWaypoint(name="Lelystad", distance_from_start_km=55),
-            RouteWaypoint(name="Zwolle", distance_from_start_km=120),
-            RouteWaypoint(name="Meppel", distance_from_start_km=140),
-            RouteWaypoint(name="Groningen", distance_from_start_km=185),
-            RouteWaypoint(name="Leer", distance_from_start_km=225),
-            RouteWaypoint(name="Oldenburg", distance_from_start_km=310),
-            RouteWaypoint(name="Bremen", distance_from_start_km=380),
-            RouteWaypoint(name="Hamburg", distance_from_start_km=480),
-            RouteWaypoint(name="Lubeck", distance_from_start_km=575),
-            RouteWaypoint(name="Puttgarden", distance_from_start_km=670),
-            RouteWaypoint(name="Rodby", distance_from_start_km=715),
-            RouteWaypoint(name="Copenhagen", distance_from_start_km=780),
+            RouteWaypoint(name="Almere", distance_from_start_km=30, lat=52.37, lon=5.22),
+            RouteWaypoint(name="Lelystad", distance_from_start_km=55, lat=52.52, lon=5.47),
+            RouteWaypoint(name="Zwolle", distance_from_start_km=120, lat=52.51, lon=6.09),
+            RouteWaypoint(name="Meppel", distance_from_start_km=140, lat=52.7, lon=6.19),
+            RouteWaypoint(name="Groningen", distance_from_start_km=185, lat=53.22, lon=6.57),
+            RouteWaypoint(name="Leer", distance_from_start_km=225, lat=53.23, lon=7.45),
+            RouteWaypoint(name="Oldenburg", distance_from_start_km=310, lat=53.14, lon=8.21),
+            RouteWaypoint(name="Bremen", distance_from_start_km=380, lat=53.08, lon=8.8),
+            RouteWaypoint(name="Hamburg", distance_from_start_km=480, lat=53.55, lon=9.99),
+            RouteWaypoint(name="Lubeck", distance_from_start_km=575, lat=53.87, lon=10.69),
+            RouteWaypoint(name="Puttgarden", distance_from_start_km=670, lat=54.5, lon=11.22),
+            RouteWaypoint(name="Rodby", distance_from_start_km=715, lat=54.69, lon=11.39),
+            RouteWaypoint(name="Copenhagen", distance_from_start_km=780, lat=55.68, lon=12.57),
         ],
     )
 }
@@ -51,8 +97,12 @@ MOCK_ROUTES = {
 
 def get_route(request: RouteRequest) -> RouteResult:
     """
-    Get cycling route using OpenRouteService API.
-    Falls back to Nominatim geocoding + distance calculation if ORS is unavailable.
+    Get a cycling route through any via-points. The trip is split into legs
+    (at via-points, and at hub towns along long stretches) that are routed
+    concurrently and cached one by one, so changing a via-point only re-routes
+    the legs next to it and trips that overlap share their hub-to-hub legs.
+    Each leg uses OpenRouteService, else the local road graph, else a
+    straight-line estimate; the legs are stitched into one route.
     """
     ors_api_key = os.environ.get("OPENROUTESERVICE_API_KEY")
     
@@ -63,97 +113,325 @@ def get_route(request: RouteRequest) -> RouteResult:
     if not origin_coords or not dest_coords:
         # Fall back to mock data
         return _get_mock_route(request)
-    
-    if ors_api_key:
+
+    # Via-points that can't be found are left out rather than failing the trip
+    stops = [(request.origin, origin_coords)]
+    for name in request.via:
+        coords = _geocode_location(name)
+        if coords:
+            stops.append((name, coords))
+    stops.append((request.destination, dest_coords))
+
+    ends, pairs, links = _split_into_legs(stops)
+    legs = _route_legs(pairs, links, ors_api_key)
+    return _stitch(request, legs, ends)
+
+
+def _geocode_location(location: str) -> tuple[float, float] | None:
+    """Geocode location as (lon, lat), the coordinate order ORS expects."""
+    coords = geocode(location)
+    if coords:
+        return (coords[1], coords[0])
+    return None
+
+
+def _split_into_legs(
+    stops: list[tuple[str, tuple[float, float]]]
+) -> tuple[list[str | None], list[tuple[tuple[float, float], tuple[float, float]]], list[tuple[int, int] | None]]:
+    """
+    (lon, lat) leg ends between consecutive stops. Long stretches are cut at
+    hubs so overlapping trips share their middle legs, and gaps still over
+    ``MAX_LEG_KM`` are cut at towns near evenly spaced points on the straight
+    line. Returns the stop name each leg ends at (None at cut points), the
+    legs, and the (from, to) hubs of each hub-to-hub leg.
+    """
+    hub_set = get_hubs()
+    first = stops[0][1]
+    points = [first]
+    hub_ids = [hub_set.at(first[1], first[0]) if hub_set else -1]
+    ends: list[str | None] = []
+    for (_, start), (name, end) in zip(stops, stops[1:]):
+        if hub_set:
+            for hub in hub_set.chain((start[1], start[0]), (end[1], end[0])):
+                lat, lon = hub_set.point(hub)
+                _extend_legs(points, hub_ids, ends, (lon, lat), hub, None)
+        _extend_legs(points, hub_ids, ends, end, hub_set.at(end[1], end[0]) if hub_set else -1, name)
+    links = [(a, b) if a >= 0 and b >= 0 else None for a, b in zip(hub_ids, hub_ids[1:])]
+    return ends, list(zip(points[:-1], points[1:])), links
+
+
+def _extend_legs(
+    points: list[tuple[float, float]],
+    hub_ids: list[int],
+    ends: list[str | None],
+    point: tuple[float, float],
+    hub: int,
+    name: str | None,
+) -> None:
+    gap = _haversine_distance(points[-1], point)
+    if gap < 0.01:
+        # A stop at the hub the chain already reached
+        hub_ids[-1] = hub if hub >= 0 else hub_ids[-1]
+        if ends and name:
+            ends[-1] = name
+        return
+    start = points[-1]
+    pieces = max(1, math.ceil(gap / MAX_LEG_KM))
+    cuts = [
+        (start[0] + (point[0] - start[0]) * i / pieces, start[1] + (point[1] - start[1]) * i / pieces)
+        for i in range(1, pieces)
+    ]
+    # Same stops give the same towns, so the cut legs stay cacheable
+    towns = reverse_geocode_batch([(lat, lon) for lon, lat in cuts])
+    points.extend((town.lon, town.lat) if town else cut for cut, town in zip(cuts, towns))
+    hub_ids.extend([-1] * len(cuts))
+    ends.extend([None] * len(cuts))
+    points.append(point)
+    hub_ids.append(hub)
+    ends.append(name)
+
+
+def _route_legs(
+    pairs: list[tuple[tuple[float, float], tuple[float, float]]],
+    links: list[tuple[int, int] | None],
+    api_key: str | None,
+) -> list[_Leg]:
+    if len(pairs) == 1:
+        return [_route_leg(*pairs[0], api_key, links[0])]
+    # Each worker runs in a copy of this context, so deadlines and priorities carry over
+    with ThreadPoolExecutor(max_workers=min(LEG_CONCURRENCY, len(pairs)), thread_name_prefix="route-leg") as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _route_leg, a, b, api_key, link)
+            for (a, b), link in zip(pairs, links)
+        ]
+        return [future.result() for future in futures]
+
+
+def _route_leg(
+    start: tuple[float, float],
+    end: tuple[float, float],
+    api_key: str | None,
+    link: tuple[int, int] | None = None,
+) -> _Leg:
+    """
+    One (lon, lat) -> (lon, lat) leg: cached, else ORS, else the local road
+    graph, else an estimate. Routed hub-to-hub legs (``link``) become links
+    later trips can chain.
+    """
+    key = f"{start[0]:.5f},{start[1]:.5f}:{end[0]:.5f},{end[1]:.5f}"
+    entry = _cache.get(key)
+    if entry is not None:
+        if entry.stale:
+            # Serve the old leg now and reroute it in the background
+            _cache.refresh([key], lambda keys: {key: _leg_value(_routed_leg(key, start, end, api_key))})
+        points, distance_km, source = entry.value
+        leg = _Leg([tuple(p) for p in points], distance_km, source)
+        _record_leg(leg, link, cached=True)
+        return leg
+
+    leg = _routed_leg(key, start, end, api_key)
+    if leg is None:
+        # Estimates aren't cached so a later request can still get a real route
+        leg = _estimate_leg(start, end)
+        record_leg(link is not None, cached=False, distance_km=leg.distance_km)
+        return leg
+    _cache.set(key, _leg_value(leg))
+    _record_leg(leg, link, cached=False)
+    return leg
+
+
+def _routed_leg(key: str, start: tuple[float, float], end: tuple[float, float], api_key: str | None) -> _Leg | None:
+    """The leg from ORS, else the local road graph; None when neither can route it."""
+    if api_key:
         try:
-            return _get_ors_route(request, origin_coords, dest_coords, ors_api_key)
+            return _flight.do(key, lambda: _get_ors_leg(start, end, api_key))
         except Exception:
             pass
-    
-    # Fallback: calculate straight-line distance and create waypoints
-    return _create_simple_route(request, origin_coords, dest_coords)
+    return _get_local_leg(start, end)
 
 
-def _geocode_location(location: str) -> tuple[float, float] | None:
-    """Geocode location using Nominatim API."""
-    try:
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            "q": location,
-            "format": "json",
-            "limit": 1
-        }
-        headers = {"User-Agent": "CyclingPlanner/1.0"}
-        
-        with httpx.Client(timeout=10.0) as client:
-            response = client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            results = response.json()
-            
-            if results:
-                return (float(results[0]["lon"]), float(results[0]["lat"]))
-    except Exception:
-        pass
-    return None
+def _leg_value(leg: _Leg | None) -> list | None:
+    """A leg as its JSON-friendly cache entry."""
+    return None if leg is None else [[list(p) for p in leg.points], leg.distance_km, leg.source]
+
+
+def _record_leg(leg: _Leg, link: tuple[int, int] | None, cached: bool) -> None:
+    record_leg(link is not None, cached=cached, distance_km=leg.distance_km)
+    hub_set = get_hubs()
+    if link is not None and hub_set is not None:
+        hub_set.link(*link, leg.distance_km)
 
 
-def _get_ors_route(
-    request: RouteRequest,
-    origin_coords: tuple[float, float],
-    dest_coords: tuple[float, float],
-    api_key: str
-) -> RouteResult:
-    """Get route from OpenRouteService API."""
+def _get_ors_leg(start: tuple[float, float], end: tuple[float, float], api_key: str) -> _Leg:
+    """Get one leg from OpenRouteService API."""
     url = "https://api.openrouteservice.org/v2/directions/cycling-regular"
     headers = {
         "Authorization": api_key,
         "Content-Type": "application/json"
     }
     payload = {
-        "coordinates": [list(origin_coords), list(dest_coords)],
-        "instructions": True,
+        "coordinates": [list(start), list(end)],
+        "instructions": False,
         "elevation": True
     }
     
-    with httpx.Client(timeout=30.0) as client:
+    with guard("openrouteservice") as timeout, httpx.Client(timeout=timeout) as client:
         response = client.post(url, json=payload, headers=headers)
         response.raise_for_status()
         data = response.json()
-        
-        route = data["routes"][0]
-        distance_km = route["summary"]["distance"] / 1000
-        daily_km = request.preferred_daily_km or 100.0
-        estimated_days = max(1, int(distance_km / daily_km))
-        
-        # Extract waypoints from route segments
-        waypoints = []
-        segments = route.get("segments", [])
-        cumulative_distance = 0.0
-        
-        for segment in segments:
-            for step in segment.get("steps", []):
-                cumulative_distance += step["distance"] / 1000
-                if step.get("name"):
-                    waypoints.append(RouteWaypoint(
-                        name=step["name"],
-                        distance_from_start_km=round(cumulative_distance, 1)
-                    ))
-        
-        # Ensure destination is included
-        if not waypoints or waypoints[-1].distance_from_start_km < distance_km:
-            waypoints.append(RouteWaypoint(
-                name=request.destination.title(),
-                distance_from_start_km=round(distance_km, 1)
-            ))
-        
-        return RouteResult(
-            origin=request.origin.title(),
-            destination=request.destination.title(),
-            total_distance_km=round(distance_km, 1),
-            estimated_days=estimated_days,
-            waypoints=waypoints[:20]  # Limit waypoints
+
+    route = data["routes"][0]
+    points = []
+    if isinstance(route.get("geometry"), str):
+        points = _decode_polyline(route["geometry"], with_elevation=payload["elevation"])
+    if len(points) < 2:
+        points = [(start[1], start[0]), (end[1], end[0])]
+    return _Leg(points, route["summary"]["distance"] / 1000, "openrouteservice")
+
+
+def _get_local_leg(start: tuple[float, float], end: tuple[float, float]) -> _Leg | None:
+    """Route over the memory-mapped road graph; None when no graph covers both ends."""
+    graph = get_road_graph()
+    if graph is None:
+        return None
+    path = graph.route((start[1], start[0]), (end[1], end[0]))
+    if path is None or len(path.points) < 2:
+        return None
+    return _Leg(path.points, path.distance_km, "local_router")
+
+
+def _estimate_leg(start: tuple[float, float], end: tuple[float, float]) -> _Leg:
+    distance_km = _haversine_distance(start, end) * DETOUR_FACTOR
+    return _Leg([(start[1], start[0]), (end[1], end[0])], distance_km, "estimate")
+
+
+def _stitch(request: RouteRequest, legs: list[_Leg], ends: list[str | None]) -> RouteResult:
+    """
+    Join legs into one route: cumulative-distance geometry, towns along each
+    leg (or evenly spaced stops on estimated legs) and a waypoint at every
+    cut point, via-point and the destination.
+    """
+    daily_km = request.preferred_daily_km or 100.0
+    waypoints: list[RouteWaypoint] = []
+    geometry: list[tuple[float, float, float]] = []
+    done_km = 0.0
+    for leg, end in zip(legs, ends):
+        if leg.source == "estimate":
+            along = _waypoints_along(leg.points, leg.distance_km, daily_km)
+        else:
+            along = _intermediate_towns(leg.points, leg.distance_km) or _waypoints_along(
+                leg.points, leg.distance_km, daily_km
+            )
+        waypoints.extend(
+            w.model_copy(update={"distance_from_start_km": round(done_km + w.distance_from_start_km, 1)})
+            for w in along
         )
 
+        route = np.asarray(leg.points, dtype=np.float64)
+        measured = cumulative_km(route[:, 0], route[:, 1])
+        scale = leg.distance_km / measured[-1] if measured[-1] > 0 else 1.0
+        # Consecutive legs share their end point
+        first = 1 if geometry else 0
+        geometry.extend(
+            (lat, lon, round(done_km + km * scale, 3))
+            for (lat, lon), km in zip(leg.points[first:], measured[first:].tolist())
+        )
+
+        done_km += leg.distance_km
+        waypoints.append(RouteWaypoint(
+            # Cut points are hubs or towns; they get their name below
+            name=end.title() if end is not None else f"Waypoint {len(waypoints) + 1}",
+            distance_from_start_km=round(done_km, 1),
+            lat=leg.points[-1][0],
+            lon=leg.points[-1][1],
+        ))
+
+    return RouteResult(
+        origin=request.origin.title(),
+        destination=request.destination.title(),
+        total_distance_km=round(done_km, 1),
+        estimated_days=max(1, int(done_km / daily_km)),
+        waypoints=_snap_waypoints_to_towns(waypoints),
+        source="+".join(dict.fromkeys(leg.source for leg in legs)),
+        geometry=geometry,
+    )
+
+
+def _decode_polyline(encoded: str, with_elevation: bool = False) -> list[tuple[float, float]]:
+    """Decode an ORS/Google encoded polyline into (lat, lon) pairs."""
+    dims = 3 if with_elevation else 2
+    values, current, shift, index = [], 0, 0, 0
+    while index < len(encoded):
+        byte = ord(encoded[index]) - 63
+        index += 1
+        current |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(current >> 1) if current & 1 else current >> 1)
+            current, shift = 0, 0
+
+    points, lat, lon = [], 0, 0
+    for i in range(0, len(values) - dims + 1, dims):
+        lat += values[i]
+        lon += values[i + 1]
+        points.append((lat / 1e5, lon / 1e5))
+    return points
+
+
+def _intermediate_towns(points: list[tuple[float, float]], total_km: float) -> list[RouteWaypoint]:
+    """Towns along a route polyline, without the origin and destination themselves."""
+    return [
+        w for w in _town_waypoints(points, total_km)
+        if TOWN_CORRIDOR_KM < w.distance_from_start_km < total_km - TOWN_CORRIDOR_KM
+    ]
+
+
+def _waypoints_along(points: list[tuple[float, float]], total_km: float, daily_km: float) -> list[RouteWaypoint]:
+    """Evenly spaced points on the polyline, named after the nearest town, when the corridor has none."""
+    route = np.asarray(points)
+    along = cumulative_km(route[:, 0], route[:, 1])
+    count = min(10, max(1, int(total_km / daily_km)))
+    marks = along[-1] * np.arange(1, count) / count
+    lats, lons = np.interp(marks, along, route[:, 0]), np.interp(marks, along, route[:, 1])
+    scale = total_km / along[-1] if along[-1] > 0 else 1.0
+    waypoints = [
+        RouteWaypoint(
+            name=f"Waypoint {i}",
+            distance_from_start_km=round(float(mark) * scale, 1),
+            lat=round(float(lat), 5),
+            lon=round(float(lon), 5),
+        )
+        for i, (mark, lat, lon) in enumerate(zip(marks, lats, lons), start=1)
+    ]
+    return _snap_waypoints_to_towns(waypoints)
+
+
+def _town_waypoints(points: list[tuple[float, float]], total_km: float) -> list[RouteWaypoint]:
+    """Settlements within the corridor around a route polyline, ordered along it."""
+    gazetteer = get_gazetteer()
+    if gazetteer is None or len(points) < 2:
+        return []
+
+    _, ids = gazetteer.spatial_index(TOWN_MIN_POPULATION)
+    route = np.asarray(points)
+    matches = project_onto_polyline(
+        route[:, 0], route[:, 1], gazetteer.lats[ids], gazetteer.lons[ids], TOWN_CORRIDOR_KM
+    )
+    # Scale geometric distance to the router's own total so stops line up with it
+    measured = cumulative_km(route[:, 0], route[:, 1])[-1]
+    scale = total_km / measured if measured > 0 else 1.0
+
+    waypoints = []
+    for idx, along in zip(ids[matches.ids], matches.along_km):
+        place = gazetteer.place(int(idx))
+        waypoints.append(RouteWaypoint(
+            name=place.name,
+            distance_from_start_km=round(float(along) * scale, 1),
+            lat=place.lat,
+            lon=place.lon,
+        ))
+    return waypoints
+
 
 def _haversine_distance(coord1: tuple[float, float], coord2: tuple[float, float]) -> float:
     """Calculate distance between two coordinates in km using Haversine formula."""
@@ -175,44 +453,21 @@ def _haversine_distance(coord1: tuple[float, float], coord2: tuple[float, float]
     return R * c
 
 
-def _create_simple_route(
-    request: RouteRequest,
-    origin_coords: tuple[float, float],
-    dest_coords: tuple[float, float]
-) -> RouteResult:
-    """Create a simple route with estimated waypoints."""
-    distance_km = _haversine_distance(origin_coords, dest_coords)
-    
-    # Add 20% for realistic cycling distance (not straight line)
-    distance_km = distance_km * 1.2
-    
-    daily_km = request.preferred_daily_km or 100.0
-    estimated_days = max(1, int(distance_km / daily_km))
-    
-    # Create intermediate waypoints
-    num_waypoints = min(10, estimated_days)
-    waypoints = []
-    
-    for i in range(1, num_waypoints + 1):
-        dist = (distance_km / num_waypoints) * i
-        waypoints.append(RouteWaypoint(
-            name=f"Waypoint {i}",
-            distance_from_start_km=round(dist, 1)
-        ))
-    
-    # Ensure destination is the last waypoint
-    waypoints[-1] = RouteWaypoint(
-        name=request.destination.title(),
-        distance_from_start_km=round(distance_km, 1)
-    )
-    
-    return RouteResult(
-        origin=request.origin.title(),
-        destination=request.destination.title(),
-        total_distance_km=round(distance_km, 1),
-        estimated_days=estimated_days,
-        waypoints=waypoints
-    )
+def _snap_waypoints_to_towns(waypoints: list[RouteWaypoint]) -> list[RouteWaypoint]:
+    """Rename synthetic "Waypoint N" stops after the nearest real town, in one batch lookup."""
+    synthetic = [
+        i for i, w in enumerate(waypoints)
+        if w.name.startswith("Waypoint ") and w.lat is not None and w.lon is not None
+    ]
+    if not synthetic:
+        return waypoints
+
+    towns = reverse_geocode_batch([(waypoints[i].lat, waypoints[i].lon) for i in synthetic])
+    snapped = list(waypoints)
+    for i, town in zip(synthetic, towns):
+        if town:
+            snapped[i] = waypoints[i].model_copy(update={"name": town.name, "lat": town.lat, "lon": town.lon})
+    return snapped
 
 
 def _get_mock_route(request: RouteRequest) -> RouteResult:
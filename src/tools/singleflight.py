@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import Counter
+from typing import Any, Awaitable, Callable
+
+
+# Per-key counters are trimmed to the busiest keys past this many
+MAX_TRACKED_KEYS = 1000
+
+_registry: dict[str, SingleFlight] = {}
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one upstream call.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for, and share, its result (or exception). Nothing is kept
+    once the call finishes, so this complements caching rather than replacing
+    it: it only matters for the cold-cache moment when many requests ask for
+    the same thing at once.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: dict[str, _Call] = {}
+        self._tasks: dict[tuple[int, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "shared": 0}
+        self.saved_by_key: Counter[str] = Counter()
+        _registry[name] = self
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["calls"] += 1
+            else:
+                self._record_shared(key)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant; calls are shared between tasks on the same event loop."""
+        slot = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            future = self._tasks.get(slot)
+            leader = future is None
+            if leader:
+                future = self._tasks[slot] = asyncio.ensure_future(fn())
+                future.add_done_callback(lambda _: self._tasks.pop(slot, None))
+                self.stats["calls"] += 1
+            else:
+                self._record_shared(key)
+        # Shield so one cancelled waiter doesn't cancel the call for everyone
+        return await asyncio.shield(future)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.stats = {"calls": 0, "shared": 0}
+            self.saved_by_key.clear()
+
+    def _record_shared(self, key: str) -> None:
+        self.stats["shared"] += 1
+        self.saved_by_key[key] += 1
+        if len(self.saved_by_key) > MAX_TRACKED_KEYS * 2:
+            self.saved_by_key = Counter(dict(self.saved_by_key.most_common(MAX_TRACKED_KEYS)))
+
+
+def get_singleflight_stats(top: int = 10) -> dict[str, dict]:
+    """Calls made, calls saved, and the keys that saved the most, per upstream."""
+    return {
+        name: {**flight.stats, "top_keys": dict(flight.saved_by_key.most_common(top))}
+        for name, flight in _registry.items()
+    }
+
+
+def clear_singleflight_stats() -> None:
+    for flight in _registry.values():
+        flight.clear()
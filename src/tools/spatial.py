@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km; all arguments broadcast as NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex:
+    """Fixed-size lat/lon bucket index over a static point set.
+
+    Points are sorted by cell id so every cell is a contiguous slice (CSR
+    style); a query only touches the cells its search radius can reach.
+    Batch queries group points by cell and score each group against its
+    shared candidate set in one vectorised distance computation.
+    """
+
+    def __init__(self, lats, lons, cell_deg: float = 0.5) -> None:
+        self.cell_deg = cell_deg
+        self.n_cols = int(math.ceil(360 / cell_deg))
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+
+        keys = self.cell_keys(lats, lons)
+        self.order = np.argsort(keys, kind="stable")
+        self.lats = lats[self.order]
+        self.lons = lons[self.order]
+        sorted_keys = keys[self.order]
+        self.cells, self.starts = np.unique(sorted_keys, return_index=True)
+        self.ends = np.append(self.starts[1:], len(sorted_keys))
+
+    @classmethod
+    def from_sorted(cls, lats, lons, cells, starts, cell_deg: float) -> GridIndex:
+        """Wrap points already sorted by cell (e.g. memory-mapped from disk) without copying."""
+        index = cls.__new__(cls)
+        index.cell_deg = cell_deg
+        index.n_cols = int(math.ceil(360 / cell_deg))
+        index.lats, index.lons = lats, lons
+        index.order = np.arange(len(lats))
+        index.cells, index.starts = cells, starts
+        index.ends = np.append(starts[1:], len(lats))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """Ids (into the original arrays) and distances of points within ``radius_km``, nearest first."""
+        slots = self._candidates(lat, lat, lon, lon, radius_km)
+        if not len(slots):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        dists = haversine_km(lat, lon, self.lats[slots], self.lons[slots])
+        keep = dists <= radius_km
+        slots, dists = slots[keep], dists[keep]
+        ranked = np.argsort(dists, kind="stable")
+        return self.order[slots[ranked]], dists[ranked]
+
+    def nearest(self, lats, lons, max_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """Nearest point to each query within ``max_km``; id -1 and distance inf when none."""
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        ids = np.full(len(lats), -1, dtype=np.int64)
+        dists = np.full(len(lats), np.inf)
+        if not len(self) or not len(lats):
+            return ids, dists
+
+        query_keys = self.cell_keys(lats, lons)
+        for key in np.unique(query_keys):
+            members = np.nonzero(query_keys == key)[0]
+            slots = self._candidates(
+                lats[members].min(), lats[members].max(), lons[members].min(), lons[members].max(), max_km
+            )
+            if not len(slots):
+                continue
+            matrix = haversine_km(
+                lats[members, None], lons[members, None], self.lats[None, slots], self.lons[None, slots]
+            )
+            best = np.argmin(matrix, axis=1)
+            best_dist = matrix[np.arange(len(members)), best]
+            found = best_dist <= max_km
+            ids[members[found]] = self.order[slots[best[found]]]
+            dists[members[found]] = best_dist[found]
+        return ids, dists
+
+    def cell_keys(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        rows = np.floor((lats + 90) / self.cell_deg).astype(np.int64)
+        cols = np.floor((lons + 180) / self.cell_deg).astype(np.int64)
+        return rows * self.n_cols + cols
+
+    def _candidates(self, south: float, north: float, west: float, east: float, radius_km: float) -> np.ndarray:
+        """Sorted-array slots of every point in cells a ``radius_km`` box around the bounds touches."""
+        pad_lat = radius_km / KM_PER_DEG_LAT
+        widest = min(max(abs(south - pad_lat), abs(north + pad_lat)), 89.0)
+        pad_lon = radius_km / (KM_PER_DEG_LAT * math.cos(math.radians(widest)))
+
+        row_lo = int(math.floor((south - pad_lat + 90) / self.cell_deg))
+        row_hi = int(math.floor((north + pad_lat + 90) / self.cell_deg))
+        col_lo = int(math.floor((west - pad_lon + 180) / self.cell_deg))
+        col_hi = int(math.floor((east + pad_lon + 180) / self.cell_deg))
+
+        chunks = []
+        for row in range(row_lo, row_hi + 1):
+            lo = np.searchsorted(self.cells, row * self.n_cols + col_lo, side="left")
+            hi = np.searchsorted(self.cells, row * self.n_cols + col_hi, side="right")
+            for cell in range(lo, hi):
+                chunks.append(np.arange(self.starts[cell], self.ends[cell]))
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from enum import IntEnum
+from typing import Iterator
+from urllib.parse import urlparse
+
+
+class Priority(IntEnum):
+    """Lower goes first when several calls wait on the same upstream."""
+
+    INTERACTIVE = 0  # routing, geocoding: the user is waiting on these
+    ENRICHMENT = 1  # POIs and other nice-to-haves in a plan
+    BACKGROUND = 2  # cache refreshes and warmup
+
+
+@dataclass(frozen=True)
+class UpstreamLimits:
+    rate: float  # sustained requests per second
+    burst: int  # requests allowed back-to-back after idling
+    max_queue: int  # callers waiting beyond this fail fast to their fallback
+    max_wait_s: float = 10.0  # give up on a slot after this long
+    failure_threshold: int = 5  # consecutive failures that open the circuit
+    reset_after_s: float = 30.0  # how long an open circuit skips the upstream
+
+
+# Defaults follow each service's published usage policy; override any field
+# with UPSTREAM_LIMITS='{"overpass": {"rate": 1.0, "max_queue": 4}}'
+DEFAULT_LIMITS = {
+    "nominatim": UpstreamLimits(rate=1.0, burst=1, max_queue=10),
+    "overpass": UpstreamLimits(rate=0.5, burst=2, max_queue=8),
+    "open_meteo": UpstreamLimits(rate=5.0, burst=10, max_queue=50),
+    "openrouteservice": UpstreamLimits(rate=0.6, burst=3, max_queue=20),
+    "open_elevation": UpstreamLimits(rate=1.0, burst=2, max_queue=10),
+    "anthropic": UpstreamLimits(rate=5.0, burst=10, max_queue=50),
+}
+FALLBACK_LIMITS = UpstreamLimits(rate=1.0, burst=1, max_queue=10)
+
+
+def _load_overrides() -> dict[str, dict]:
+    try:
+        return json.loads(os.environ.get("UPSTREAM_LIMITS") or "{}")
+    except ValueError:
+        return {}
+
+
+# Read once at startup, like the rest of the service configuration
+_overrides = _load_overrides()
+
+# Offline mode (CYCLING_PLANNER_OFFLINE=1): every upstream call is refused
+# before a socket is opened, so tools answer from local data and mocks only
+_offline = (os.environ.get("CYCLING_PLANNER_OFFLINE") or "").lower() in ("1", "true", "yes")
+
+# Below this much time left, a call isn't worth starting
+MIN_CALL_S = 0.25
+
+# Result sources that stand in for a failed, refused or skipped upstream call
+FALLBACK_SOURCES = {"mock", "estimate", "heuristic"}
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("upstream_priority", default=Priority.INTERACTIVE)
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("upstream_deadline", default=None)
+
+_limiters: dict[str, RateLimiter] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+_limiters_lock = threading.Lock()
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was refused locally; callers should use their fallback."""
+
+
+class UpstreamBusy(UpstreamUnavailable):
+    """The upstream's queue is full, or no slot freed up in time."""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """The upstream failed repeatedly and is being skipped for a while."""
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """The request's time budget doesn't leave room for this call."""
+
+
+class Offline(UpstreamUnavailable):
+    """The service runs in offline mode and never calls upstreams."""
+
+
+class RateLimiter:
+    """Token bucket whose waiters are served in priority order, then FIFO.
+
+    A caller that finds a free token and nobody waiting goes straight through;
+    otherwise it joins the queue, and the queue head takes the next token as
+    it refills. A full queue rejects new callers immediately rather than
+    letting them pile up behind a throttled host.
+    """
+
+    def __init__(self, name: str, limits: UpstreamLimits) -> None:
+        self.name = name
+        self.limits = limits
+        self._tokens = float(limits.burst)
+        self._updated = time.monotonic()
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.stats = {"acquired": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    def acquire(self, priority: Priority = Priority.INTERACTIVE, timeout: float | None = None) -> None:
+        timeout = self.limits.max_wait_s if timeout is None else min(timeout, self.limits.max_wait_s)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._refill()
+            if not self._waiters and self._tokens >= 1:
+                self._tokens -= 1
+                self.stats["acquired"] += 1
+                return
+            if len(self._waiters) >= self.limits.max_queue:
+                self.stats["rejected"] += 1
+                raise UpstreamBusy(f"{self.name}: {len(self._waiters)} calls already queued")
+
+            ticket = (int(priority), next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            self.stats["queued"] += 1
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] == ticket and self._tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        self.stats["acquired"] += 1
+                        self._cond.notify_all()
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["timed_out"] += 1
+                        raise UpstreamBusy(f"{self.name}: no slot within {timeout:.1f}s")
+                    until_token = max(0.0, (1 - self._tokens) / self.limits.rate)
+                    self._cond.wait(min(remaining, until_token or remaining))
+            except BaseException:
+                if ticket in self._waiters:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(float(self.limits.burst), self._tokens + (now - self._updated) * self.limits.rate)
+        self._updated = now
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures.
+
+    While open every call is refused without touching the network. After
+    ``reset_after_s`` a single trial call is let through (half-open): success
+    closes the circuit, failure opens it for another period.
+    """
+
+    def __init__(self, name: str, limits: UpstreamLimits) -> None:
+        self.name = name
+        self.limits = limits
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.stats = {"successes": 0, "failures": 0, "short_circuited": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.limits.reset_after_s:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return
+            self.stats["short_circuited"] += 1
+        raise CircuitOpen(f"{self.name}: circuit open after {self.failures} failures")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+            self.stats["successes"] += 1
+
+    def cancel_trial(self) -> None:
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self.stats["failures"] += 1
+            if self._trial_running or self.failures >= self.limits.failure_threshold:
+                if self.opened_at is None or self._trial_running:
+                    self.stats["opened"] += 1
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+def limits_for(name: str) -> UpstreamLimits:
+    limits = DEFAULT_LIMITS.get(name, FALLBACK_LIMITS)
+    try:
+        return replace(limits, **(_overrides.get(name) or {}))
+    except TypeError:
+        return limits
+
+
+def _host_key(name: str, url: str | None) -> str:
+    host = urlparse(url).hostname if url else None
+    return f"{name}:{host}" if host else name
+
+
+def get_limiter(name: str, url: str | None = None) -> RateLimiter:
+    """The limiter for one upstream host; mirrors of one service share its limits but not its bucket."""
+    key = _host_key(name, url)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(key, limits_for(name))
+    return limiter
+
+
+def get_breaker(name: str, url: str | None = None) -> CircuitBreaker:
+    """The circuit breaker for one upstream host, keyed like its limiter."""
+    key = _host_key(name, url)
+    with _limiters_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(key, limits_for(name))
+    return breaker
+
+
+def throttle(name: str, url: str | None = None) -> None:
+    """Wait for a slot on an upstream at the current priority, or raise ``UpstreamBusy``."""
+    get_limiter(name, url).acquire(_priority.get(), timeout=remaining())
+
+
+@contextmanager
+def guard(name: str, url: str | None = None, timeout: float = 30.0) -> Iterator[float]:
+    """
+    Wrap one upstream call: refuse it in offline mode, when the circuit is
+    open or when the request's deadline is (nearly) spent; otherwise wait for
+    a rate-limit slot and yield the timeout the call should use (``timeout``
+    capped by the time left).
+    Exceptions from the call count as failures for the circuit breaker.
+    """
+    if _offline:
+        raise Offline(name)
+    breaker = get_breaker(name, url)
+    breaker.before_call()
+    try:
+        throttle(name, url)
+        call_timeout = timeout_for(timeout)
+    except UpstreamUnavailable:
+        # Refused locally, so the upstream itself wasn't tried
+        breaker.cancel_trial()
+        raise
+    try:
+        yield call_timeout
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+
+
+def is_fallback_source(source: str | None) -> bool:
+    """Whether a result's source, or any part of a stitched one like "openrouteservice+estimate", is a fallback."""
+    return not source or any(part in FALLBACK_SOURCES for part in source.split("+"))
+
+
+def is_offline() -> bool:
+    return _offline
+
+
+def set_offline(offline: bool) -> None:
+    """Switch offline mode on or off (normally set once at startup)."""
+    global _offline
+    _offline = offline
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Give everything inside the block at most ``seconds``, within any enclosing deadline."""
+    expires = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(min(expires, outer) if outer is not None else expires)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def share(fraction: float) -> Iterator[None]:
+    """Narrow the current deadline to ``fraction`` of the time left, e.g. for one pipeline stage."""
+    left = remaining()
+    if left is None:
+        yield
+        return
+    with deadline(left * fraction):
+        yield
+
+
+def remaining() -> float | None:
+    """Seconds left before the current deadline, or None when there is none."""
+    expires = _deadline.get()
+    return None if expires is None else max(0.0, expires - time.monotonic())
+
+
+def timeout_for(default: float) -> float:
+    """``default`` capped by the current deadline; raises once too little time is left."""
+    left = remaining()
+    if left is None:
+        return default
+    if left < MIN_CALL_S:
+        raise DeadlineExceeded(f"{left:.2f}s left")
+    return min(default, left)
+
+
+@contextmanager
+def priority(level: Priority) -> Iterator[None]:
+    """Run upstream calls made inside the block (in this thread or context) at ``level``."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+def get_limiter_stats() -> dict[str, dict[str, int]]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {lim.name: {**lim.stats, "queue_depth": lim.queue_depth} for lim in limiters}
+
+
+def get_breaker_stats() -> dict[str, dict]:
+    with _limiters_lock:
+        breakers = list(_breakers.values())
+    return {b.name: {**b.stats, "state": b.state} for b in breakers}
+
+
+def reset_limiters() -> None:
+    """Forget all rate-limit and circuit-breaker state."""
+    with _limiters_lock:
+        _limiters.clear()
+        _breakers.clear()
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from pydantic import BaseModel
+import numpy as np
+from pydantic import BaseModel, Field
+
+from src.tools.countries import COUNTRY_NAMES, country_code, country_name
 
 
 class VisaRequest(BaseModel):
@@ -8,85 +11,143 @@ class VisaRequest(BaseModel):
     destinations: list[str]
 
 
+class VisaDestination(BaseModel):
+    country: str
+    code: str | None
+    requires_visa: bool
+    policy: str  # one of POLICY_LABELS
+
+
 class VisaResult(BaseModel):
     requires_visa: bool
     notes: str
+    destinations: list[VisaDestination] = Field(default_factory=list)
+
+
+class VisaBatchRequest(BaseModel):
+    citizenships: list[str]
+    itineraries: list[list[str]]
+
+
+class VisaBatchResult(BaseModel):
+    # requires_visa[t][i]: does traveller t need a visa anywhere on itinerary i
+    requires_visa: list[list[bool]]
 
 
-# Comprehensive visa-free travel data for common scenarios
-# EU/Schengen countries
+# Schengen members (EU plus the EFTA states), as of 2025
 SCHENGEN_COUNTRIES = {
-    "austria", "belgium", "czechia", "czech republic", "denmark", "estonia", "finland",
-    "france", "germany", "greece", "hungary", "iceland", "italy", "latvia", "liechtenstein",
-    "lithuania", "luxembourg", "malta", "netherlands", "norway", "poland", "portugal",
-    "slovakia", "slovenia", "spain", "sweden", "switzerland"
+    "AT", "BE", "BG", "CH", "CZ", "DE", "DK", "EE", "ES", "FI", "FR", "GR", "HR", "HU", "IS",
+    "IT", "LI", "LT", "LU", "LV", "MT", "NL", "NO", "PL", "PT", "RO", "SE", "SI", "SK",
 }
 
+# EU countries not in Schengen
+EU_NON_SCHENGEN = {"CY", "IE"}
+
 # Countries with visa-free access to Schengen for tourism (up to 90 days)
 VISA_FREE_TO_SCHENGEN = {
-    "usa", "united states", "canada", "australia", "new zealand", "japan", "south korea",
-    "singapore", "united kingdom", "uk", "britain", "ireland", "mexico", "brazil",
-    "argentina", "chile", "israel", "uae", "united arab emirates"
+    "AE", "AR", "AU", "BR", "CA", "CL", "GB", "IE", "IL", "JP", "KR", "MX", "NZ", "SG", "US",
 }
 
-# EU countries not in Schengen
-EU_NON_SCHENGEN = {"ireland", "bulgaria", "romania", "croatia", "cyprus"}
+# The UK and Ireland let each other's citizens in without a visa or time limit
+COMMON_TRAVEL_AREA = {"GB", "IE"}
+
+# Pairwise policies, most permissive first
+DOMESTIC, FREE_MOVEMENT, VISA_FREE, CHECK = range(4)
+POLICY_LABELS = ("domestic", "free_movement", "visa_free_90_days", "check")
+
+
+def _build_policy_matrix() -> tuple[dict[str, int], np.ndarray]:
+    """Citizenship x destination policy codes; the extra last row and column stand for unknown countries."""
+    codes = np.array(sorted(COUNTRY_NAMES))
+    index = {code: i for i, code in enumerate(codes)}
+    eea = np.isin(codes, list(SCHENGEN_COUNTRIES | EU_NON_SCHENGEN))
+    visa_free = np.isin(codes, list(VISA_FREE_TO_SCHENGEN))
+    common = np.isin(codes, list(COMMON_TRAVEL_AREA))
+
+    matrix = np.full((len(codes) + 1, len(codes) + 1), CHECK, dtype=np.int8)
+    known = matrix[:-1, :-1]
+    known[np.ix_(visa_free, eea)] = VISA_FREE
+    known[np.ix_(eea, eea)] = FREE_MOVEMENT
+    known[np.ix_(common, common)] = FREE_MOVEMENT
+    np.fill_diagonal(known, DOMESTIC)
+    return index, matrix
+
+
+_INDEX, _POLICY = _build_policy_matrix()
+_UNKNOWN = len(_INDEX)
+
+
+def _country_index(name: str) -> int:
+    return _INDEX.get(country_code(name) or "", _UNKNOWN)
 
 
 def check_visa_requirements(request: VisaRequest) -> VisaResult:
     """
     Check visa requirements based on citizenship and destinations.
-    Uses static visa policy data for common travel scenarios.
+    Every (citizenship, destination) pair is one lookup in a policy matrix
+    built at import from static visa policy data for common travel scenarios.
     """
-    citizenship = request.citizenship.lower().strip()
-    destinations = [d.lower().strip() for d in request.destinations]
-    
-    # Check if all destinations are in Schengen area
-    all_schengen = all(dest in SCHENGEN_COUNTRIES for dest in destinations)
-    
-    # Case 1: EU/Schengen citizen traveling within Schengen
-    if citizenship in SCHENGEN_COUNTRIES and all_schengen:
-        return VisaResult(
-            requires_visa=False,
-            notes="Schengen area travel — no visa required. EU/EEA citizens have freedom of movement."
-        )
-    
-    # Case 2: EU citizen traveling within EU (including non-Schengen EU)
-    all_eu = all(dest in SCHENGEN_COUNTRIES or dest in EU_NON_SCHENGEN for dest in destinations)
-    if citizenship in SCHENGEN_COUNTRIES and all_eu:
-        return VisaResult(
-            requires_visa=False,
-            notes="EU travel — no visa required. Freedom of movement applies."
-        )
-    
-    # Case 3: Visa-free country traveling to Schengen
-    if citizenship in VISA_FREE_TO_SCHENGEN and all_schengen:
-        return VisaResult(
-            requires_visa=False,
-            notes=f"Visa-free travel to Schengen area for {request.citizenship} citizens. "
-                  "Up to 90 days in any 180-day period. Valid passport required."
-        )
-    
-    # Case 4: UK/Ireland special cases
-    if citizenship in {"united kingdom", "uk", "britain"}:
-        return VisaResult(
-            requires_visa=False,
-            notes="UK citizens can travel visa-free to Schengen for up to 90 days. "
-                  "Check individual country requirements for longer stays."
-        )
-    
-    # Case 5: Within same country (domestic travel)
-    if len(destinations) == 1 and destinations[0] == citizenship:
-        return VisaResult(
-            requires_visa=False,
-            notes="Domestic travel — no visa required."
+    citizen = _country_index(request.citizenship)
+    targets = np.array([_country_index(d) for d in request.destinations], dtype=np.int64)
+    policies = _POLICY[citizen, targets]
+
+    destinations = [
+        VisaDestination(
+            country=country_name(country_code(name)) if target != _UNKNOWN else name.strip().title(),
+            code=country_code(name) if target != _UNKNOWN else None,
+            requires_visa=bool(policy == CHECK),
+            policy=POLICY_LABELS[policy],
         )
-    
-    # Default: May require visa (recommend checking)
-    dest_list = ", ".join([d.title() for d in destinations])
+        for name, target, policy in zip(request.destinations, targets.tolist(), policies.tolist())
+    ]
     return VisaResult(
-        requires_visa=True,
-        notes=f"Visa may be required for {request.citizenship.title()} citizens traveling to {dest_list}. "
-              "Please check with the relevant embassies or consulates. "
-              "Visit official government travel advisory websites for accurate requirements."
+        requires_visa=bool((policies == CHECK).any()),
+        notes=_notes(request.citizenship, citizen != _UNKNOWN, destinations, policies),
+        destinations=destinations,
+    )
+
+
+def check_visa_requirements_batch(request: VisaBatchRequest) -> VisaBatchResult:
+    """Whether each traveller needs a visa for each itinerary, from one gather over the policy matrix."""
+    citizens = np.array([_country_index(c) for c in request.citizenships], dtype=np.int64)
+    width = max((len(stops) for stops in request.itineraries), default=0)
+    targets = np.full((len(request.itineraries), max(width, 1)), _UNKNOWN, dtype=np.int64)
+    present = np.zeros(targets.shape, dtype=bool)
+    for row, stops in enumerate(request.itineraries):
+        targets[row, :len(stops)] = [_country_index(d) for d in stops]
+        present[row, :len(stops)] = True
+
+    # travellers x itineraries x stops, padding masked out
+    needs = (_POLICY[citizens[:, None, None], targets[None, :, :]] == CHECK) & present[None, :, :]
+    return VisaBatchResult(requires_visa=needs.any(axis=2).tolist())
+
+
+def _notes(citizenship: str, known: bool, destinations: list[VisaDestination], policies: np.ndarray) -> str:
+    code = country_code(citizenship)
+    citizenship = country_name(code) if known else citizenship.strip().title()
+    if not len(policies):
+        return "No destinations given — nothing to check."
+    if (policies == DOMESTIC).all():
+        return "Domestic travel — no visa required."
+    if (policies <= FREE_MOVEMENT).all():
+        if all(d.code in SCHENGEN_COUNTRIES for d in destinations):
+            return "Schengen area travel — no visa required. EU/EEA citizens have freedom of movement."
+        if code == "GB" or any(d.code == "GB" for d in destinations):
+            return "Common Travel Area — no visa required between the UK and Ireland."
+        return "EU travel — no visa required. Freedom of movement applies."
+    if (policies <= VISA_FREE).all():
+        if all(d.code in SCHENGEN_COUNTRIES for d in destinations if d.policy == POLICY_LABELS[VISA_FREE]):
+            place = "the Schengen area"
+        else:
+            place = ", ".join(d.country for d in destinations if d.policy == POLICY_LABELS[VISA_FREE])
+        return (
+            f"Visa-free travel to {place} for {citizenship} citizens. "
+            "Up to 90 days in any 180-day period. Valid passport required. "
+            "Check individual country requirements for longer stays."
+        )
+    dest_list = ", ".join(d.country for d in destinations if d.requires_visa)
+    return (
+        f"Visa may be required for {citizenship} citizens traveling to {dest_list}. "
+        "Please check with the relevant embassies or consulates. "
+        "Visit official government travel advisory websites for accurate requirements."
     )
@@ -1,21 +1,51 @@
 from __future__ import annotations
 
+import calendar
+
 import httpx
 from pydantic import BaseModel
 
+from src.tools.cache import TTLCache
+from src.tools.climatology import FIELDS, get_store, month_number
+from src.tools.geocoding import geocode
+from src.tools.singleflight import SingleFlight
+from src.tools.upstream import guard
+
 
 class WeatherRequest(BaseModel):
     location: str
     month: str
 
 
+class WeatherPoint(BaseModel):
+    location: str
+    lat: float
+    lon: float
+
+
+class RouteWeatherRequest(BaseModel):
+    month: str
+    stops: list[WeatherPoint]
+
+
 class WeatherResult(BaseModel):
     location: str
     month: str
     avg_temp_c: float
     precipitation_mm: float
     notes: str
+    rain_days: float | None = None
+    source: str = "mock"
+
 
+# Stops closer together than this share one lookup (~25km at mid latitudes)
+GRID_CELL_DEG = 0.25
+
+# Monthly normals barely move, so fetched cells are kept for half a year and
+# served stale (while refreshing in the background) after that
+WEATHER_CACHE_TTL = 180 * 24 * 3600
+_cache = TTLCache("weather", ttl=WEATHER_CACHE_TTL, max_entries=50_000)
+_flight = SingleFlight("open_meteo")
 
 MOCK_WEATHER = {
     ("copenhagen", "june"): WeatherResult(
@@ -37,16 +67,23 @@ MOCK_WEATHER = {
 
 def get_weather(request: WeatherRequest) -> WeatherResult:
     """
-    Get weather data using Open-Meteo API (free, no API key required).
-    Falls back to mock data if API is unavailable.
+    Get weather data from the local climatology grid when it covers the location,
+    otherwise from the Open-Meteo API (free, no API key required), cached per
+    grid cell and month.
+    Falls back to mock data if neither is available.
     """
     try:
         # First geocode the location
         coords = _geocode_location(request.location)
         if coords:
-            weather_data = _fetch_weather_data(coords, request.month)
+            weather_data = _lookup_climatology(coords, request.location, request.month)
             if weather_data:
                 return weather_data
+            month_num = month_number(request.month)
+            cell = _grid_cell(*coords)
+            normals, sources = _cell_normals({cell}, month_num) if month_num else ({}, {})
+            if cell in normals:
+                return _to_result(request.location, request.month, normals[cell], sources[cell])
     except Exception:
         pass
     
@@ -64,103 +101,201 @@ def get_weather(request: WeatherRequest) -> WeatherResult:
     )
 
 
+def get_route_weather(request: RouteWeatherRequest) -> list[WeatherResult | None]:
+    """
+    Resolve weather for every overnight stop along a route.
+    Stops are deduplicated by grid cell; cells the local climatology grid can't
+    answer are fetched from Open-Meteo in a single multi-location request.
+    Returns one entry per stop, None where no data could be found.
+    """
+    month_num = month_number(request.month)
+    if not month_num:
+        return [None] * len(request.stops)
+
+    cells = {_grid_cell(stop.lat, stop.lon) for stop in request.stops}
+    normals, sources = _cell_normals(cells, month_num)
+
+    results: list[WeatherResult | None] = []
+    for stop in request.stops:
+        cell = _grid_cell(stop.lat, stop.lon)
+        found = normals.get(cell)
+        results.append(_to_result(stop.location, request.month, found, sources[cell]) if found else None)
+    return results
+
+
+def _cell_normals(
+    cells: set[tuple[int, int]], month_num: int
+) -> tuple[dict[tuple[int, int], list], dict[tuple[int, int], str]]:
+    """
+    [avg temp, precipitation, rain days] per grid cell, and where each came from.
+    Local climatology first, then the long-TTL cache (stale entries are served
+    and refreshed in the background), then one batched Open-Meteo request for
+    the cells nobody has seen yet.
+    """
+    normals: dict[tuple[int, int], list] = {}
+    store = get_store()
+    if store is not None:
+        for cell in cells:
+            found = store.lookup(*_cell_center(cell), month_num)
+            if found:
+                normals[cell] = [found["avg_temp_c"], found["precipitation_mm"], found["rain_days"]]
+    sources = {cell: "climatology" for cell in normals}
+
+    missing, stale = [], []
+    for cell in cells:
+        if cell in normals:
+            continue
+        key = _cache_key(cell, month_num)
+        entry = _cache.get(key)
+        if entry is None:
+            # Cells that recently failed or had no data aren't retried until their negative TTL ends
+            if not _cache.get_negative(key):
+                missing.append(cell)
+            continue
+        normals[cell] = entry.value
+        if entry.stale:
+            stale.append(cell)
+
+    if missing:
+        try:
+            fetched = _fetch_cells(missing, month_num)
+        except Exception:
+            _cache.set_negative_many([_cache_key(cell, month_num) for cell in missing], "error")
+            fetched = {}
+        else:
+            _cache.set_negative_many(
+                [_cache_key(cell, month_num) for cell in missing if cell not in fetched], "not_found"
+            )
+        _cache.set_many({_cache_key(cell, month_num): value for cell, value in fetched.items()})
+        normals.update(fetched)
+
+    if stale:
+        by_key = {_cache_key(cell, month_num): cell for cell in stale}
+
+        def refetch(keys: list[str]) -> dict[str, list]:
+            fetched = _fetch_cells([by_key[key] for key in keys], month_num)
+            return {_cache_key(cell, month_num): value for cell, value in fetched.items()}
+
+        _cache.refresh(by_key, refetch)
+
+    sources.update((cell, "open_meteo") for cell in normals if cell not in sources)
+    return normals, sources
+
+
+def _fetch_cells(cells: list[tuple[int, int]], month_num: int) -> dict[tuple[int, int], list]:
+    month = calendar.month_name[month_num]
+    key = f"{month_num}:" + ",".join(f"{row}:{col}" for row, col in sorted(cells))
+    fetched = _flight.do(key, lambda: _fetch_weather_batch([_cell_center(cell) for cell in cells], month))
+    return {cell: [values[0], values[1], None] for cell, values in zip(cells, fetched) if values}
+
+
+def _cache_key(cell: tuple[int, int], month_num: int) -> str:
+    return f"{cell[0]}:{cell[1]}:{month_num}"
+
+
+def _to_result(location: str, month: str, normals: list, source: str) -> WeatherResult:
+    avg_temp, total_precip, rain_days = normals
+    return WeatherResult(
+        location=location.title(),
+        month=month.title(),
+        avg_temp_c=round(avg_temp, 1),
+        precipitation_mm=round(total_precip, 1),
+        rain_days=round(rain_days, 1) if rain_days is not None else None,
+        notes=_describe_weather(avg_temp, total_precip),
+        source=source,
+    )
+
+
+def _grid_cell(lat: float, lon: float) -> tuple[int, int]:
+    return (round(lat / GRID_CELL_DEG), round(lon / GRID_CELL_DEG))
+
+
+def _cell_center(cell: tuple[int, int]) -> tuple[float, float]:
+    return (cell[0] * GRID_CELL_DEG, cell[1] * GRID_CELL_DEG)
+
+
 def _geocode_location(location: str) -> tuple[float, float] | None:
-    """Geocode location using Nominatim API."""
-    try:
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            "q": location,
-            "format": "json",
-            "limit": 1
-        }
-        headers = {"User-Agent": "CyclingPlanner/1.0"}
-        
-        with httpx.Client(timeout=10.0) as client:
-            response = client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            results = response.json()
-            
-            if results:
-                return (float(results[0]["lat"]), float(results[0]["lon"]))
-    except Exception:
-        pass
-    return None
+    """Geocode location via the local gazetteer, falling back to Nominatim."""
+    return geocode(location)
 
 
-def _fetch_weather_data(coords: tuple[float, float], month: str) -> WeatherResult | None:
-    """Fetch historical weather data from Open-Meteo API."""
-    lat, lon = coords
-    
-    # Map month to a representative date (use 2023 as reference year)
-    month_to_num = {
-        "january": 1, "february": 2, "march": 3, "april": 4,
-        "may": 5, "june": 6, "july": 7, "august": 8,
-        "september": 9, "october": 10, "november": 11, "december": 12
-    }
-    
-    month_num = month_to_num.get(month.lower())
-    if not month_num:
+def _lookup_climatology(coords: tuple[float, float], location: str, month: str) -> WeatherResult | None:
+    """Answer from the memory-mapped climatology grid, without network access."""
+    store = get_store()
+    month_num = month_number(month)
+    if store is None or not month_num:
+        return None
+
+    normals = store.lookup(coords[0], coords[1], month_num)
+    if not normals:
         return None
+
+    return _to_result(location, month, [normals[field] for field in FIELDS], "climatology")
+
+
+def _describe_weather(avg_temp: float, total_precip: float) -> str:
+    """Create descriptive notes from monthly temperature and rainfall."""
+    notes = []
+    if avg_temp < 10:
+        notes.append("Cool temperatures")
+    elif avg_temp > 25:
+        notes.append("Warm temperatures")
+    else:
+        notes.append("Mild temperatures")
+
+    if total_precip > 100:
+        notes.append("wet season, bring rain gear")
+    elif total_precip < 30:
+        notes.append("dry season")
+    else:
+        notes.append("moderate rainfall")
+
+    return ", ".join(notes)
+
+
+def _fetch_weather_batch(
+    coords_list: list[tuple[float, float]], month: str
+) -> list[tuple[float, float] | None]:
+    """
+    Fetch (avg temp, monthly precipitation) for many locations in one Open-Meteo
+    archive request, using its comma-separated multi-location parameters.
+    Locations without data come back as None; a failed request raises.
+    """
+    results: list[tuple[float, float] | None] = [None] * len(coords_list)
+    month_num = month_number(month)
+    if not month_num or not coords_list:
+        return results
     
     # Use climate API for historical averages
     url = "https://archive-api.open-meteo.com/v1/archive"
     
-    # Get data for the month in 2023
+    # Get data for the month in 2023 (reference year)
+    last_day = calendar.monthrange(2023, month_num)[1]
     start_date = f"2023-{month_num:02d}-01"
-    if month_num == 12:
-        end_date = "2023-12-31"
-    else:
-        import calendar
-        last_day = calendar.monthrange(2023, month_num)[1]
-        end_date = f"2023-{month_num:02d}-{last_day:02d}"
+    end_date = f"2023-{month_num:02d}-{last_day:02d}"
     
     params = {
-        "latitude": lat,
-        "longitude": lon,
+        "latitude": ",".join(f"{lat:.4f}" for lat, _ in coords_list),
+        "longitude": ",".join(f"{lon:.4f}" for _, lon in coords_list),
         "start_date": start_date,
         "end_date": end_date,
         "daily": "temperature_2m_mean,precipitation_sum",
         "timezone": "auto"
     }
     
-    try:
-        with httpx.Client(timeout=30.0) as client:
-            response = client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            daily = data.get("daily", {})
-            temps = daily.get("temperature_2m_mean", [])
-            precip = daily.get("precipitation_sum", [])
+    with guard("open_meteo") as timeout, httpx.Client(timeout=timeout) as client:
+        response = client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        
+        # A single location comes back as an object, several as a list
+        locations = data if isinstance(data, list) else [data]
+        for i, location_data in enumerate(locations[:len(coords_list)]):
+            daily = location_data.get("daily", {})
+            temps = [t for t in daily.get("temperature_2m_mean", []) if t is not None]
+            precip = [p for p in daily.get("precipitation_sum", []) if p is not None]
             
             if temps and precip:
-                avg_temp = sum(temps) / len(temps)
-                total_precip = sum(precip)
-                
-                # Create descriptive notes
-                notes = []
-                if avg_temp < 10:
-                    notes.append("Cool temperatures")
-                elif avg_temp > 25:
-                    notes.append("Warm temperatures")
-                else:
-                    notes.append("Mild temperatures")
-                
-                if total_precip > 100:
-                    notes.append("wet season, bring rain gear")
-                elif total_precip < 30:
-                    notes.append("dry season")
-                else:
-                    notes.append("moderate rainfall")
-                
-                return WeatherResult(
-                    location=request.location.title(),
-                    month=request.month.title(),
-                    avg_temp_c=round(avg_temp, 1),
-                    precipitation_mm=round(total_precip, 1),
-                    notes=", ".join(notes)
-                )
-    except Exception:
-        pass
+                results[i] = (sum(temps) / len(temps), sum(precip))
     
-    return None
+    return results
@@ -1,6 +1,34 @@
+import json
 import os
 import sys
+import tempfile
+
+import pytest
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
+
+# Keep persisted caches out of the repo's data directory during tests
+os.environ.setdefault("CYCLING_PLANNER_CACHE_DIR", tempfile.mkdtemp(prefix="cycling-planner-cache-"))
+
+# Upstreams are mocked in tests, so don't pace calls to them
+os.environ.setdefault("UPSTREAM_LIMITS", json.dumps({
+    name: {"rate": 1000.0, "burst": 1000, "max_queue": 1000}
+    for name in ("nominatim", "overpass", "open_meteo", "openrouteservice", "open_elevation")
+}))
+
+
+@pytest.fixture(autouse=True)
+def _isolated_caches():
+    from src.tools.cache import clear_all_caches
+
+    from src.tools.hubs import clear_segment_stats, reset_hubs
+    from src.tools.upstream import reset_limiters
+
+    clear_all_caches(disk=True)
+    reset_limiters()
+    reset_hubs()
+    clear_segment_stats()
+    yield
+    clear_all_caches(disk=True)
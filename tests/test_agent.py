@@ -1,14 +1,19 @@
 from unittest.mock import patch, MagicMock, Mock
-from src.agent.orchestrator import ConversationMemory, handle_chat
+from src.agent.orchestrator import ConversationMemory, _Stop, _build_plan, _choose_stops, _extract_with_regex, _stays_along_route, handle_chat
 from src.agent.schemas import ChatRequest
+from src.tools.accommodation import CorridorStay
+from src.tools.routes import RouteResult, RouteWaypoint
+from src.tools import upstream
+from src.tools.upstream import deadline
 
 
 @patch('src.agent.orchestrator.os.environ.get')
+@patch('src.tools.geocoding.httpx.Client')
+@patch('src.tools.overpass.httpx.Client')
 @patch('src.tools.routes.httpx.Client')
-@patch('src.tools.accommodation.httpx.Client')
 @patch('src.tools.weather.httpx.Client')
 @patch('src.tools.elevation.httpx.Client')
-def test_handle_chat_builds_plan(mock_elev, mock_weather, mock_accom, mock_route, mock_env_get):
+def test_handle_chat_builds_plan(mock_elev, mock_weather, mock_route, mock_overpass, mock_geocode, mock_env_get):
     """Test chat handler builds plan with mocked API calls."""
     # Mock environment to return None for ANTHROPIC_API_KEY
     # This ensures Claude functions return None and fallback to regex
@@ -26,9 +31,10 @@ def test_handle_chat_builds_plan(mock_elev, mock_weather, mock_accom, mock_route
     mock_http.__exit__.return_value = None
     
     mock_route.return_value = mock_http
-    mock_accom.return_value = mock_http
     mock_weather.return_value = mock_http
     mock_elev.return_value = mock_http
+    mock_overpass.return_value = mock_http
+    mock_geocode.return_value = mock_http
     
     memory = ConversationMemory()
     request = ChatRequest(message="I want to cycle from Amsterdam to Copenhagen in June around 100km per day and a hostel every 4th night.")
@@ -36,3 +42,110 @@ def test_handle_chat_builds_plan(mock_elev, mock_weather, mock_accom, mock_route
     assert response.status == "ok"
     assert response.day_plan
     assert response.day_plan[0].end
+
+
+def test_stops_move_to_accommodation_near_daily_target():
+    """Test stop selection prefers real accommodation within the daily window."""
+    route = RouteResult(
+        origin="A",
+        destination="D",
+        total_distance_km=300.0,
+        estimated_days=3,
+        waypoints=[
+            RouteWaypoint(name="B", distance_from_start_km=90.0, lat=52.0, lon=6.0),
+            RouteWaypoint(name="C", distance_from_start_km=200.0, lat=52.0, lon=7.0),
+            RouteWaypoint(name="D", distance_from_start_km=300.0, lat=52.0, lon=8.0),
+        ],
+    )
+    stays = [
+        CorridorStay(name="Camp 90", type="camping", description="", lat=52.0, lon=6.0, along_km=90.0, offset_km=1.0),
+        CorridorStay(name="Hostel 210", type="hostel", description="", lat=52.0, lon=7.1, along_km=210.0, offset_km=0.5),
+        CorridorStay(name="Camp 150", type="camping", description="", lat=52.0, lon=6.5, along_km=150.0, offset_km=2.0),
+    ]
+    with patch("src.agent.orchestrator.find_accommodation_along_route", return_value=stays):
+        stops = _choose_stops(route, 100.0, "camping", hostel_every=2)
+
+    assert [round(s.distance_km) for s in stops] == [90, 210, 300]
+    assert [s.stay.name if s.stay else None for s in stops] == ["Camp 90", "Hostel 210", None]
+    assert [s.waypoint.name for s in stops] == ["B", "C", "D"]
+
+
+def test_stays_are_searched_along_the_routed_geometry():
+    """Test the accommodation corridor follows the road geometry, not straight lines between towns."""
+    route = RouteResult(
+        origin="A",
+        destination="C",
+        total_distance_km=120.0,
+        estimated_days=1,
+        waypoints=[
+            RouteWaypoint(name="A", distance_from_start_km=0.0, lat=52.0, lon=5.0),
+            RouteWaypoint(name="C", distance_from_start_km=120.0, lat=52.0, lon=6.0),
+        ],
+        geometry=[(52.0, 5.0, 0.0), (52.4, 5.5, 65.0), (52.0, 6.0, 120.0)],
+    )
+    with patch("src.agent.orchestrator.find_accommodation_along_route", return_value=[]) as corridor:
+        _stays_along_route(route, {"camping"})
+    request = corridor.call_args.args[0]
+    assert request.points == [(52.0, 5.0), (52.4, 5.5), (52.0, 6.0)]
+    assert request.distances_km == [0.0, 65.0, 120.0]
+
+    with patch("src.agent.orchestrator.find_accommodation_along_route", return_value=[]) as corridor:
+        _stays_along_route(route.model_copy(update={"geometry": []}), {"camping"})
+    assert corridor.call_args.args[0].points == [(52.0, 5.0), (52.0, 6.0)]
+
+
+def test_enrichment_is_dropped_when_budget_is_spent():
+    """Test POI lookups are skipped once the request deadline is nearly used up."""
+    route = RouteResult(
+        origin="A",
+        destination="B",
+        total_distance_km=80.0,
+        estimated_days=1,
+        waypoints=[RouteWaypoint(name="B", distance_from_start_km=80.0)],
+    )
+    stops = [_Stop(80.0, route.waypoints[0], "camping", None)]
+    weather = Mock(avg_temp_c=18.0, notes="mild", source="climatology")
+    elevation = Mock(total_elevation_gain_m=100.0, difficulty="easy", source="heuristic")
+
+    with patch("src.agent.orchestrator.get_points_of_interest") as pois, \
+         patch("src.agent.orchestrator.find_accommodation", return_value=[]), \
+         deadline(1.0):
+        plan = _build_plan(route, stops, weather, elevation)
+
+    pois.assert_not_called()
+    assert plan[0].notes is None
+    assert plan[0].accommodation == "No camping found near B, book ahead"
+
+
+@patch('src.agent.orchestrator.os.environ.get', return_value=None)
+@patch('src.tools.geocoding.httpx.Client', side_effect=AssertionError("network used"))
+@patch('src.tools.overpass.httpx.Client', side_effect=AssertionError("network used"))
+@patch('src.tools.routes.httpx.Client', side_effect=AssertionError("network used"))
+@patch('src.tools.weather.httpx.Client', side_effect=AssertionError("network used"))
+@patch('src.tools.elevation.httpx.Client', side_effect=AssertionError("network used"))
+def test_offline_mode_plans_without_network(*mocks):
+    """Test offline mode answers from local data and mocks and reports each field's source."""
+    upstream.set_offline(True)
+    try:
+        request = ChatRequest(message="Cycle from Amsterdam to Copenhagen in June, 100km per day.")
+        response = handle_chat(request, ConversationMemory())
+    finally:
+        upstream.set_offline(False)
+
+    assert response.status == "ok"
+    assert all(not mock.called for mock in mocks[:-1])
+    # Calls are refused before any rate-limit wait or circuit bookkeeping
+    assert upstream.get_limiter_stats() == {}
+    assert upstream.get_breaker_stats() == {}
+    sources = response.day_plan[0].sources
+    assert set(sources) == {"route", "accommodation", "weather", "elevation", "pois"}
+    assert sources["route"] in ("estimate", "mock")
+    assert "openrouteservice" not in sources.values()
+
+
+def test_regex_extracts_via_points():
+    """Test via-points are pulled out of the message without leaking into origin or destination."""
+    extracted = _extract_with_regex("Cycle from Amsterdam to Copenhagen via Groningen and Hamburg in June.", None)
+    assert (extracted["origin"], extracted["destination"]) == ("Amsterdam", "Copenhagen")
+    assert extracted["via"] == ["Groningen", "Hamburg"]
+    assert _extract_with_regex("From Amsterdam via Bremen to Copenhagen.", None)["origin"] == "Amsterdam"
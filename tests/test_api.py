@@ -0,0 +1,16 @@
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.tools import upstream
+
+
+def test_health_reports_offline_mode():
+    """Test /health answers and reflects the offline switch."""
+    client = TestClient(app)
+    assert client.get("/health").json() == {"status": "ok", "offline": False}
+
+    upstream.set_offline(True)
+    try:
+        assert client.get("/health").json()["offline"] is True
+    finally:
+        upstream.set_offline(False)
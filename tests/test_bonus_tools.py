@@ -1,11 +1,20 @@
+import time
+
 import pytest
 from unittest.mock import patch, MagicMock
 from src.tools.poi import get_points_of_interest, POIRequest
-from src.tools.visa import check_visa_requirements, VisaRequest
-from src.tools.budget import estimate_budget, BudgetRequest
+from src.tools.visa import VisaBatchRequest, VisaRequest, check_visa_requirements, check_visa_requirements_batch
+from src.tools.budget import (
+    BudgetDay,
+    BudgetRequest,
+    ItineraryBudgetRequest,
+    estimate_budget,
+    estimate_budgets,
+    estimate_itinerary_budget,
+)
 
 
-@patch('src.tools.poi.httpx.Client')
+@patch('src.tools.overpass.httpx.Client')
 def test_poi_returns_results(mock_client):
     """Test POI returns results with mocked API calls."""
     mock_response = MagicMock()
@@ -50,6 +59,33 @@ def test_visa_unknown_country():
     assert "check" in result.notes.lower()
 
 
+def test_visa_aliases_resolve_to_one_country():
+    """Test aliases, demonyms and codes land on the same policy and per-destination detail."""
+    for citizenship in ("UK", "Britain", "United Kingdom", "british", "GB"):
+        result = check_visa_requirements(VisaRequest(citizenship=citizenship, destinations=["Czech Republic", "Mars"]))
+        assert result.requires_visa is True
+        assert [(d.country, d.code, d.policy) for d in result.destinations] == [
+            ("Czechia", "CZ", "visa_free_90_days"),
+            ("Mars", None, "check"),
+        ]
+        assert "traveling to Mars" in result.notes
+
+    domestic = check_visa_requirements(VisaRequest(citizenship="Holland", destinations=["the Netherlands"]))
+    assert domestic.notes == "Domestic travel — no visa required."
+
+
+def test_visa_batch_matches_single_checks():
+    """Test batch lookups over travellers x itineraries agree with one-at-a-time checks."""
+    travellers = ["Netherlands", "USA", "Japan", "Unknown", "Ireland"]
+    itineraries = [["Germany", "Denmark"], ["France", "United Kingdom"], ["Ireland"], [], ["Norway", "Mars"]]
+    batch = check_visa_requirements_batch(VisaBatchRequest(citizenships=travellers, itineraries=itineraries))
+    assert batch.requires_visa == [
+        [check_visa_requirements(VisaRequest(citizenship=t, destinations=i)).requires_visa for i in itineraries]
+        for t in travellers
+    ]
+    assert batch.requires_visa[0] == [False, True, False, False, True]
+
+
 def test_budget_estimation():
     """Test budget estimation with accommodation mix."""
     req = BudgetRequest(
@@ -81,3 +117,91 @@ def test_budget_norway_expensive():
     result_spain = estimate_budget(req_spain)
     
     assert result_norway.estimated_total_eur > result_spain.estimated_total_eur
+
+
+def test_itinerary_budget_prices_each_day_in_its_country():
+    """Test per-day pricing matches the single-country estimate and splits spend by country."""
+    single = estimate_budget(BudgetRequest(days=3, accommodation_mix={"camping": 1.0}, country="Germany"))
+    same = estimate_itinerary_budget(ItineraryBudgetRequest(itinerary=[
+        BudgetDay(country="Germany", accommodation="camping"),
+        BudgetDay(country="Germany", accommodation="camping"),
+        BudgetDay(country="Germany"),
+    ]))
+    assert same.estimated_total_eur == single.estimated_total_eur
+
+    crossing = estimate_itinerary_budget(ItineraryBudgetRequest(itinerary=[
+        BudgetDay(country="Netherlands", accommodation="hostel"),
+        BudgetDay(country="Germany", accommodation="camping"),
+        BudgetDay(country="Denmark", accommodation="hotel"),
+        BudgetDay(country="Denmark"),
+    ]))
+    # 50 hostel + 20 camping + 120 hotel; food 35 + 30 + 45 + 45; misc 15 + 15 + 20 + 20; 4 x 2 upkeep
+    assert crossing.breakdown["accommodation"]["total"] == 190
+    assert crossing.breakdown["food"] == 155
+    assert crossing.estimated_total_eur == 190 + 155 + 70 + 8
+    assert crossing.breakdown["by_country"] == {"netherlands": 102, "germany": 67, "denmark": 254}
+
+
+def _catalogue(size: int) -> list[ItineraryBudgetRequest]:
+    countries = ["Netherlands", "Germany", "Denmark", "Norway", None]
+    stays = ["camping", "hostel", "hotel", None]
+    return [
+        ItineraryBudgetRequest(itinerary=[
+            BudgetDay(country=countries[(i + d) % 5], accommodation=stays[(i * d) % 4]) for d in range(1 + i % 14)
+        ])
+        for i in range(size)
+    ]
+
+
+def test_batch_budgets_match_single_pricing():
+    """Test batch pricing agrees with one-at-a-time pricing across a catalogue."""
+    catalogue = _catalogue(5000)
+    results = estimate_budgets(catalogue)
+    assert len(results) == 5000
+    for i in (0, 17, 4999):
+        assert results[i] == estimate_itinerary_budget(catalogue[i])
+
+
+@pytest.mark.benchmark
+def test_batch_budgets_price_a_catalogue_quickly():
+    """Benchmark: 5000 itineraries price in about 80ms; the bound is far above that."""
+    catalogue = _catalogue(5000)
+    started = time.perf_counter()
+    estimate_budgets(catalogue)
+    assert time.perf_counter() - started < 2.0
+
+
+def test_simulated_budget_range_brackets_the_estimate():
+    """Test the Monte Carlo range is ordered, reproducible and per-category."""
+    request = ItineraryBudgetRequest(
+        simulate=True,
+        itinerary=[
+            BudgetDay(country="Netherlands", accommodation="hostel"),
+            BudgetDay(country="Germany", accommodation="camping"),
+            BudgetDay(country="Germany", accommodation="hotel"),
+            BudgetDay(country="Denmark"),
+        ],
+    )
+    result = estimate_itinerary_budget(request)
+    spread = result.estimate_range
+    assert spread.trials == 100_000
+    assert spread.p10 < spread.p50 < spread.p90
+    assert spread.p10 < result.estimated_total_eur < spread.p90
+    assert set(spread.by_category) == {"accommodation", "food", "miscellaneous"}
+    assert estimate_itinerary_budget(request).estimate_range == spread
+
+    plain = estimate_budget(BudgetRequest(days=5, accommodation_mix={"camping": 1.0}, country="Norway"))
+    assert plain.estimate_range is None
+
+
+@pytest.mark.benchmark
+def test_simulated_budget_range_is_fast():
+    """Benchmark: 100k trials take about 25ms; the bound is far above that."""
+    request = ItineraryBudgetRequest(
+        simulate=True,
+        itinerary=[BudgetDay(country="Germany", accommodation="camping")] * 14,
+    )
+    estimate_itinerary_budget(request)
+    started = time.perf_counter()
+    estimate_itinerary_budget(request)
+    assert time.perf_counter() - started < 0.5
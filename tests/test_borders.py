@@ -0,0 +1,86 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from src.agent.orchestrator import ConversationMemory, handle_chat
+from src.agent.schemas import ChatRequest
+from src.tools import upstream
+from src.tools.borders import BorderIndex, countries_crossed, fill_gaps, get_borders
+from src.tools.gazetteer import get_gazetteer
+
+
+def test_bundled_boundaries_place_every_settlement_in_its_country():
+    """Test the bundled boundaries agree with the gazetteer's country codes."""
+    borders = get_borders()
+    gazetteer = get_gazetteer()
+    codes = borders.countries_at(gazetteer.lats, gazetteer.lons)
+    mismatched = [name for name, code, want in zip(gazetteer.names, codes, gazetteer.countries) if code != want]
+    assert mismatched == []
+    # Open sea
+    assert borders.countries_at([55.0], [4.0]) == [None]
+
+
+def test_holes_and_batch_lookup(tmp_path):
+    """Test even-odd handling of holes and a vectorised batch that agrees with single lookups."""
+    square = [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]]
+    hole = [[1, 1], [3, 1], [3, 3], [1, 3], [1, 1]]
+    path = tmp_path / "borders.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"ISO_A2": "AA", "NAME": "Outer"},
+         "geometry": {"type": "Polygon", "coordinates": [square, hole]}},
+        {"type": "Feature", "properties": {"ISO_A2": "BB", "NAME": "Inner"},
+         "geometry": {"type": "Polygon", "coordinates": [[[1.5, 1.5], [2.5, 1.5], [2.5, 2.5], [1.5, 2.5], [1.5, 1.5]]]}},
+    ]}))
+    borders = BorderIndex.from_geojson(path)
+    assert borders.countries_at([0.5, 1.2, 2.0, 5.0], [0.5, 1.2, 2.0, 5.0]) == ["AA", None, "BB", None]
+    assert borders.name("BB") == "Inner"
+
+    rng = np.random.default_rng(0)
+    lats, lons = rng.uniform(36, 71, 100_000), rng.uniform(-10, 31, 100_000)
+    bundled = get_borders()
+    found = bundled.locate(lats, lons)
+    # Spot-check the batch against one-at-a-time lookups
+    for i in rng.integers(0, len(lats), 50):
+        assert bundled.locate(lats[i], lons[i])[0] == found[i]
+
+
+@pytest.mark.benchmark
+def test_batch_of_100k_points_is_fast():
+    """Benchmark: 100k points resolve in about 50ms; the bound is far above that."""
+    rng = np.random.default_rng(0)
+    lats, lons = rng.uniform(36, 71, 100_000), rng.uniform(-10, 31, 100_000)
+    borders = get_borders()
+    started = time.perf_counter()
+    borders.locate(lats, lons)
+    assert time.perf_counter() - started < 2.0
+
+
+def test_crossed_countries_skip_gaps():
+    """Test the crossing order ignores sea gaps and repeated codes."""
+    codes = [None, "NL", "NL", None, "DE", "DE", None, "DK"]
+    assert countries_crossed(codes) == ["NL", "DE", "DK"]
+    assert fill_gaps(codes) == ["NL", "NL", "NL", "NL", "DE", "DE", "DE", "DK"]
+
+
+def test_plan_attributes_days_to_countries_and_checks_visa():
+    """Test a cross-border plan gets per-day countries, the crossing order, a visa check and a budget."""
+    upstream.set_offline(True)
+    try:
+        response = handle_chat(
+            ChatRequest(
+                message="Cycle from Amsterdam to Copenhagen in June, 100km per day.",
+                preferences={"citizenship": "USA"},
+            ),
+            ConversationMemory(),
+        )
+    finally:
+        upstream.set_offline(False)
+
+    assert response.countries == ["Netherlands", "Germany", "Denmark"]
+    days = [day.country for day in response.day_plan]
+    assert days[-1] == "Denmark"
+    assert set(days) <= set(response.countries)
+    assert response.visa.requires_visa is False
+    assert response.budget.estimated_total_eur > 0
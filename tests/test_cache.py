@@ -0,0 +1,218 @@
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from src.agent.tool_registry import CachePolicy, get_available_tools, memoize
+from src.tools.accommodation import AccommodationRequest
+from src.tools.cache import TTLCache
+from src.tools.routes import RouteRequest, RouteResult
+from src.tools.visa import VisaRequest, VisaResult
+from src.tools.weather import get_weather, WeatherRequest, WeatherResult
+
+
+def test_cache_serves_stale_and_refreshes_in_background():
+    """Test stale entries are returned immediately while a refresh runs."""
+    cache = TTLCache("test-swr", ttl=60, persist=False)
+    cache.set("k", "old")
+    cache._entries["k"] = ("old", time.time() - 120)
+
+    loader = MagicMock(return_value="new")
+    assert cache.get_or_load("k", loader) == "old"
+
+    for _ in range(100):
+        if cache.get("k").value == "new":
+            break
+        time.sleep(0.01)
+    assert cache.get("k").value == "new"
+    loader.assert_called_once()
+
+
+def test_cache_is_bounded_and_persisted(tmp_path):
+    """Test LRU eviction and reload from the disk tier."""
+    with patch("src.tools.cache.CACHE_DIR", tmp_path):
+        cache = TTLCache("test-disk", ttl=60, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+
+        reloaded = TTLCache("test-disk", ttl=60, max_entries=2)
+    assert reloaded.get("a").value == 1
+    assert reloaded.get("c").value == 3
+
+
+
+def test_snapshot_writes_are_batched_and_safe_across_threads(tmp_path, monkeypatch):
+    """Test many concurrent stores produce one snapshot write with every entry and no temp leftovers."""
+    monkeypatch.setattr("src.tools.cache.SNAPSHOT_DELAY_S", 60)
+    with patch("src.tools.cache.CACHE_DIR", tmp_path):
+        cache = TTLCache("test-batched", ttl=60)
+        with patch.object(cache, "_save", wraps=cache._save) as save:
+            threads = [
+                threading.Thread(target=lambda i=i: [cache.set(f"k{i}-{j}", j) for j in range(50)])
+                for i in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert save.call_count == 0
+            cache.flush()
+            assert save.call_count == 1
+
+        reloaded = TTLCache("test-batched", ttl=60)
+    assert len(reloaded) == 400
+    assert [f.name for f in tmp_path.iterdir()] == ["test-batched.json"]
+
+
+def test_per_key_entries_survive_concurrent_writers(tmp_path):
+    """Test threads rewriting the same keys never leave a torn or temp file behind."""
+    with patch("src.tools.cache.CACHE_DIR", tmp_path):
+        cache = TTLCache("test-entries", ttl=60, disk_entries=100)
+        threads = [
+            threading.Thread(target=lambda i=i: [cache.set(f"k{j}", [i] * 1000) for j in range(10)])
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        restarted = TTLCache("test-entries", ttl=60, disk_entries=100)
+        for j in range(10):
+            value = restarted.get(f"k{j}").value
+            assert len(value) == 1000 and len(set(value)) == 1
+    assert all(f.suffix == ".json" for f in (tmp_path / "test-entries").iterdir())
+
+@patch('src.tools.weather.httpx.Client')
+def test_weather_cache_shared_within_grid_cell(mock_client):
+    """Test two towns in the same grid cell share one upstream fetch."""
+    mock_response = MagicMock()
+    mock_response.json.return_value = {
+        "daily": {"temperature_2m_mean": [16.0, 18.0], "precipitation_sum": [3.0, 5.0]}
+    }
+    mock_response.raise_for_status = MagicMock()
+
+    mock_http = MagicMock()
+    mock_http.get.return_value = mock_response
+    mock_http.__enter__.return_value = mock_http
+    mock_http.__exit__.return_value = None
+    mock_client.return_value = mock_http
+
+    coords = {"Utrecht": (52.09, 5.12), "Nieuwegein": (52.03, 5.08)}
+    with patch("src.tools.weather._geocode_location", side_effect=coords.get):
+        first = get_weather(WeatherRequest(location="Utrecht", month="July"))
+        second = get_weather(WeatherRequest(location="Nieuwegein", month="July"))
+
+    assert mock_http.get.call_count == 1
+    assert first.avg_temp_c == second.avg_temp_c == 17.0
+    assert second.location == "Nieuwegein"
+
+
+def test_negative_entries_expire_separately():
+    cache = TTLCache("test_negative", ttl=3600, persist=False, negative_ttls={"not_found": 0.05})
+    calls = []
+
+    def missing():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_load("Waypoint 3", missing) is None
+    assert cache.get_or_load("Waypoint 3", missing) is None
+    assert len(calls) == 1
+    assert cache.get("Waypoint 3") is None
+    assert cache.stats["negative_not_found"] == 1
+    assert cache.stats["negative_hits"] == 1
+
+    time.sleep(0.06)
+    cache.get_or_load("Waypoint 3", missing)
+    assert len(calls) == 2
+
+    def failing():
+        raise TimeoutError("upstream down")
+
+    with pytest.raises(TimeoutError):
+        cache.get_or_load("Bergen", failing)
+    assert cache.get_negative("Bergen") == "error"
+    cache.set("Bergen", [60.39, 5.32])
+    assert cache.get_negative("Bergen") is None
+
+
+def test_registry_memoizes_by_canonical_request():
+    """Test registry tools answer repeated requests from their cache with fresh copies."""
+    visa = get_available_tools()["check_visa_requirements"]
+    first = visa(VisaRequest(citizenship="US", destinations=["France"]))
+    second = visa({"destinations": ["France"], "citizenship": "US"})
+    assert first == second and first is not second
+    assert isinstance(second, VisaResult)
+    assert visa.cache.stats["hits"] == 1
+    assert visa.cache.ttl == float("inf")
+
+
+def test_memoized_tool_skips_fallbacks_and_warms_from_disk(tmp_path):
+    """Test fallback results aren't stored and stored ones survive a restart via the disk tier."""
+    sources = iter(["mock", "open-meteo"])
+    calls = []
+
+    def weather(request: WeatherRequest) -> WeatherResult:
+        calls.append(request)
+        return WeatherResult(
+            location=request.location, month=request.month, avg_temp_c=14.0,
+            precipitation_mm=70.0, notes="", source=next(sources),
+        )
+
+    policy = CachePolicy(ttl=3600, max_entries=10, disk_entries=100)
+    request = WeatherRequest(location="Oslo", month="June")
+    with patch("src.tools.cache.CACHE_DIR", tmp_path):
+        cached = memoize("test_weather", weather, policy)
+        assert cached(request).source == "mock"
+        assert cached(request).source == "open-meteo"
+        assert cached(request).source == "open-meteo"
+        assert len(calls) == 2
+
+        restarted = memoize("test_weather", weather, policy)
+        assert restarted(request).avg_temp_c == 14.0
+    assert len(calls) == 2
+    assert restarted.cache.stats["disk_hits"] == 1
+
+
+def test_partly_estimated_routes_are_not_memoized():
+    """Test a route with any estimated leg is recomputed, and a fully routed one is kept."""
+    get_route = get_available_tools()["get_route"]
+    request = RouteRequest(origin="Amsterdam", destination="Hamburg")
+
+    def stitched(source):
+        return RouteResult(
+            origin="Amsterdam", destination="Hamburg", total_distance_km=460.0,
+            estimated_days=5, waypoints=[], source=source,
+        )
+
+    with patch("src.tools.routes._route_legs"), \
+         patch("src.tools.routes._stitch", return_value=stitched("openrouteservice+estimate")) as stitch:
+        get_route(request)
+        get_route(request)
+        assert stitch.call_count == 2
+        assert len(get_route.cache) == 0
+
+        stitch.return_value = stitched("openrouteservice+local_router")
+        get_route(request)
+        assert get_route(request).source == "openrouteservice+local_router"
+        assert stitch.call_count == 3
+
+
+@patch('src.tools.overpass.httpx.Client')
+def test_failed_accommodation_lookup_is_not_memoized(mock_client):
+    """Test the empty list an Overpass outage yields isn't stored as a result for hours."""
+    mock_http = MagicMock()
+    mock_http.post.side_effect = RuntimeError("overpass down")
+    mock_http.__enter__.return_value = mock_http
+    mock_http.__exit__.return_value = None
+    mock_client.return_value = mock_http
+
+    find_accommodation = get_available_tools()["find_accommodation"]
+    request = AccommodationRequest(location="Zwolle", preference="hostel")
+    assert find_accommodation(request) == []
+    assert mock_http.post.called
+    assert len(find_accommodation.cache) == 0
+    assert find_accommodation.cache.stats["misses"] == 1
@@ -0,0 +1,59 @@
+import numpy as np
+from unittest.mock import patch
+from src.tools import climatology
+from src.tools.climatology import ClimatologyStore, month_number
+from src.tools.weather import get_weather, WeatherRequest
+
+
+def _make_store() -> ClimatologyStore:
+    values = np.zeros((12, 3, 3, 3), dtype=np.float32)
+    values[5, 0] = [[10, 12, 14], [16, 18, 20], [22, 24, 26]]  # June temps rise northwards
+    values[5, 1] = 60.0
+    values[5, 2] = 9.0
+    return ClimatologyStore(values, south=50.0, west=4.0, step=1.0)
+
+
+def test_store_interpolates_between_grid_points():
+    """Test bilinear interpolation inside a cell."""
+    store = _make_store()
+    normals = store.lookup(50.5, 4.5, 6)
+    assert normals["avg_temp_c"] == 14.0
+    assert normals["precipitation_mm"] == 60.0
+    assert store.lookup(40.0, 4.5, 6) is None
+
+
+def test_store_round_trips_through_memory_mapped_file(tmp_path):
+    """Test saving and memory-mapping the binary grid."""
+    path = tmp_path / "climatology.npy"
+    _make_store().save(path)
+    loaded = ClimatologyStore.load(path)
+    assert isinstance(loaded.values, np.memmap)
+    assert loaded.lookup(52.0, 6.0, 6)["avg_temp_c"] == 26.0
+
+
+def test_missing_grid_points_are_ignored():
+    """Test NaN grid points (e.g. over sea) don't poison the interpolation."""
+    store = _make_store()
+    store.values[5, 0, 0, 0] = np.nan
+    assert store.lookup(50.0, 4.0, 6) is None
+    assert store.lookup(50.0, 4.5, 6)["avg_temp_c"] == 12.0
+
+
+def test_weather_uses_local_climatology():
+    """Test get_weather answers from the grid without calling Open-Meteo."""
+    climatology.set_store(_make_store())
+    try:
+        with patch("src.tools.weather._geocode_location", return_value=(51.0, 5.0)), \
+             patch("src.tools.weather._fetch_weather_batch") as fetch:
+            result = get_weather(WeatherRequest(location="Eindhoven", month="June"))
+        fetch.assert_not_called()
+        assert result.avg_temp_c == 18.0
+        assert result.rain_days == 9.0
+    finally:
+        climatology.set_store(None)
+
+
+def test_month_number():
+    assert month_number("June") == 6
+    assert month_number(" december ") == 12
+    assert month_number("Smarch") is None
@@ -0,0 +1,188 @@
+import os
+import time
+import numpy as np
+import pytest
+from unittest.mock import patch, MagicMock
+from src.tools.corridor import densify, project_onto_polyline
+from src.tools.hubs import clear_segment_stats, get_segment_stats
+from src.tools.spatial import haversine_km
+from src.tools import routes
+from src.tools.routes import get_route, RouteRequest
+
+
+def _encode_polyline(points, elevation=None):
+    def encode_value(value):
+        value = ~(value << 1) if value < 0 else value << 1
+        chunks = ""
+        while value >= 0x20:
+            chunks += chr((0x20 | (value & 0x1F)) + 63)
+            value >>= 5
+        return chunks + chr(value + 63)
+
+    out, prev = "", [0, 0, 0]
+    for lat, lon in points:
+        current = [round(lat * 1e5), round(lon * 1e5), round((elevation or 0) * 100)]
+        dims = 3 if elevation is not None else 2
+        for d in range(dims):
+            out += encode_value(current[d] - prev[d])
+        prev = current
+    return out
+
+
+def _wiggly_route_and_candidates(rng):
+    t = np.linspace(0, 1, 10_000)
+    route_lats = 52.4 + 3.3 * t + 0.2 * np.sin(t * 20)
+    route_lons = 4.9 + 7.7 * t
+    return route_lats, route_lons, rng.uniform(50, 57, 10_000), rng.uniform(3, 14, 10_000)
+
+
+def test_projection_matches_brute_force_and_is_ordered():
+    """Test corridor hits equal an exhaustive nearest-distance scan."""
+    rng = np.random.default_rng(3)
+    route_lats, route_lons, cand_lats, cand_lons = _wiggly_route_and_candidates(rng)
+    matches = project_onto_polyline(route_lats, route_lons, cand_lats, cand_lons, corridor_km=5)
+
+    sample = rng.choice(len(cand_lats), 1000, replace=False)
+    brute = haversine_km(cand_lats[sample, None], cand_lons[sample, None], route_lats[None, :], route_lons[None, :])
+    assert set(matches.ids) & set(sample) == set(sample[brute.min(axis=1) <= 4.99])
+    assert np.all(np.diff(matches.along_km) >= 0)
+
+
+@pytest.mark.benchmark
+def test_projection_of_10k_candidates_onto_10k_vertices_is_fast():
+    """Benchmark: 10k candidates against a 10k-vertex route, bounded far above the usual run time."""
+    route_lats, route_lons, cand_lats, cand_lons = _wiggly_route_and_candidates(np.random.default_rng(3))
+    start = time.perf_counter()
+    project_onto_polyline(route_lats, route_lons, cand_lats, cand_lons, corridor_km=5)
+    assert time.perf_counter() - start < 5.0
+
+
+def test_densify_caps_segment_length():
+    lats, lons = densify([52.0, 53.0], [5.0, 5.0], max_step_km=10)
+    assert len(lats) == 13
+    assert haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:]).max() <= 10
+
+
+@patch.dict(os.environ, {"OPENROUTESERVICE_API_KEY": "test-key"})
+@patch('src.tools.routes.httpx.Client')
+def test_ors_route_uses_towns_along_geometry(mock_client):
+    """Test ORS street-name steps are replaced by towns snapped onto the polyline."""
+    geometry = [(52.374, 4.890), (52.371, 5.222), (52.518, 5.471), (52.517, 6.083), (52.696, 6.194)]
+    mock_response = MagicMock()
+    mock_response.json.return_value = {"routes": [{
+        "summary": {"distance": 125_000},
+        "geometry": _encode_polyline(geometry, elevation=0),
+        "segments": [{"steps": [{"distance": 125_000, "name": "N302"}]}],
+    }]}
+    mock_response.raise_for_status = MagicMock()
+
+    mock_http = MagicMock()
+    mock_http.post.return_value = mock_response
+    mock_http.__enter__.return_value = mock_http
+    mock_http.__exit__.return_value = None
+    mock_client.return_value = mock_http
+
+    route = get_route(RouteRequest(origin="Amsterdam", destination="Meppel"))
+    names = [w.name for w in route.waypoints]
+    assert names[:3] == ["Almere", "Lelystad", "Zwolle"]
+    assert names[-1] == "Meppel"
+    assert "N302" not in names
+
+
+def _straight_line_ors(posted):
+    """An ORS stand-in that routes every leg along the straight line, 10% longer."""
+    def post(url, json, headers):
+        (lon1, lat1), (lon2, lat2) = json["coordinates"]
+        posted.append((lon1, lat1, lon2, lat2))
+        line = [(lat1 + (lat2 - lat1) * t, lon1 + (lon2 - lon1) * t) for t in np.linspace(0, 1, 20)]
+        response = MagicMock()
+        response.json.return_value = {"routes": [{
+            "summary": {"distance": float(haversine_km(lat1, lon1, lat2, lon2)) * 1100},
+            "geometry": _encode_polyline(line, elevation=0),
+        }]}
+        return response
+
+    mock_http = MagicMock()
+    mock_http.post.side_effect = post
+    mock_http.__enter__.return_value = mock_http
+    mock_http.__exit__.return_value = None
+    return mock_http
+
+
+@patch.dict(os.environ, {"OPENROUTESERVICE_API_KEY": "test-key"})
+@patch('src.tools.routes.httpx.Client')
+def test_via_points_route_legs_separately_and_reuse_them(mock_client):
+    """Test via-points become legs that are cached one by one and stitched in order."""
+    posted = []
+    mock_client.return_value = _straight_line_ors(posted)
+
+    route = get_route(RouteRequest(origin="Amsterdam", destination="Hamburg", via=["Groningen"]))
+    names = [w.name for w in route.waypoints]
+    assert names.index("Groningen") < names.index("Hamburg") == len(names) - 1
+    km = [point[2] for point in route.geometry]
+    assert km == sorted(km) and abs(km[-1] - route.total_distance_km) < 0.1
+    assert route.source == "openrouteservice"
+
+    # Extending the tour only routes the new legs
+    first_calls = len(posted)
+    longer = get_route(RouteRequest(origin="Amsterdam", destination="Copenhagen", via=["Groningen", "Hamburg"]))
+    assert len(posted) > first_calls
+    assert len(set(posted)) == len(posted)
+    assert longer.total_distance_km > route.total_distance_km
+    assert [w.name for w in longer.waypoints][:len(names)] == names
+
+    # Very long stretches are cut into several legs
+    posted.clear()
+    get_route(RouteRequest(origin="Amsterdam", destination="Stockholm"))
+    assert len(posted) >= 3
+
+
+@patch.dict(os.environ, {"OPENROUTESERVICE_API_KEY": "test-key"})
+@patch('src.tools.routes.httpx.Client')
+def test_stale_legs_are_served_and_rerouted_in_background(mock_client):
+    """Test expired legs answer straight from the cache while ORS reroutes them behind it."""
+    posted = []
+    mock_client.return_value = _straight_line_ors(posted)
+    request = RouteRequest(origin="Amsterdam", destination="Groningen")
+    first = get_route(request)
+    routed = len(posted)
+    assert routed >= 1
+
+    expired = time.time() - routes.ROUTE_LEG_CACHE_TTL - 60
+    for key, (value, _) in list(routes._cache._entries.items()):
+        routes._cache._entries[key] = (value, expired)
+
+    second = get_route(request)
+    assert second.total_distance_km == first.total_distance_km
+    for _ in range(200):
+        entries = list(routes._cache._entries.values())
+        if len(posted) == 2 * routed and all(stored_at > expired for _, stored_at in entries):
+            break
+        time.sleep(0.01)
+    assert len(posted) == 2 * routed
+    assert all(not routes._cache.get(key).stale for key in list(routes._cache._entries))
+
+@patch.dict(os.environ, {"OPENROUTESERVICE_API_KEY": "test-key"})
+@patch('src.tools.routes.httpx.Client')
+def test_overlapping_trips_share_hub_legs(mock_client):
+    """Test catalog-style trips reuse hub-to-hub legs and only route their own ends."""
+    clear_segment_stats()
+    posted = []
+    mock_client.return_value = _straight_line_ors(posted)
+
+    first = get_route(RouteRequest(origin="Amsterdam", destination="Copenhagen"))
+    cold = len(posted)
+    assert cold >= 3
+    assert get_segment_stats()["hit_ratio"] == 0.0
+
+    # Starting next door reuses the whole linked chain of hub legs
+    clear_segment_stats()
+    posted.clear()
+    second = get_route(RouteRequest(origin="Haarlem", destination="Copenhagen"))
+    assert len(posted) <= 2
+    assert abs(second.total_distance_km - first.total_distance_km) < 60
+
+    stats = get_segment_stats()
+    assert stats["hub_hits"] >= 2
+    assert 0 < stats["hit_ratio"] < 1
+    assert stats["km_hit_ratio"] > 0.8
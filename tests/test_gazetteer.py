@@ -0,0 +1,86 @@
+import time
+
+import pytest
+from unittest.mock import patch
+from src.tools.gazetteer import Gazetteer, get_gazetteer, normalize_name
+from src.tools.geocoding import geocode
+
+
+def _small_gazetteer() -> Gazetteer:
+    return Gazetteer(
+        names=["Frankfurt am Main", "Frankfurt (Oder)", "Lübeck", "Lund"],
+        countries=["DE", "DE", "DE", "SE"],
+        lats=[50.11, 52.35, 53.87, 55.70],
+        lons=[8.68, 14.55, 10.69, 13.19],
+        populations=[753000, 57000, 217000, 94000],
+        alternate_names=[["Frankfurt"], ["Frankfurt an der Oder"], ["Luebeck"], []],
+    )
+
+
+def test_normalize_name_folds_diacritics_and_punctuation():
+    assert normalize_name("Lübeck") == normalize_name("LUBECK") == "lubeck"
+    assert normalize_name("København") == "kobenhavn"
+    assert normalize_name("Halle (Saale)") == "halle saale"
+
+
+def test_lookup_ranks_ambiguous_names_by_population():
+    """Test exact matches on a shared name come back most populous first."""
+    matches = _small_gazetteer().lookup("frankfurt")
+    assert [m.name for m in matches] == ["Frankfurt am Main"]
+    prefix = _small_gazetteer().lookup("Frankfurt (O")
+    assert prefix[0].name == "Frankfurt (Oder)"
+
+
+def test_resolve_handles_alternate_names_and_country_qualifier():
+    gazetteer = _small_gazetteer()
+    assert gazetteer.resolve("Luebeck").name == "Lübeck"
+    assert gazetteer.resolve("Lund, Sweden").country == "SE"
+    assert gazetteer.resolve("Lu") is None
+    assert gazetteer.resolve("Waypoint 3") is None
+
+
+def test_bundled_gazetteer_resolves_without_network():
+    """Test the bundled extract answers common names without touching Nominatim."""
+    gazetteer = get_gazetteer()
+    assert gazetteer.resolve("Kobenhavn").name == "Copenhagen"
+
+    with patch("src.tools.geocoding.httpx.Client") as mock_client:
+        lat, lon = geocode("Hamburg")
+    mock_client.assert_not_called()
+    assert round(lat) == 54 and round(lon) == 10
+
+
+@pytest.mark.benchmark
+def test_exact_lookups_are_fast():
+    """Benchmark: exact lookups take microseconds; the bound is far above that."""
+    gazetteer = get_gazetteer()
+    start = time.perf_counter()
+    for _ in range(1000):
+        gazetteer.resolve("Groningen")
+    assert (time.perf_counter() - start) / 1000 < 0.01
+
+
+def test_fuzzy_lookup_corrects_misspellings():
+    """Test trigram + edit distance matching of misspelled and unaccented names."""
+    gazetteer = get_gazetteer()
+    assert gazetteer.autocorrect("Groningn").name == "Groningen"
+    assert gazetteer.autocorrect("Strasburg").name == "Strasbourg"
+    assert gazetteer.autocorrect("Lubeck").name == "Lübeck"
+    assert gazetteer.autocorrect("Waypoint 3") is None
+
+
+@pytest.mark.benchmark
+def test_fuzzy_lookup_is_fast():
+    """Benchmark: a fuzzy lookup takes about a millisecond; the bound is far above that."""
+    gazetteer = get_gazetteer()
+    gazetteer.fuzzy_lookup("Hamburgh")
+    start = time.perf_counter()
+    gazetteer.fuzzy_lookup("Hamburgh")
+    assert time.perf_counter() - start < 0.1
+
+
+def test_orchestrator_autocorrects_before_routing():
+    from src.agent.orchestrator import _autocorrect_place
+
+    assert _autocorrect_place("Amsterdm") == "Amsterdam"
+    assert _autocorrect_place("Somewhere Unknown") == "Somewhere Unknown"
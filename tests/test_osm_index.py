@@ -0,0 +1,100 @@
+import numpy as np
+from unittest.mock import patch
+from src.tools import accommodation, osm_index
+from src.tools.osm_index import OSMFeatureIndex, import_osm_xml
+from src.tools.accommodation import (
+    AccommodationRequest,
+    CorridorAccommodationRequest,
+    find_accommodation,
+    find_accommodation_along_route,
+)
+from src.tools.poi import get_points_of_interest, POIRequest
+
+OSM_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="53.5500" lon="9.9900">
+    <tag k="tourism" v="hostel"/><tag k="name" v="Harbour Hostel"/><tag k="website" v="https://example.org"/>
+    <tag k="addr:street" v="Hafenstraße"/>
+  </node>
+  <node id="2" lat="53.5600" lon="10.0000">
+    <tag k="tourism" v="camp_site"/><tag k="name" v="Elbe Camp"/>
+  </node>
+  <node id="3" lat="53.5400" lon="9.9800"/>
+  <node id="4" lat="53.5420" lon="9.9820"/>
+  <node id="5" lat="53.5420" lon="9.9800"/>
+  <way id="10">
+    <nd ref="3"/><nd ref="4"/><nd ref="5"/>
+    <tag k="historic" v="castle"/><tag k="name" v="Old Fort"/>
+  </way>
+  <node id="6" lat="48.1400" lon="11.5800">
+    <tag k="tourism" v="hostel"/><tag k="name" v="Far Away Hostel"/>
+  </node>
+  <node id="7" lat="53.5510" lon="9.9910"><tag k="amenity" v="cafe"/><tag k="name" v="Not Indexed"/></node>
+</osm>
+"""
+
+
+def _index(tmp_path) -> OSMFeatureIndex:
+    source = tmp_path / "extract.osm"
+    source.write_text(OSM_XML)
+    imported = import_osm_xml(source)
+    imported.save(tmp_path / "index")
+    return OSMFeatureIndex.load(tmp_path / "index")
+
+
+def test_import_and_radius_query(tmp_path):
+    """Test import, memory-mapped reload and nearest-of-type queries."""
+    index = _index(tmp_path)
+    assert len(index) == 4
+    assert isinstance(index.kinds, np.memmap)
+
+    hostels = index.nearest(53.55, 9.99, [("tourism", "hostel")], radius_m=5000)
+    assert [h.tags["name"] for h in hostels] == ["Harbour Hostel"]
+    assert "addr:street" not in hostels[0].tags
+
+    castles = index.nearest(53.55, 9.99, [("historic", "castle")], radius_m=5000)
+    assert castles[0].tags["name"] == "Old Fort"
+    assert round(castles[0].lat, 3) == 53.541
+
+
+def test_tools_answer_from_index_without_overpass(tmp_path):
+    osm_index.set_osm_index(_index(tmp_path))
+    try:
+        with patch("src.tools.overpass.httpx.Client") as overpass_http:
+            stays = find_accommodation(AccommodationRequest(location="Hamburg", preference="camping"))
+            pois = get_points_of_interest(POIRequest(location="Hamburg"))
+        overpass_http.assert_not_called()
+        assert stays[0].name == "Elbe Camp"
+        assert pois[0].name == "Old Fort"
+        assert "Historic castle" in pois[0].description
+    finally:
+        osm_index.set_osm_index(None)
+
+
+def test_corridor_scan_orders_stays_along_route(tmp_path):
+    camps = [
+        (52.0, 5.30, 0, {"tourism": "camp_site", "name": "Camp A"}),
+        (52.02, 5.80, 0, {"tourism": "camp_site", "name": "Camp B"}),
+        (52.30, 5.60, 0, {"tourism": "camp_site", "name": "Too Far"}),
+        (52.01, 5.55, 1, {"tourism": "hostel", "name": "Hostel C"}),
+    ]
+    osm_index.set_osm_index(OSMFeatureIndex.build(camps))
+    try:
+        with patch(
+            "src.tools.accommodation.project_onto_polyline", wraps=accommodation.project_onto_polyline
+        ) as project:
+            stays = find_accommodation_along_route(CorridorAccommodationRequest(
+                points=[(52.0, 5.0), (52.0, 6.0)],
+                distances_km=[0.0, 80.0],
+                preferences=["camping", "hostel"],
+            ))
+    finally:
+        osm_index.set_osm_index(None)
+
+    # The index prefilter's projection is reused for the stays' positions
+    assert project.call_count == 1
+
+    assert [s.name for s in stays] == ["Camp A", "Hostel C", "Camp B"]
+    assert [s.type for s in stays] == ["camping", "hostel", "camping"]
+    assert abs(stays[0].along_km - 24.0) < 0.5
+    assert stays[2].offset_km < 3
@@ -0,0 +1,109 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import httpx
+import numpy as np
+
+from src.tools import overpass
+from src.tools.cache import get_cache_stats
+
+
+ELEMENTS = {
+    "elements": [
+        {"type": "node", "lat": 53.551, "lon": 9.993, "tags": {"tourism": "hostel", "name": "Harbour Hostel", "addr:street": "Kai"}},
+        {"type": "way", "center": {"lat": 53.541, "lon": 9.985}, "tags": {"historic": "castle", "name": "Old Fort"}},
+        {"type": "node", "lat": 53.700, "lon": 10.300, "tags": {"tourism": "hostel", "name": "Far Away Hostel"}},
+        {"type": "node", "lat": 53.552, "lon": 9.994, "tags": {"amenity": "cafe", "name": "Not Indexed"}},
+    ]
+}
+
+
+def _client(payload):
+    response = MagicMock()
+    response.json.return_value = payload
+    http = MagicMock()
+    http.post.return_value = response
+    http.__enter__.return_value = http
+    http.__exit__.return_value = None
+    return http
+
+
+def test_radius_query_filters_cached_tiles_locally():
+    with patch("src.tools.overpass.httpx.Client") as mock_client:
+        mock_client.return_value = _client(ELEMENTS)
+        hostels = overpass.query_radius(53.55, 9.99, 3000, [("tourism", "hostel")])
+        castles = overpass.query_radius(53.55, 9.99, 3000, [("historic", "castle")])
+
+    # One bounding-box request covers every tile; the second query is served from cache
+    assert mock_client.return_value.post.call_count == 1
+    assert [h.tags["name"] for h in hostels] == ["Harbour Hostel"]
+    assert "addr:street" not in hostels[0].tags
+    assert castles[0].tags["name"] == "Old Fort"
+    assert castles[0].distance_m < 3000
+
+
+def test_empty_tiles_and_failures_are_negative_cached(monkeypatch):
+    with patch("src.tools.overpass.httpx.Client") as mock_client:
+        mock_client.return_value = _client({"elements": []})
+        assert overpass.query_radius(48.0, 11.0, 2000, [("tourism", "hotel")]) == []
+        assert overpass.query_radius(48.0, 11.0, 2000, [("tourism", "hotel")]) == []
+    assert mock_client.return_value.post.call_count == 1
+
+    with patch("src.tools.overpass.httpx.Client") as mock_client:
+        mock_client.return_value = _client([])
+        overpass.query_radius(47.0, 8.0, 2000, [("tourism", "hotel")])
+        calls = mock_client.return_value.post.call_count
+        overpass.query_radius(47.0, 8.0, 2000, [("tourism", "hotel")])
+    assert mock_client.return_value.post.call_count == calls
+
+    stats = get_cache_stats()["overpass_tiles"]
+    assert stats["negative_empty"] >= 1
+    assert stats["negative_error"] >= 1
+
+    # Errors are only remembered briefly
+    monkeypatch.setitem(overpass._cache.negative_ttls, "error", 0)
+    with patch("src.tools.overpass.httpx.Client") as mock_client:
+        mock_client.return_value = _client({"elements": []})
+        overpass.query_radius(47.0, 8.0, 2000, [("tourism", "hotel")])
+    assert mock_client.return_value.post.call_count == 1
+
+
+def test_failover_and_hedging_across_mirrors(monkeypatch):
+    monkeypatch.setenv("OVERPASS_MIRRORS", "https://down.example/api, https://slow.example/api, https://fast.example/api")
+    monkeypatch.setattr(overpass, "HEDGE_DELAY_S", 0.05)
+    release = threading.Event()
+
+    def post(url, data):
+        if "down" in url:
+            raise httpx.ConnectError("refused")
+        if "slow" in url:
+            # Holds until the test ends; only a hedge to the next mirror can answer first
+            release.wait(5)
+        response = MagicMock()
+        response.json.return_value = {"elements": [], "from": url}
+        return response
+
+    with patch("src.tools.overpass.httpx.Client") as mock_client:
+        mock_client.return_value = _client(None)
+        mock_client.return_value.post.side_effect = post
+        try:
+            for _ in range(3):
+                assert overpass._post("[out:json];")["from"] == "https://fast.example/api"
+        finally:
+            release.set()
+
+
+def test_long_corridor_is_one_union_query():
+    """Test a multi-day route's missing tiles are fetched with a single POST of per-block bboxes."""
+    route_lats = np.linspace(52.37, 55.68, 50)
+    route_lons = np.linspace(4.90, 12.57, 50)
+    with patch("src.tools.overpass.httpx.Client") as mock_client:
+        mock_client.return_value = _client(ELEMENTS)
+        overpass.query_corridor(route_lats, route_lons, 5, [("tourism", "hostel")])
+        assert mock_client.return_value.post.call_count == 1
+        query = mock_client.return_value.post.call_args.kwargs["data"]["data"]
+        assert query.count('nwr["tourism"') > 10
+
+        # The whole corridor is cached now
+        overpass.query_corridor(route_lats, route_lons, 5, [("tourism", "hostel")])
+    assert mock_client.return_value.post.call_count == 1
@@ -0,0 +1,105 @@
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from src.agent.tool_registry import get_available_tools
+from src.tools import osm_index
+from src.tools.gazetteer import Gazetteer
+from src.tools.osm_index import KIND_CODES, OSMFeatureIndex
+from src.tools.reachability import ReachabilityRequest, find_reachable_places
+from src.tools.routes import RouteResult
+
+
+def test_places_within_band_ranked_by_population():
+    """Test reachable places lie in the distance band and are ranked by population."""
+    assert get_available_tools()["find_reachable_places"].__wrapped__ is find_reachable_places
+
+    result = find_reachable_places(ReachabilityRequest(origin="Amsterdam", days=5, daily_km=90))
+    assert (result.min_km, result.max_km) == (337.5, 450.0)
+    assert result.places
+    assert all(337.5 <= p.distance_km <= 450.0 for p in result.places)
+    populations = [p.population for p in result.places]
+    assert populations == sorted(populations, reverse=True)
+    assert "Utrecht" not in [p.name for p in result.places]
+
+
+@pytest.mark.benchmark
+def test_ranking_a_large_gazetteer_is_fast():
+    """Benchmark: the vectorised pass ranks 100k places in milliseconds; the bound is far above that."""
+    rng = np.random.default_rng(0)
+    n = 100_000
+    gazetteer = Gazetteer(
+        names=[f"Place {i}" for i in range(n)],
+        countries=["NL"] * n,
+        lats=rng.uniform(45, 60, n),
+        lons=rng.uniform(-5, 20, n),
+        populations=rng.integers(100, 1_000_000, n),
+    )
+    with patch("src.tools.reachability.get_gazetteer", return_value=gazetteer), \
+         patch("src.tools.reachability.geocode", return_value=(52.37, 4.89)):
+        find_reachable_places(ReachabilityRequest(origin="Amsterdam", days=3))
+        started = time.perf_counter()
+        result = find_reachable_places(ReachabilityRequest(origin="Amsterdam", days=3, daily_km=100, limit=20))
+        elapsed = time.perf_counter() - started
+
+    assert len(result.places) == 20
+    populations = [p.population for p in result.places]
+    assert populations == sorted(populations, reverse=True)
+    assert elapsed < 0.5
+
+
+def test_poi_density_ranking_and_refinement():
+    """Test POI-dense places rank first and routed refinement drops places out of reach."""
+    poi = KIND_CODES[("tourism", "attraction")]
+    # Bremen's cell is dense with sights, Hamburg's has one
+    features = [(53.079, 8.801, poi, {"name": f"Sight {i}"}) for i in range(5)]
+    features.append((53.551, 9.994, poi, {"name": "Harbour"}))
+    osm_index.set_osm_index(OSMFeatureIndex.build(features))
+    try:
+        request = ReachabilityRequest(
+            origin="Amsterdam", days=5, daily_km=90, min_km=300, rank_by="poi_density", limit=3
+        )
+        places = find_reachable_places(request).places
+    finally:
+        osm_index.set_osm_index(None)
+    assert places[0].name == "Bremen" and places[0].poi_count == 5
+    assert places[1].name == "Hamburg"
+
+    def routed(request):
+        distance, source = {
+            "London": (380.0, "local_router+estimate"),
+            "Hamburg": (470.0, "openrouteservice"),
+            "Frankfurt am Main": (300.0, "openrouteservice"),
+        }.get(request.destination.split(",")[0], (400.0, "openrouteservice"))
+        return RouteResult(
+            origin="Amsterdam", destination=request.destination, total_distance_km=distance,
+            estimated_days=5, waypoints=[], source=source,
+        )
+
+    with patch("src.tools.reachability._route", side_effect=routed):
+        refined = find_reachable_places(ReachabilityRequest(origin="Amsterdam", days=5, daily_km=90, refine_top_k=4))
+    by_name = {p.name: p for p in refined.places}
+    # Routed beyond max_km or short of min_km: out of the band
+    assert "Hamburg" not in by_name and "Frankfurt am Main" not in by_name
+    # A partly estimated route doesn't pass for a routed distance
+    assert by_name["London"].source == "estimate"
+    assert by_name["Hanover"].source == "openrouteservice"
+    assert by_name["Hanover"].distance_km == 400.0
+    assert refined.source == "gazetteer+local_router+estimate+openrouteservice"
+
+
+def test_refinement_routes_through_the_memoized_registry_tool():
+    """Test refined distances come from the registry's get_route and are reused on a repeat search."""
+    route = RouteResult(
+        origin="Amsterdam", destination="x", total_distance_km=400.0,
+        estimated_days=5, waypoints=[], source="openrouteservice",
+    )
+    request = ReachabilityRequest(origin="Amsterdam", days=5, daily_km=90, refine_top_k=2)
+    with patch("src.tools.routes._route_legs") as legs, \
+         patch("src.tools.routes._stitch", return_value=route) as stitch:
+        find_reachable_places(request)
+        find_reachable_places(request.model_copy(update={"limit": 5}))
+    assert stitch.call_count == 2
+    assert legs.call_count == 2
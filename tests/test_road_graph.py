@@ -0,0 +1,127 @@
+import heapq
+import math
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from src.tools import road_graph
+from src.tools.road_graph import RoadGraph, import_osm_roads
+from src.tools.routes import RouteRequest, get_route
+
+# A primary road straight east, a quiet street beside it, a motorway
+# shortcut bikes can't use and a cycleway that only runs westbound
+OSM_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="52.0000" lon="5.0000"/>
+  <node id="2" lat="52.0000" lon="5.0500"/>
+  <node id="3" lat="52.0000" lon="5.1000"/>
+  <node id="4" lat="52.0050" lon="5.0250"/>
+  <node id="5" lat="52.0050" lon="5.0750"/>
+  <node id="6" lat="51.9900" lon="5.0500"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="primary"/></way>
+  <way id="11"><nd ref="1"/><nd ref="4"/><nd ref="5"/><nd ref="3"/><tag k="highway" v="residential"/></way>
+  <way id="12"><nd ref="1"/><nd ref="3"/><tag k="highway" v="motorway"/></way>
+  <way id="13"><nd ref="1"/><nd ref="6"/><nd ref="3"/><tag k="highway" v="cycleway"/><tag k="oneway" v="-1"/></way>
+</osm>
+"""
+
+
+def _grid_graph(size: int, seed: int = 0) -> RoadGraph:
+    """A size x size street grid with random per-street factors and some one-way streets."""
+    rng = np.random.default_rng(seed)
+    lats = np.repeat(np.arange(size) * 0.01 + 50.0, size)
+    lons = np.tile(np.arange(size) * 0.01 + 8.0, size)
+    ids = np.arange(size * size).reshape(size, size)
+    ways = []
+    for line in list(ids) + list(ids.T):
+        for a in range(0, size - 1, 5):
+            direction = int(rng.choice([0, 0, 0, 1, -1]))
+            ways.append((line[a:a + 6].tolist(), float(rng.uniform(0.8, 2.0)), direction))
+    return RoadGraph.build(lats, lons, ways)
+
+
+def _dijkstra(graph: RoadGraph, source: int, target: int) -> float:
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if node == target:
+            return d
+        if d > dist[node]:
+            continue
+        for edge in range(graph.offsets[node], graph.offsets[node + 1]):
+            nxt, reached = int(graph.targets[edge]), d + float(graph.costs[edge])
+            if reached < dist.get(nxt, math.inf):
+                dist[nxt] = reached
+                heapq.heappush(heap, (reached, nxt))
+    return math.inf
+
+
+def test_import_prefers_cycleways_and_respects_access(tmp_path):
+    """Test OSM import, memory-mapped reload and cycling-aware path choice."""
+    source = tmp_path / "roads.osm"
+    source.write_text(OSM_XML)
+    import_osm_roads(source).save(tmp_path / "graph")
+    graph = RoadGraph.load(tmp_path / "graph")
+    assert isinstance(graph.targets, np.memmap)
+    # Only the shared ends are junctions; the rest are shape points
+    assert len(graph) == 2
+
+    east = graph.route((52.0, 5.0), (52.0, 5.1))
+    assert (52.005, 5.025) in [(round(lat, 3), round(lon, 3)) for lat, lon in east.points]
+    assert east.distance_km > 6.8
+
+    # Westbound the cycleway is open and cheapest
+    west = graph.route((52.0, 5.1), (52.0, 5.0))
+    assert (51.99, 5.05) in [(round(lat, 3), round(lon, 3)) for lat, lon in west.points]
+    assert graph.route((52.0, 5.0), (48.0, 11.0)) is None
+
+
+def test_bidirectional_astar_matches_dijkstra():
+    """Test the bidirectional A* finds optimal paths on a graph with one-way streets."""
+    graph = _grid_graph(25)
+    rng = np.random.default_rng(1)
+    for source, target in rng.integers(0, len(graph), size=(30, 2)):
+        expected = _dijkstra(graph, int(source), int(target))
+        found = graph._search(int(source), int(target)) if source != target else ([], 0)
+        if found is None:
+            assert expected == math.inf
+            continue
+        edges, _ = found
+        cost = float(np.sum(graph.costs[edges], dtype=np.float64))
+        assert math.isclose(cost, expected, rel_tol=1e-5)
+        # The edges chain from source to target
+        for a, b in zip(edges, edges[1:]):
+            assert graph.targets[a] == graph.sources[b]
+
+
+def test_local_router_serves_get_route_without_ors():
+    """Test get_route falls back to the local graph and reports it as the source."""
+    graph = _grid_graph(150)
+    path = graph.route((50.0, 8.0), (51.49, 9.49))
+    assert path.distance_km > 200
+
+    road_graph.set_road_graph(graph)
+    try:
+        coords = {"start": (50.0, 8.0), "finish": (50.5, 8.9)}
+        with patch("src.tools.routes.os.environ.get", return_value=None), \
+             patch("src.tools.routes.geocode", side_effect=lambda name: coords[name]):
+            result = get_route(RouteRequest(origin="start", destination="finish", preferred_daily_km=40))
+    finally:
+        road_graph.set_road_graph(None)
+
+    assert result.source == "local_router"
+    assert result.total_distance_km > 100
+    assert result.waypoints[-1].name == "Finish"
+    assert [w.distance_from_start_km for w in result.waypoints] == sorted(w.distance_from_start_km for w in result.waypoints)
+
+
+@pytest.mark.benchmark
+def test_corner_to_corner_route_on_a_large_grid_is_fast():
+    """Benchmark: a 22k-node corner-to-corner search, bounded far above its usual run time."""
+    graph = _grid_graph(150)
+    started = time.perf_counter()
+    graph.route((50.0, 8.0), (51.49, 9.49))
+    assert time.perf_counter() - started < 5.0
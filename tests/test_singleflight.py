@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from src.tools import geocoding
+from src.tools.singleflight import SingleFlight, get_singleflight_stats
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test_sync")
+    calls = []
+    gate = threading.Event()
+
+    def slow():
+        calls.append(1)
+        gate.wait(1.0)
+        return "copenhagen"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, "copenhagen", slow) for _ in range(8)]
+        time.sleep(0.1)
+        gate.set()
+        results = [f.result() for f in futures]
+
+    assert results == ["copenhagen"] * 8
+    assert len(calls) == 1
+    assert flight.stats == {"calls": 1, "shared": 7}
+    assert get_singleflight_stats()["test_sync"]["top_keys"] == {"copenhagen": 7}
+
+    # Once finished, the next call goes upstream again
+    assert flight.do("copenhagen", lambda: "again") == "again"
+
+
+def test_errors_are_shared_and_not_remembered():
+    flight = SingleFlight("test_errors")
+    gate = threading.Event()
+
+    def failing():
+        gate.wait(1.0)
+        raise TimeoutError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(flight.do, "k", failing) for _ in range(3)]
+        time.sleep(0.1)
+        gate.set()
+        for future in futures:
+            with pytest.raises(TimeoutError):
+                future.result()
+    assert flight.do("k", lambda: 1) == 1
+
+
+def test_async_callers_share_one_call():
+    flight = SingleFlight("test_async")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("k", fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == [42] * 5
+    assert len(calls) == 1
+    assert flight.stats["shared"] == 4
+
+
+def test_geocode_coalesces_equivalent_names():
+    gate = threading.Event()
+    calls = []
+
+    def search(location):
+        calls.append(location)
+        gate.wait(1.0)
+        return (55.0, 12.0)
+
+    with patch.object(geocoding, "get_gazetteer", return_value=None), \
+         patch.object(geocoding, "_nominatim_search", side_effect=search):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(geocoding.geocode, name) for name in ["Zürich", "zurich", " ZURICH ", "Zurich"]]
+            time.sleep(0.1)
+            gate.set()
+            results = [f.result() for f in futures]
+
+    assert results == [(55.0, 12.0)] * 4
+    assert len(calls) == 1
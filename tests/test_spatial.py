@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+import numpy as np
+from src.tools.spatial import GridIndex, haversine_km
+from src.tools.routes import RouteRequest, get_route
+
+
+def test_haversine_km_matches_known_distance():
+    # Amsterdam -> Copenhagen is roughly 620km as the crow flies
+    assert 600 < float(haversine_km(52.37, 4.89, 55.68, 12.57)) < 640
+
+
+def test_grid_nearest_matches_brute_force():
+    """Test the batched grid query agrees with an exhaustive search."""
+    rng = np.random.default_rng(7)
+    lats, lons = rng.uniform(47, 56, 2000), rng.uniform(2, 15, 2000)
+    index = GridIndex(lats, lons, cell_deg=0.5)
+
+    q_lats, q_lons = rng.uniform(48, 55, 200), rng.uniform(3, 14, 200)
+    ids, dists = index.nearest(q_lats, q_lons, max_km=50)
+
+    brute = haversine_km(q_lats[:, None], q_lons[:, None], lats[None, :], lons[None, :])
+    assert np.array_equal(ids, brute.argmin(axis=1))
+    assert np.allclose(dists, brute.min(axis=1))
+
+
+def test_grid_query_radius_and_misses():
+    index = GridIndex([52.0, 52.1, 53.0], [5.0, 5.1, 5.0])
+    ids, dists = index.query_radius(52.0, 5.0, radius_km=20)
+    assert list(ids) == [0, 1]
+    assert dists[0] == 0.0
+
+    ids, dists = index.nearest([40.0], [5.0], max_km=10)
+    assert ids[0] == -1 and np.isinf(dists[0])
+
+
+def test_estimated_route_waypoints_snap_to_real_towns():
+    """Test synthetic waypoints on a straight-line estimate are renamed after nearby towns."""
+    req = RouteRequest(origin="Amsterdam", destination="Berlin", preferred_daily_km=80)
+    with patch("src.tools.routes.os.environ.get", return_value=None), \
+         patch("src.tools.routes._get_local_leg", return_value=None):
+        route = get_route(req)
+    assert "estimate" in route.source
+    names = [w.name for w in route.waypoints]
+    assert {"Lelystad", "Osnabrück", "Hanover"} <= set(names)
+    assert names[-1] == "Berlin"
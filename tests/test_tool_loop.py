@@ -0,0 +1,92 @@
+import json
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from anthropic.types import TextBlock, ToolUseBlock
+
+from src.agent import tool_loop
+from src.agent.tool_loop import compact_json, run_tool_loop, tool_specs
+from src.agent.tool_registry import get_available_tools
+from src.tools.routes import RouteResult
+from src.tools.visa import VisaRequest
+
+
+def _reply(stop_reason, *content):
+    return SimpleNamespace(stop_reason=stop_reason, content=list(content))
+
+
+def test_specs_come_from_request_models():
+    """Test every registry tool gets a title-free JSON schema from its request model."""
+    specs = {spec["name"]: spec for spec in tool_specs(get_available_tools())}
+    assert set(specs) == set(get_available_tools())
+    visa = specs["check_visa_requirements"]
+    assert visa["input_schema"]["required"] == ["citizenship", "destinations"]
+    assert visa["description"].startswith("Check visa requirements")
+    assert "title" not in json.dumps(visa["input_schema"])
+
+
+def test_compact_json_drops_hidden_and_empty_fields():
+    """Test tool results are serialised without geometry, nulls or whitespace."""
+    route = RouteResult(
+        origin="A", destination="B", total_distance_km=10.0, estimated_days=1,
+        waypoints=[], geometry=[(52.0, 4.0, 0.0)] * 1000, source="estimate",
+    )
+    text = compact_json(route)
+    assert "geometry" not in text and " " not in text
+    assert json.loads(text)["total_distance_km"] == 10.0
+
+
+def test_tools_in_one_turn_run_concurrently_with_timeouts(monkeypatch):
+    """Test a multi-tool turn runs its tools side by side and slow or failing tools come back as errors."""
+    monkeypatch.setattr(tool_loop, "TOOL_TIMEOUT_S", 0.2)
+    # Each visa call waits until all four are running at once
+    together = threading.Barrier(4, timeout=5)
+    release = threading.Event()
+
+    def slow_visa(request: VisaRequest):
+        together.wait()
+        return {"citizenship": request.citizenship}
+
+    def stuck_visa(request: VisaRequest):
+        release.wait(5)
+
+    tools = {"visa": slow_visa, "stuck": stuck_visa}
+    calls = [
+        ToolUseBlock(id=f"t{i}", name="visa", input={"citizenship": f"C{i}", "destinations": []}, type="tool_use")
+        for i in range(4)
+    ]
+    calls.append(ToolUseBlock(id="t4", name="stuck", input={"citizenship": "X", "destinations": []}, type="tool_use"))
+    calls.append(ToolUseBlock(id="t5", name="visa", input={"destinations": "nope"}, type="tool_use"))
+    client = MagicMock()
+    client.with_options.return_value.messages.create.side_effect = [
+        _reply("tool_use", TextBlock(text="Checking.", type="text"), *calls),
+        _reply("end_turn", TextBlock(text="No visa needed.", type="text")),
+    ]
+
+    try:
+        answer = run_tool_loop([{"role": "user", "content": "Visa?"}], tools=tools, client=client)
+    finally:
+        release.set()
+
+    assert answer == "No visa needed."
+    second = client.with_options.return_value.messages.create.call_args_list[1].kwargs
+    results = second["messages"][-1]["content"]
+    assert [r["tool_use_id"] for r in results] == [f"t{i}" for i in range(6)]
+    assert [r["content"] for r in results[:4]] == [f'{{"citizenship":"C{i}"}}' for i in range(4)]
+    assert results[4]["is_error"] and "timed out" in results[4]["content"]
+    assert results[5]["is_error"]
+    assert second["messages"][-2]["role"] == "assistant"
+
+
+def test_loop_gives_up_after_max_iterations(monkeypatch):
+    """Test a model that keeps asking for tools is cut off at the iteration cap."""
+    monkeypatch.setattr(tool_loop, "MAX_TOOL_ITERATIONS", 3)
+    call = ToolUseBlock(
+        id="t", name="check_visa_requirements", input={"citizenship": "US", "destinations": ["France"]},
+        type="tool_use",
+    )
+    client = MagicMock()
+    client.with_options.return_value.messages.create.return_value = _reply("tool_use", call)
+    assert run_tool_loop([{"role": "user", "content": "?"}], client=client) is None
+    assert client.with_options.return_value.messages.create.call_count == 3
@@ -2,7 +2,7 @@ import pytest
 from unittest.mock import patch, MagicMock
 from src.tools.routes import get_route, RouteRequest
 from src.tools.accommodation import find_accommodation, AccommodationRequest
-from src.tools.weather import get_weather, WeatherRequest
+from src.tools.weather import get_weather, get_route_weather, RouteWeatherRequest, WeatherPoint, WeatherRequest
 from src.tools.elevation import get_elevation_profile, ElevationRequest
 
 
@@ -27,7 +27,7 @@ def test_route_returns_result(mock_client):
     assert result.waypoints
 
 
-@patch('src.tools.accommodation.httpx.Client')
+@patch('src.tools.overpass.httpx.Client')
 def test_accommodation_returns_option(mock_client):
     """Test accommodation returns options with mocked API calls."""
     # Mock empty API response to trigger fallback to mock data
@@ -85,3 +85,38 @@ def test_elevation_profile(mock_client):
     req = ElevationRequest(origin="Amsterdam", destination="Copenhagen")
     result = get_elevation_profile(req)
     assert result.total_elevation_gain_m > 0
+
+
+@patch('src.tools.weather.httpx.Client')
+def test_route_weather_batches_unique_cells(mock_client):
+    """Test per-stop weather dedupes grid cells and uses one multi-location request."""
+    def location(temp, rain):
+        return {"daily": {"temperature_2m_mean": [temp, temp], "precipitation_sum": [rain, rain]}}
+
+    mock_response = MagicMock()
+    mock_response.json.return_value = [location(15.0, 2.0), location(9.0, 60.0)]
+    mock_response.raise_for_status = MagicMock()
+
+    mock_http = MagicMock()
+    mock_http.get.return_value = mock_response
+    mock_http.__enter__.return_value = mock_http
+    mock_http.__exit__.return_value = None
+    mock_client.return_value = mock_http
+
+    req = RouteWeatherRequest(
+        month="June",
+        stops=[
+            WeatherPoint(location="Utrecht", lat=52.09, lon=5.12),
+            WeatherPoint(location="Nieuwegein", lat=52.03, lon=5.08),  # same grid cell as Utrecht
+            WeatherPoint(location="Innsbruck", lat=47.26, lon=11.39),
+        ],
+    )
+    results = get_route_weather(req)
+
+    assert mock_http.get.call_count == 1
+    params = mock_http.get.call_args.kwargs["params"]
+    assert len(params["latitude"].split(",")) == 2
+    assert results[0].avg_temp_c == results[1].avg_temp_c == 15.0
+    assert results[1].location == "Nieuwegein"
+    assert results[2].avg_temp_c == 9.0
+    assert "wet season" in results[2].notes
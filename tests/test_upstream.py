@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from src.tools import upstream
+from src.tools.upstream import Priority, RateLimiter, UpstreamBusy, UpstreamLimits
+
+
+def test_bucket_allows_burst_then_paces():
+    limiter = RateLimiter("test", UpstreamLimits(rate=20.0, burst=3, max_queue=10))
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    elapsed = time.monotonic() - started
+    # Three immediate, then two more at 20/s
+    assert 0.08 <= elapsed < 0.5
+    assert limiter.stats["acquired"] == 5
+
+
+def test_full_queue_fails_fast():
+    limiter = RateLimiter("test", UpstreamLimits(rate=0.5, burst=1, max_queue=1, max_wait_s=2.0))
+    limiter.acquire()
+    waiter = threading.Thread(target=lambda: pytest.raises(UpstreamBusy, limiter.acquire, timeout=0.3))
+    waiter.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    with pytest.raises(UpstreamBusy):
+        limiter.acquire()
+    assert time.monotonic() - started < 0.05
+    waiter.join()
+    assert limiter.stats["rejected"] == 1
+    assert limiter.stats["timed_out"] == 1
+
+
+def test_interactive_calls_jump_the_queue():
+    limiter = RateLimiter("test", UpstreamLimits(rate=20.0, burst=1, max_queue=10))
+    limiter.acquire()
+    order = []
+
+    def call(label, level):
+        limiter.acquire(level)
+        order.append(label)
+
+    threads = [threading.Thread(target=call, args=(f"background-{i}", Priority.BACKGROUND)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.01)
+    interactive = threading.Thread(target=call, args=("interactive", Priority.INTERACTIVE))
+    interactive.start()
+    for thread in threads + [interactive]:
+        thread.join()
+
+    assert order[0] == "interactive"
+    assert sorted(order[1:]) == ["background-0", "background-1", "background-2"]
+
+
+def test_priority_context_and_per_host_limiters():
+    with upstream.priority(Priority.ENRICHMENT):
+        assert upstream.current_priority() == Priority.ENRICHMENT
+    assert upstream.current_priority() == Priority.INTERACTIVE
+
+    a = upstream.get_limiter("overpass", "https://a.example/api/interpreter")
+    b = upstream.get_limiter("overpass", "https://b.example/api/interpreter")
+    assert a is not b
+    assert a is upstream.get_limiter("overpass", "https://a.example/other")
+
+
+def test_circuit_opens_after_failures_and_recovers(monkeypatch):
+    monkeypatch.setitem(upstream._overrides, "flaky", {"burst": 10, "failure_threshold": 2, "reset_after_s": 0.1})
+    calls = []
+
+    def call(fail):
+        with upstream.guard("flaky"):
+            calls.append(fail)
+            if fail:
+                raise ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call(True)
+    with pytest.raises(upstream.CircuitOpen):
+        call(False)
+    assert len(calls) == 2
+    assert upstream.get_breaker("flaky").state == "open"
+
+    time.sleep(0.12)
+    call(False)
+    assert upstream.get_breaker("flaky").state == "closed"
+    assert upstream.get_breaker_stats()["flaky"]["short_circuited"] == 1
+
+
+def test_deadline_caps_timeouts_and_refuses_late_calls():
+    assert upstream.timeout_for(30.0) == 30.0
+    with upstream.deadline(2.0):
+        assert upstream.timeout_for(30.0) <= 2.0
+        with upstream.share(0.5):
+            assert upstream.timeout_for(30.0) <= 1.0
+        with upstream.deadline(60.0):
+            assert upstream.remaining() <= 2.0
+    with upstream.deadline(0.0):
+        with pytest.raises(upstream.DeadlineExceeded):
+            with upstream.guard("late"):
+                pass
+    assert upstream.remaining() is None